@@ -0,0 +1,94 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import heapq
+
+class ApproximatePattern():
+	"""Byte pattern that also matches when up to max_mismatches bytes differ.
+	The pattern is split into max_mismatches + 1 parts; by the pigeonhole
+	principle, at least one of them has to occur verbatim in every match.
+	These parts are found using the buffer's find() and only the candidates
+	they produce are compared in full."""
+
+	def __init__(self, needle, max_mismatches):
+		if max_mismatches >= len(needle):
+			raise ValueError("Allowing %d mismatches on a needle of %d bytes would match everywhere." % (max_mismatches, len(needle)))
+		self._needle = bytes(needle)
+		self._max_mismatches = max_mismatches
+		part_count = max_mismatches + 1
+		boundaries = [ len(needle) * part_index // part_count for part_index in range(part_count + 1) ]
+		self._parts = [ (begin, self._needle[begin : end]) for (begin, end) in zip(boundaries, boundaries[1:]) ]
+
+	@property
+	def needle(self):
+		return self._needle
+
+	@property
+	def max_mismatches(self):
+		return self._max_mismatches
+
+	def mismatches(self, data):
+		"""Returns the number of differing bytes, or None if more than
+		max_mismatches bytes differ."""
+		mismatches = 0
+		for (expected, actual) in zip(self._needle, data):
+			if expected != actual:
+				mismatches += 1
+				if mismatches > self._max_mismatches:
+					return None
+		return mismatches
+
+	@staticmethod
+	def _part_candidates(haystack, part_offset, part, start, end):
+		offset = start + part_offset
+		while True:
+			offset = haystack.find(part, offset, end)
+			if offset == -1:
+				break
+			yield offset - part_offset
+			offset += 1
+
+	def finditer(self, haystack, start = 0):
+		"""Yields all offsets at or after start at which the pattern matches,
+		in ascending order."""
+		end = len(haystack)
+		if end - start < len(self._needle):
+			return
+		candidates = [ self._part_candidates(haystack, part_offset, part, start, end - len(self._needle) + part_offset + len(part)) for (part_offset, part) in self._parts ]
+		previous = None
+		for offset in heapq.merge(*candidates):
+			if offset == previous:
+				continue
+			previous = offset
+			if self.mismatches(haystack[offset : offset + len(self._needle)]) is not None:
+				yield offset
+
+	def __len__(self):
+		return len(self._needle)
+
+	def __eq__(self, other):
+		return isinstance(other, ApproximatePattern) and ((self.needle, self.max_mismatches) == (other.needle, other.max_mismatches))
+
+	def __hash__(self):
+		return hash((self.needle, self.max_mismatches))
+
+	def __repr__(self):
+		return "ApproximatePattern<%s, %d>" % (self.needle.hex(), self.max_mismatches)
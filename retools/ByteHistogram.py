@@ -0,0 +1,261 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+import math
+import array
+import itertools
+import collections
+
+class ByteHistogram():
+	"""Counts the occurrences of all byte values (or of all n-grams of two or
+	three bytes) and derives the Shannon entropy and the chi-square
+	statistic against a uniform distribution from them. Counts are kept in
+	an array('Q') with one entry per possible n-gram; the index of an
+	n-gram is its little endian integer value. For 3-grams, such an array
+	takes 128 MiB, so they are kept in a mapping of index to count until
+	so many distinct 3-grams were seen that the array is the smaller
+	representation.
+
+	Single bytes of low entropy data (text, code, tables) are counted without
+	iterating over the data in Python: the data is split into 16 groups by
+	deleting all bytes of other high nibbles with bytes.translate(), and only
+	the bytes of each (usually much smaller, often empty) group are counted
+	by bytes.count(). This is slower than collections.Counter for small or
+	high entropy data (compressed, encrypted), which is therefore counted by
+	Counter; an entropy estimate from a small sample decides. N-grams are read
+	as machine words at every alignment and counted by collections.Counter
+	in chunks small enough to keep its mapping small."""
+	_GROUPS = [ (bytes(range(16 * nibble, 16 * nibble + 16)), bytes(value for value in range(256) if (value >> 4) != nibble)) for nibble in range(16) ]
+	_WORD_TYPECODES = { 2: "H", 3: "I" }
+	_CHUNK_SIZE = 1024 * 1024
+	_NGRAM_CHUNK_SIZE = 64 * 1024
+	_MAX_DENSE_NGRAM = 2
+	_SPARSE_LIMIT = 1024 * 1024
+	_SAMPLE_SIZE = 4096
+	_MIN_TRANSLATE_SIZE = 16384
+	_MAX_TRANSLATE_ENTROPY = 6.5
+
+	def __init__(self, ngram = 1, counts = None):
+		if ngram not in [ 1, 2, 3 ]:
+			raise ValueError("Only n-grams of one to three bytes are supported, not %d." % (ngram))
+		self._ngram = ngram
+		self._size = 256 ** ngram
+		if counts is None:
+			self._counts = { } if (ngram > self._MAX_DENSE_NGRAM) else array.array("Q", bytes(8 * self._size))
+		else:
+			self._counts = array.array("Q", counts)
+			if len(self._counts) != self._size:
+				raise ValueError("Expected %d counts for %d-grams, but %d given." % (self._size, ngram, len(self._counts)))
+		self._length = sum(self._counts.values()) if self.sparse else sum(self._counts)
+
+	@classmethod
+	def _sample_entropy(cls, data):
+		"""Estimates the entropy in bits per byte from a strided sample of
+		roughly _SAMPLE_SIZE bytes of the data."""
+		sample = data[ : : max(1, len(data) // cls._SAMPLE_SIZE)]
+		return 0 - sum((count / len(sample)) * math.log2(count / len(sample)) for count in collections.Counter(sample).values())
+
+	@classmethod
+	def count(cls, data):
+		"""Returns a list of the counts of all 256 byte values in the data."""
+		counts = [ 0 ] * 256
+		if len(data) == 0:
+			return counts
+		if data.count(data[0]) == len(data):
+			# Padding and erased flash are common and trivial to count
+			counts[data[0]] = len(data)
+			return counts
+		if (len(data) < cls._MIN_TRANSLATE_SIZE) or (cls._sample_entropy(data) >= cls._MAX_TRANSLATE_ENTROPY):
+			for (value, count) in collections.Counter(data).items():
+				counts[value] = count
+			return counts
+		for (group, other_values) in cls._GROUPS:
+			group_data = data.translate(None, other_values)
+			remaining = len(group_data)
+			for value in group[:-1]:
+				if remaining == 0:
+					break
+				counts[value] = group_data.count(value)
+				remaining -= counts[value]
+			counts[group[-1]] = remaining
+		return counts
+
+	@classmethod
+	def count_ngrams(cls, data, ngram):
+		"""Returns a mapping of the index of all n-grams that are contained in
+		the data to their count."""
+		if ngram == 1:
+			return { value: count for (value, count) in enumerate(cls.count(data)) if count != 0 }
+		typecode = cls._WORD_TYPECODES[ngram]
+		word_size = array.array(typecode).itemsize
+		ngram_count = len(data) - ngram + 1
+		data = bytes(data) + bytes(word_size - ngram)
+		counter = collections.Counter()
+		for alignment in range(min(word_size, max(0, ngram_count))):
+			word_count = (ngram_count - alignment + word_size - 1) // word_size
+			window = bytearray(data[alignment : alignment + (word_count * word_size)])
+			for excess_byte in range(ngram, word_size):
+				window[excess_byte : : word_size] = bytes(word_count)
+			words = array.array(typecode, window)
+			if sys.byteorder != "little":
+				words.byteswap()
+			counter.update(words)
+		return counter
+
+	@classmethod
+	def of(cls, data, ngram = 1):
+		histogram = cls(ngram = ngram)
+		histogram.add(data)
+		return histogram
+
+	@property
+	def ngram(self):
+		return self._ngram
+
+	@property
+	def sparse(self):
+		return isinstance(self._counts, dict)
+
+	@property
+	def counts(self):
+		"""The array of the counts of all n-grams or, while the histogram is
+		sparse, a mapping of the index of all n-grams seen to their count."""
+		return self._counts
+
+	@property
+	def length(self):
+		return self._length
+
+	def _items(self):
+		if self.sparse:
+			return self._counts.items()
+		return itertools.compress(enumerate(self._counts), self._counts)
+
+	def _nonzero_counts(self):
+		if self.sparse:
+			return self._counts.values()
+		return itertools.compress(self._counts, self._counts)
+
+	def nonzero(self):
+		"""Yields (index, count) of all n-grams that occurred at least once,
+		ordered by index."""
+		return iter(sorted(self._items())) if self.sparse else self._items()
+
+	def most_common(self, count = None):
+		nonzero = sorted(self.nonzero(), key = lambda item: (-item[1], self.ngram_bytes(item[0])))
+		return nonzero if (count is None) else nonzero[:count]
+
+	def ngram_bytes(self, index):
+		return index.to_bytes(self._ngram, byteorder = "little")
+
+	@property
+	def entropy(self):
+		"""Shannon entropy in bits per n-gram."""
+		if self._length == 0:
+			return 0
+		return 0 - sum((count / self._length) * math.log2(count / self._length) for count in self._nonzero_counts())
+
+	@property
+	def chi_square(self):
+		"""Chi-square statistic of the counts against a uniform distribution
+		of all n-grams. Random data has a value of around the number of
+		possible n-grams minus one (e.g., 255 for single bytes)."""
+		if self._length == 0:
+			return 0
+		expected = self._length / self._size
+		(nonzero_count, deviation) = (0, 0)
+		for count in self._nonzero_counts():
+			nonzero_count += 1
+			deviation += (count - expected) ** 2
+		deviation += (self._size - nonzero_count) * (expected ** 2)
+		return deviation / expected
+
+	def add(self, data):
+		"""Adds all n-grams that are completely contained in the data."""
+		if self._ngram == 1:
+			self.add_counts(self.count(data))
+		else:
+			self.add_sparse(self.count_ngrams(data, self._ngram))
+
+	def add_file(self, filename, begin_offset = 0, end_offset = None):
+		"""Adds all n-grams that begin within the given range of the file. The
+		file is read in chunks, so memory consumption does not depend on its
+		size."""
+		chunk_size = self._CHUNK_SIZE if (self._ngram == 1) else self._NGRAM_CHUNK_SIZE
+		with open(filename, "rb") as f:
+			f.seek(begin_offset)
+			offset = begin_offset
+			carry = bytes()
+			while (end_offset is None) or (offset < end_offset):
+				chunk = f.read(chunk_size if (end_offset is None) else min(chunk_size, end_offset - offset))
+				if len(chunk) == 0:
+					break
+				offset += len(chunk)
+				data = carry + chunk
+				self.add(data)
+				carry = data[len(data) - self._ngram + 1 : ]
+			if (self._ngram > 1) and (end_offset is not None):
+				# N-grams that begin before the end of the range extend beyond it
+				self.add(carry + f.read(self._ngram - 1))
+
+	def add_counts(self, counts):
+		for (index, count) in enumerate(counts):
+			self._counts[index] += count
+		self._length += sum(counts)
+
+	def remove_counts(self, counts):
+		for (index, count) in enumerate(counts):
+			self._counts[index] -= count
+		self._length -= sum(counts)
+
+	def _densify(self):
+		counts = array.array("Q", bytes(8 * self._size))
+		for (index, count) in self._counts.items():
+			counts[index] = count
+		self._counts = counts
+
+	def _add_items(self, items):
+		length = 0
+		if self.sparse:
+			get = self._counts.get
+			for (index, count) in items:
+				self._counts[index] = get(index, 0) + count
+				length += count
+			if len(self._counts) > self._SPARSE_LIMIT:
+				self._densify()
+		else:
+			for (index, count) in items:
+				self._counts[index] += count
+				length += count
+		self._length += length
+
+	def add_sparse(self, counts):
+		"""Adds a mapping of n-gram index to count."""
+		self._add_items(counts.items())
+
+	def merge(self, other):
+		if other.ngram != self._ngram:
+			raise ValueError("Cannot merge histograms of %d-grams and %d-grams." % (self._ngram, other.ngram))
+		self._add_items(other._items())
+
+	def __repr__(self):
+		return "ByteHistogram<%d-grams, %d counted, %.3f bits/%d-gram>" % (self._ngram, self._length, self.entropy, self._ngram)
@@ -0,0 +1,322 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sys
+import json
+import math
+import zlib
+import array
+import bisect
+import struct
+import operator
+import functools
+import itertools
+
+class CandidateSet():
+	"""Set of candidate offsets within data of a fixed size. Sparse sets are
+	kept as a sorted array('Q') of offsets, dense sets as a bitmap with one
+	bit per offset, whichever of the two is smaller. Filtering never loops
+	over offsets in Python code for exact patterns: dense sets are filtered
+	window by window with bitmaps built by bytes.translate() that are
+	combined using big integer arithmetic, and sparse sets gather the candidate slices
+	with map() and compare them to the pattern in bulk."""
+	_WINDOW_SIZE = 1024 * 1024
+	_MAGIC = b"retools-candidates\x00"
+	_BIT_TABLES = [ bytes((value >> bit) & 1 for value in range(256)) for bit in range(8) ]
+
+	def __init__(self, size, offsets = None, bitmap = None, count = None):
+		assert((offsets is None) != (bitmap is None))
+		self._size = size
+		self._offsets = offsets
+		self._bitmap = bitmap
+		self._count = len(offsets) if (offsets is not None) else count
+
+	@staticmethod
+	def _is_dense(size, count):
+		# An offset needs eight bytes in the array, but only one bit in the
+		# bitmap
+		return count * 64 > size
+
+	@classmethod
+	def all(cls, size, alignment = 1):
+		if alignment <= 0:
+			raise ValueError("Alignment must be at least one byte.")
+		count = (size + alignment - 1) // alignment
+		if not cls._is_dense(size, count):
+			return cls(size = size, offsets = array.array("Q", range(0, size, alignment)))
+
+		# The bitmap repeats after the least common multiple of eight bits and
+		# the alignment
+		period = 8 * alignment // math.gcd(8, alignment)
+		pattern = sum(1 << bit for bit in range(0, period, alignment)).to_bytes(period // 8, byteorder = "little")
+		bitmap_length = (size + 7) // 8
+		bitmap = bytearray(pattern) * ((bitmap_length + len(pattern) - 1) // len(pattern))
+		del bitmap[bitmap_length : ]
+		if (size % 8) != 0:
+			bitmap[-1] &= (1 << (size % 8)) - 1
+		return cls(size = size, bitmap = bitmap, count = count)
+
+	@classmethod
+	def from_offsets(cls, size, offsets):
+		"""Creates the set from an iterable of strictly ascending offsets."""
+		offsets = array.array("Q", offsets)
+		if not cls._is_dense(size, len(offsets)):
+			return cls(size = size, offsets = offsets)
+		bitmap = bytearray((size + 7) // 8)
+		for offset in offsets:
+			bitmap[offset >> 3] |= 1 << (offset & 7)
+		return cls(size = size, bitmap = bitmap, count = len(offsets))
+
+	@classmethod
+	def from_pattern(cls, data, pattern):
+		"""Creates the set of all offsets at which the pattern occurs in the
+		data. The pattern is either bytes or a pattern object (e.g., a
+		RangePattern)."""
+		if isinstance(pattern, (bytes, bytearray)):
+			return cls.all(len(data)).filter_pattern(data, pattern)
+		alignment = getattr(pattern, "alignment", 1)
+		return cls.from_offsets(len(data), (offset for offset in pattern.finditer(data) if (offset % alignment) == 0))
+
+	@property
+	def size(self):
+		return self._size
+
+	@property
+	def dense(self):
+		return self._bitmap is not None
+
+	@classmethod
+	def _unpack(cls, bitmap):
+		"""Converts a bitmap into a mask with one byte (either 0 or 1) per
+		offset."""
+		mask = bytearray(8 * len(bitmap))
+		for bit in range(8):
+			mask[bit : : 8] = bitmap.translate(cls._BIT_TABLES[bit])
+		return mask
+
+	@staticmethod
+	def _match_bitmap(data, begin, length, pattern, candidates = -1):
+		"""Returns the bitmap of all offsets in the window [begin, begin +
+		length) at which the pattern occurs in the data and which are also
+		set in the candidates bitmap. Bytes at offsets with the same residue
+		modulo eight are classified together by a single translate(), so
+		that the bitmap is assembled without ever unpacking it. Every
+		distinct pattern byte is classified only once and shifted into place
+		for all of its positions."""
+		equal_bitmaps = { }
+		match = candidates
+		for (index, value) in enumerate(pattern):
+			if value not in equal_bitmaps:
+				equal = 0
+				for bit in range(8):
+					equal_table = bytes(value) + bytes([ 1 << bit ]) + bytes(255 - value)
+					equal |= int.from_bytes(data[begin + bit : begin + length + len(pattern) - 1 : 8].translate(equal_table), byteorder = "little")
+				equal_bitmaps[value] = equal
+			match &= equal_bitmaps[value] >> index
+			if match == 0:
+				break
+		return match
+
+	def _bitmap_windows(self):
+		"""Yields (begin offset, bitmap) for all windows of a dense set that
+		contain at least one candidate."""
+		bitmap_window_size = self._WINDOW_SIZE // 8
+		for bitmap_begin in range(0, len(self._bitmap), bitmap_window_size):
+			bitmap = bytes(self._bitmap[bitmap_begin : bitmap_begin + bitmap_window_size])
+			if bitmap.count(0) != len(bitmap):
+				yield (8 * bitmap_begin, bitmap)
+
+	def _windows(self):
+		"""Yields (begin offset, mask) for all windows of a dense set that
+		contain at least one candidate."""
+		for (begin, bitmap) in self._bitmap_windows():
+			yield (begin, self._unpack(bitmap))
+
+	@staticmethod
+	def _gather(data, offsets, length):
+		return map(data.__getitem__, map(slice, offsets, map(operator.add, offsets, itertools.repeat(length))))
+
+	@classmethod
+	def _unchanged_bitmap(cls, old_data, new_data, begin, window_length, length):
+		"""Returns the bitmap of all offsets in the window at which the length
+		bytes are identical in old and new data."""
+		old = old_data[begin : begin + window_length + length - 1]
+		new = new_data[begin : begin + window_length + length - 1]
+		if old == new:
+			# Snapshots usually have large identical regions, which are cheap
+			# to detect
+			return -1
+		difference = (int.from_bytes(old, byteorder = "little") ^ int.from_bytes(new, byteorder = "little")).to_bytes(max(len(old), len(new)), byteorder = "little")
+		return cls._match_bitmap(difference, 0, window_length, bytes(length))
+
+	def _filter_dense(self, match_bitmap):
+		"""Filters a dense set window by window. match_bitmap(begin, length,
+		candidates) returns the bitmap of the remaining candidates."""
+		bitmap = bytearray(len(self._bitmap))
+		count = 0
+		for (begin, candidates) in self._bitmap_windows():
+			match = match_bitmap(begin, 8 * len(candidates), int.from_bytes(candidates, byteorder = "little"))
+			count += bin(match).count("1")
+			bitmap[begin // 8 : begin // 8 + len(candidates)] = match.to_bytes(len(candidates), byteorder = "little")
+		if not self._is_dense(self._size, count):
+			return self.from_offsets(self._size, self.__class__(size = self._size, bitmap = bitmap, count = count))
+		return self.__class__(size = self._size, bitmap = bitmap, count = count)
+
+	def _offset_array(self):
+		return self._offsets if (self._offsets is not None) else array.array("Q", self)
+
+	def filter_pattern(self, data, pattern):
+		"""Returns the subset of candidates at which the pattern occurs in the
+		data."""
+		if len(pattern) == 0:
+			raise ValueError("Pattern must not be empty.")
+		if self.dense and isinstance(pattern, (bytes, bytearray)):
+			return self._filter_dense(lambda begin, length, candidates: self._match_bitmap(data, begin, length, pattern, candidates))
+
+		offsets = self._offset_array()
+		gathered = self._gather(data, offsets, len(pattern))
+		if isinstance(pattern, (bytes, bytearray)):
+			matches = map(pattern.__eq__, gathered)
+		else:
+			matches = map(pattern.matches, gathered)
+		return self.from_offsets(self._size, itertools.compress(offsets, matches))
+
+	def _below(self, end):
+		"""Returns the subset of candidates that are less than end."""
+		if end >= self._size:
+			return self
+		end = max(0, end)
+		if not self.dense:
+			return self.__class__(size = self._size, offsets = self._offsets[ : bisect.bisect_left(self._offsets, end)])
+		bitmap = bytearray(self._bitmap)
+		removed = int.from_bytes(bitmap[end // 8 : ], byteorder = "little") >> (end % 8)
+		bitmap[(end + 7) // 8 : ] = bytes(len(bitmap) - (end + 7) // 8)
+		if (end % 8) != 0:
+			bitmap[end // 8] &= (1 << (end % 8)) - 1
+		return self.__class__(size = self._size, bitmap = bitmap, count = self._count - bin(removed).count("1"))
+
+	def _filter_comparison(self, old_data, new_data, length, unchanged):
+		candidates = self._below(min(len(old_data), len(new_data)) - length + 1)
+		if candidates.dense:
+			if unchanged:
+				return candidates._filter_dense(lambda begin, window_length, bitmap: bitmap & self._unchanged_bitmap(old_data, new_data, begin, window_length, length))
+			else:
+				return candidates._filter_dense(lambda begin, window_length, bitmap: bitmap & ~self._unchanged_bitmap(old_data, new_data, begin, window_length, length))
+		offsets = candidates._offset_array()
+		comparison = operator.eq if unchanged else operator.ne
+		return self.from_offsets(self._size, itertools.compress(offsets, map(comparison, self._gather(old_data, offsets, length), self._gather(new_data, offsets, length))))
+
+	def filter_unchanged(self, old_data, new_data, length):
+		"""Returns the subset of candidates at which the length bytes are
+		identical in old and new data."""
+		return self._filter_comparison(old_data, new_data, length, unchanged = True)
+
+	def filter_changed(self, old_data, new_data, length):
+		"""Returns the subset of candidates at which the length bytes differ
+		between old and new data."""
+		return self._filter_comparison(old_data, new_data, length, unchanged = False)
+
+	def _filter_values(self, old_data, new_data, length, byteorder, signed, compare):
+		# All value comparisons imply a change, which is cheap to determine
+		# for all candidates at once
+		offsets = self.filter_changed(old_data, new_data, length)._offset_array()
+		decode = functools.partial(int.from_bytes, byteorder = byteorder, signed = signed)
+		old_values = map(decode, self._gather(old_data, offsets, length))
+		new_values = map(decode, self._gather(new_data, offsets, length))
+		return self.from_offsets(self._size, itertools.compress(offsets, compare(old_values, new_values)))
+
+	def filter_increased(self, old_data, new_data, length, byteorder = "little", signed = False, amount = None):
+		"""Returns the subset of candidates at which the integer of length
+		bytes is greater in the new data than in the old data. If an amount
+		is given, it must have increased by exactly that amount, with
+		wraparound."""
+		if amount is None:
+			return self._filter_values(old_data, new_data, length, byteorder, signed, lambda old_values, new_values: map(operator.lt, old_values, new_values))
+		modulus = 1 << (8 * length)
+		if (amount % modulus) == 0:
+			raise ValueError("Amount of %d does not change a %d bit value." % (amount, 8 * length))
+		differences = lambda old_values, new_values: map(operator.mod, map(operator.sub, new_values, old_values), itertools.repeat(modulus))
+		return self._filter_values(old_data, new_data, length, byteorder, False, lambda old_values, new_values: map((amount % modulus).__eq__, differences(old_values, new_values)))
+
+	def filter_decreased(self, old_data, new_data, length, byteorder = "little", signed = False, amount = None):
+		if amount is None:
+			return self._filter_values(old_data, new_data, length, byteorder, signed, lambda old_values, new_values: map(operator.gt, old_values, new_values))
+		return self.filter_increased(old_data, new_data, length, byteorder = byteorder, amount = -amount)
+
+	def save(self, filename, metadata = None):
+		"""Writes the set to a file, replacing it atomically. Sparse sets are
+		stored as compressed differences between consecutive offsets, dense
+		sets as compressed bitmap."""
+		if self.dense:
+			payload = bytes(self._bitmap)
+		else:
+			differences = array.array("Q", itertools.islice(self._offsets, 1))
+			differences.extend(map(operator.sub, itertools.islice(self._offsets, 1, None), self._offsets))
+			if sys.byteorder != "little":
+				differences.byteswap()
+			payload = differences.tobytes()
+		header = json.dumps({
+			"size":		self._size,
+			"count":	self._count,
+			"dense":	self.dense,
+			"metadata":	metadata,
+		}).encode("utf-8")
+		with open(filename + ".tmp", "wb") as f:
+			f.write(self._MAGIC)
+			f.write(struct.pack("<L", len(header)))
+			f.write(header)
+			f.write(zlib.compress(payload))
+		os.replace(filename + ".tmp", filename)
+
+	@classmethod
+	def load(cls, filename):
+		"""Reads a set written by save() and returns (candidates, metadata)."""
+		with open(filename, "rb") as f:
+			if f.read(len(cls._MAGIC)) != cls._MAGIC:
+				raise ValueError("%s is not a candidate set file." % (filename))
+			(header_length, ) = struct.unpack("<L", f.read(4))
+			header = json.loads(f.read(header_length))
+			payload = zlib.decompress(f.read())
+		if header["dense"]:
+			candidates = cls(size = header["size"], bitmap = bytearray(payload), count = header["count"])
+		else:
+			differences = array.array("Q", payload)
+			if sys.byteorder != "little":
+				differences.byteswap()
+			candidates = cls(size = header["size"], offsets = array.array("Q", itertools.accumulate(differences)))
+		return (candidates, header["metadata"])
+
+	def __iter__(self):
+		if self._offsets is not None:
+			yield from self._offsets
+		else:
+			for (begin, mask) in self._windows():
+				offset = mask.find(1)
+				while offset != -1:
+					yield begin + offset
+					offset = mask.find(1, offset + 1)
+
+	def __len__(self):
+		return self._count
+
+	def __repr__(self):
+		return "CandidateSet<%d of %d, %s>" % (self._count, self._size, "dense" if self.dense else "sparse")
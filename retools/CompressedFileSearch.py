@@ -0,0 +1,91 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import zipfile
+import argparse
+import tempfile
+from .FileSearch import FileSearch
+from .StreamDecompressor import StreamDecompressor
+from .unpack import Classifier
+from .unpack.ClassifierScanner import ClassifierScanner
+
+class CompressedFileSearch():
+	"""Searches the contents of compressed streams and archives that are
+	embedded in a file. Payloads are found using the retools.unpack
+	classifiers and decompressed in memory while they are searched, so
+	nothing is extracted. Occurrences are tagged with a virtual filename
+	such as 'fw.bin@0x1f000:gzip' or 'fw.bin@0x1f000:zip/etc/passwd' and
+	their offsets refer to the decompressed data.
+
+	Decompressed contents are in turn searched for payloads, up to max_depth
+	levels of nesting, e.g., 'fw.bin@0x1f000:gzip@0x200:zip/etc/passwd'. For
+	this, each of them is kept while it is searched, in memory up to
+	_SPOOL_SIZE bytes and in a temporary file beyond that."""
+	_STREAM_ERRORS = StreamDecompressor.DecompressionError + (zipfile.BadZipFile, RuntimeError, NotImplementedError)
+	_SPOOL_SIZE = 16 * 1024 * 1024
+
+	def __init__(self, filename, context_size = 32, max_mismatches = 0, max_depth = 4, archive_limit = None, verbose = 0):
+		if max_depth < 1:
+			raise ValueError("Maximum depth must be at least one level.")
+		self._filename = filename
+		self._context_size = context_size
+		self._max_mismatches = max_mismatches
+		self._max_depth = max_depth
+
+		# Classifiers are only used for scanning and streaming
+		args = argparse.Namespace(archive_limit = archive_limit, verbose = verbose)
+		classifiers = [ classifier_class(args = args) for classifier_class in Classifier.get_all() if classifier_class.can_stream_contents() ]
+		self._scanner = ClassifierScanner(classifiers)
+
+	@staticmethod
+	def _virtual_filename(filename, classifier, start_offset, member_name):
+		virtual_filename = "%s@%#x:%s" % (filename, start_offset, classifier.name)
+		if member_name != "":
+			virtual_filename += "/" + member_name
+		return virtual_filename
+
+	@staticmethod
+	def _spooled(chunks, spool):
+		for chunk in chunks:
+			spool.write(chunk)
+			yield chunk
+
+	def _find_all_in_file(self, f, filename, needles, depth):
+		for (classifier, start_offset, file_length) in self._scanner.scan(f):
+			try:
+				for (member_name, chunks) in classifier.stream_contents(f, start_offset, file_length):
+					virtual_filename = self._virtual_filename(filename, classifier, start_offset, member_name)
+					fs = FileSearch(virtual_filename, context_size = self._context_size, max_mismatches = self._max_mismatches)
+					if depth >= self._max_depth:
+						yield from fs.find_all_multi_in_chunks(chunks, needles)
+						continue
+					with tempfile.SpooledTemporaryFile(max_size = self._SPOOL_SIZE, prefix = "retools_") as spool:
+						yield from fs.find_all_multi_in_chunks(self._spooled(chunks, spool), needles)
+						yield from self._find_all_in_file(spool, virtual_filename, needles, depth + 1)
+			except self._STREAM_ERRORS:
+				# Corrupt or false positive payload; whatever was found up
+				# to this point has already been reported.
+				pass
+
+	def find_all_multi(self, needles):
+		needles = list(needles)
+		with open(self._filename, "rb") as f:
+			yield from self._find_all_in_file(f, self._filename, needles, 1)
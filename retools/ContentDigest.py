@@ -0,0 +1,74 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import hashlib
+
+class ContentDigest():
+	"""Computes hashes of file contents. Digests are remembered by the
+	identity of the file (device, inode, size and modification time), so
+	hard links and files that did not change are only ever read once. When
+	a database connection is given, digests are also persisted there."""
+	_CHUNK_SIZE = 1024 * 1024
+
+	def __init__(self, db = None):
+		self._db = db
+		self._digests = { }
+		if self._db is not None:
+			self._db.execute("CREATE TABLE IF NOT EXISTS digests (device INTEGER NOT NULL, inode INTEGER NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL, digest BLOB NOT NULL, PRIMARY KEY (device, inode))")
+
+	@staticmethod
+	def identity(filename):
+		stat = os.stat(filename)
+		return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+	@classmethod
+	def hash_file(cls, filename):
+		content_hash = hashlib.blake2b(digest_size = 20)
+		with open(filename, "rb") as f:
+			while True:
+				chunk = f.read(cls._CHUNK_SIZE)
+				if len(chunk) == 0:
+					break
+				content_hash.update(chunk)
+		return content_hash.digest()
+
+	def _lookup(self, identity):
+		if identity in self._digests:
+			return self._digests[identity]
+		if self._db is not None:
+			(device, inode, size, mtime) = identity
+			row = self._db.execute("SELECT digest FROM digests WHERE device = ? AND inode = ? AND size = ? AND mtime = ?", (device, inode, size, mtime)).fetchone()
+			if row is not None:
+				self._digests[identity] = row[0]
+				return row[0]
+		return None
+
+	def digest(self, filename, identity = None):
+		if identity is None:
+			identity = self.identity(filename)
+		digest = self._lookup(identity)
+		if digest is None:
+			digest = self.hash_file(filename)
+			self._digests[identity] = digest
+			if self._db is not None:
+				self._db.execute("INSERT OR REPLACE INTO digests (device, inode, size, mtime, digest) VALUES (?, ?, ?, ?, ?)", identity + (digest, ))
+		return digest
@@ -20,9 +20,15 @@
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
 import re
+import struct
 import base64
 import collections
 from .MultiRegex import MultiRegex, NoRegexMatchedException
+from .MaskedPattern import MaskedPattern
+from .RangePattern import RangePattern
+from .FloatPattern import FloatPattern
+from .PreciseFloat import PreciseFloat
+from .RegexPattern import RegexPattern
 
 class EncodingException(ValueError): pass
 
@@ -31,12 +37,14 @@ class EncodableTypes():
 	_Encoder = collections.namedtuple("Encoder", [ "name", "encode" ])
 
 	_KNOWN_ENCODING_PATTERNS = MultiRegex(collections.OrderedDict((
-		("int",		re.compile(r"(?P<sign>[us])int(?P<len>\d+)(-(?P<endian>[bl?])e)?")),
+		("int",		re.compile(r"(?P<sign>[us])int(?P<len>\d+)(-(?P<endian>[bl?])e)?(-a(?P<align>\d+))?")),
 		("str",		re.compile(r"str(-(?P<encoding>[-a-zA-Z0-9*]+))?")),
-		("float",	re.compile(r"float(?P<length>\d+)?(-(?P<endian>[bl])e)?")),
+		("float",	re.compile(r"float(?P<length>\d+)?(-(?P<endian>[bl?])e)?(-a(?P<align>\d+))?")),
 		("hex",		re.compile(r"hex")),
+		("mask",	re.compile(r"mask")),
 		("base64",	re.compile(r"b(ase)?64")),
 		("ip",		re.compile(r"ip")),
+		("regex",	re.compile(r"re(-(?P<max_length>\d+))?")),
 	)))
 	_STR_ENCODING_ALIASES = {
 		"lat1":		"latin1",
@@ -81,11 +89,35 @@ class EncodableTypes():
 			value = (2 ** bits) + value
 		return value.to_bytes(length = length, byteorder = "little" if little_endian else "big")
 
+	@classmethod
+	def encode_int_range(cls, value, signed, little_endian, length, alignment):
+		low_high = value.split("..")
+		if len(low_high) == 1:
+			low_high = [ value, value ]
+		elif len(low_high) != 2:
+			raise EncodingException("Cannot encode '%s' as integer range, expected lower and upper bound separated by '..'." % (value))
+		(low, high) = (cls.decode_int(bound) for bound in low_high)
+		try:
+			return RangePattern(low, high, length, byteorder = "little" if little_endian else "big", signed = signed, alignment = alignment)
+		except ValueError as e:
+			raise EncodingException("Cannot encode '%s' as integer range: %s" % (value, str(e)))
+
+	@classmethod
+	def encode_int(cls, value, signed, little_endian, length, alignment = 1):
+		# Ranges and aligned values are matched by a RangePattern
+		if (alignment > 1) or (".." in value):
+			return cls.encode_int_range(value, signed, little_endian, length, alignment)
+		elif signed:
+			return cls.encode_sint(value, little_endian, length)
+		else:
+			return cls.encode_uint(value, little_endian, length)
+
 	@classmethod
 	def _match_int(cls, pattern, name, match):
 		sign = match["sign"] or "s"
 		length = int(match["len"])
 		endian = match["endian"] or "l"
+		alignment = int(match["align"] or "1")
 		if (length % 8) != 0:
 			raise EncodingException("Cannot encode '%s', bit length is not divisible by 8." % (pattern))
 		if length <= 0:
@@ -99,11 +131,11 @@ class EncodableTypes():
 		for endian_char in endian_chars:
 			little_endian = (endian_char == "l")
 			length_bytes = length // 8
-			if sign == "s":
-				encoder = lambda value: cls.encode_sint(value, little_endian, length_bytes)
-			else:
-				encoder = lambda value: cls.encode_uint(value, little_endian, length_bytes)
-			yield cls._Encoder(name = "%sint-%d-%se" % (sign, length, endian_char), encode = encoder)
+			encoder = lambda value: cls.encode_int(value, sign == "s", little_endian, length_bytes, alignment)
+			name = "%sint-%d-%se" % (sign, length, endian_char)
+			if alignment > 1:
+				name += "-a%d" % (alignment)
+			yield cls._Encoder(name = name, encode = encoder)
 
 	@classmethod
 	def _match_str(cls, pattern, name, match):
@@ -117,11 +149,70 @@ class EncodableTypes():
 			encoder = lambda value: value.encode(encoding = encoding)
 			yield cls._Encoder(name = "str-%s" % (encoding), encode = encoder)
 
+	@classmethod
+	def decode_float(cls, value):
+		try:
+			return PreciseFloat(value).value
+		except ValueError as e:
+			raise EncodingException(str(e))
+
+	@classmethod
+	def encode_float(cls, value, little_endian, length, alignment = 1):
+		"""Encodes a float as the nearest representable value. Alternatively,
+		an inclusive range ('1.5..2.5'), an absolute tolerance ('3.14159~1e-4')
+		or a relative tolerance in percent ('3.14159~0.1%') can be given, in
+		which case a FloatPattern is returned."""
+		byteorder = "little" if little_endian else "big"
+		if "~" in value:
+			(center, tolerance) = value.split("~", maxsplit = 1)
+			center = cls.decode_float(center)
+			if tolerance.endswith("%"):
+				tolerance = abs(center) * cls.decode_float(tolerance[:-1]) / 100
+			else:
+				tolerance = cls.decode_float(tolerance)
+			(low, high) = (center - tolerance, center + tolerance)
+		elif ".." in value:
+			low_high = value.split("..")
+			if len(low_high) != 2:
+				raise EncodingException("Cannot encode '%s' as float range, expected lower and upper bound separated by '..'." % (value))
+			(low, high) = (cls.decode_float(bound) for bound in low_high)
+		else:
+			struct_format = ("<" if little_endian else ">") + FloatPattern._STRUCT_FORMATS[length]
+			try:
+				encoded = struct.pack(struct_format, float(cls.decode_float(value)))
+			except OverflowError as e:
+				raise EncodingException("Cannot encode '%s' as float of %d bits: %s" % (value, 8 * length, str(e)))
+			if alignment == 1:
+				return encoded
+			# Aligned values are matched by a FloatPattern
+			low = high = struct.unpack(struct_format, encoded)[0]
+
+		try:
+			return FloatPattern(low, high, length, byteorder = byteorder, alignment = alignment)
+		except ValueError as e:
+			raise EncodingException("Cannot encode '%s' as float range: %s" % (value, str(e)))
+
 	@classmethod
 	def _match_float(cls, pattern, name, match):
 		length = int(match["length"] or "32")
 		endian = match["endian"] or "l"
-		raise NotImplementedError("Float support not yet implemented")
+		alignment = int(match["align"] or "1")
+		if length not in [ 16, 32, 64 ]:
+			raise EncodingException("Cannot encode '%s', floats must be 16, 32 or 64 bits long." % (pattern))
+
+		if endian in [ "b", "l" ]:
+			endian_chars = [ endian ]
+		else:
+			endian_chars = [ "b", "l" ]
+
+		for endian_char in endian_chars:
+			little_endian = (endian_char == "l")
+			length_bytes = length // 8
+			encoder = lambda value: cls.encode_float(value, little_endian, length_bytes, alignment)
+			name = "float-%d-%se" % (length, endian_char)
+			if alignment > 1:
+				name += "-a%d" % (alignment)
+			yield cls._Encoder(name = name, encode = encoder)
 
 	@classmethod
 	def _match_ip(cls, pattern, name, match):
@@ -152,9 +243,45 @@ class EncodableTypes():
 		yield cls._Encoder(name = "ipv4-be", encode = _encode_ip_be_int)
 		yield cls._Encoder(name = "ipv4-le", encode = _encode_ip_le_int)
 
+	@classmethod
+	def encode_hex(cls, value):
+		try:
+			if "?" in value:
+				return MaskedPattern.parse(value)
+			else:
+				return bytes.fromhex(value)
+		except ValueError as e:
+			raise EncodingException("Cannot encode '%s' as hex: %s" % (value, str(e)))
+
+	@classmethod
+	def encode_mask(cls, value):
+		value_mask = value.split("/")
+		if len(value_mask) != 2:
+			raise EncodingException("Cannot encode '%s' as masked value, expected hex value and hex mask separated by '/'." % (value))
+		try:
+			return MaskedPattern(bytes.fromhex(value_mask[0]), bytes.fromhex(value_mask[1]))
+		except ValueError as e:
+			raise EncodingException("Cannot encode '%s' as masked value: %s" % (value, str(e)))
+
 	@classmethod
 	def _match_hex(cls, pattern, name, match):
-		yield cls._Encoder(name = name, encode = lambda value: bytes.fromhex(value))
+		yield cls._Encoder(name = name, encode = cls.encode_hex)
+
+	@classmethod
+	def _match_mask(cls, pattern, name, match):
+		yield cls._Encoder(name = name, encode = cls.encode_mask)
+
+	@classmethod
+	def encode_regex(cls, value, max_length):
+		try:
+			return RegexPattern(value, max_length)
+		except ValueError as e:
+			raise EncodingException("Cannot encode '%s' as regular expression: %s" % (value, str(e)))
+
+	@classmethod
+	def _match_regex(cls, pattern, name, match):
+		max_length = int(match["max_length"] or "256")
+		yield cls._Encoder(name = "re-%d" % (max_length), encode = lambda value: cls.encode_regex(value, max_length))
 
 	@classmethod
 	def _match_base64(cls, pattern, name, match):
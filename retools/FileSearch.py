@@ -20,53 +20,222 @@
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
 import collections
+import heapq
+import mmap
+from .ApproximatePattern import ApproximatePattern
+from .PrefetchReader import PrefetchReader
 
 class FileSearch():
-	_Occurrence = collections.namedtuple("Occurrence", [ "filename", "offset", "pre", "post" ])
+	_Occurrence = collections.namedtuple("Occurrence", [ "filename", "offset", "needle", "pre", "data", "post" ])
 	_MIN_CHUNK_SIZE = 1024 * 1024
 
-	def __init__(self, filename, context_size = 32):
+	def __init__(self, filename, context_size = 32, use_mmap = True, index = None, max_mismatches = 0, chunk_size = None, prefetch = 0):
 		self._filename = filename
 		self._context_size = context_size
-		pass
+		self._use_mmap = use_mmap and (prefetch == 0)
+		self._chunk_size = chunk_size or self._MIN_CHUNK_SIZE
+		self._prefetch = prefetch
+		self._index = index
+		self._max_mismatches = max_mismatches
+		self._approximate_patterns = { }
 
-	def _read_before(self, f, offset):
-		pre_offset = max(0, offset - self._context_size)
-		pre_size = offset - pre_offset
-		f.seek(pre_offset)
-		return f.read(pre_size)
+	@staticmethod
+	def _bytes_finditer(buffer, needle, begin_offset):
+		while True:
+			match_offset = buffer.find(needle, begin_offset)
+			if match_offset == -1:
+				break
+			yield match_offset
+			begin_offset = match_offset + 1
 
-	def _read_after(self, f, offset):
-		f.seek(offset)
-		return f.read(self._context_size)
+	def _search_pattern(self, needle):
+		if isinstance(needle, (bytes, bytearray)) and (self._max_mismatches > 0):
+			if needle not in self._approximate_patterns:
+				self._approximate_patterns[needle] = ApproximatePattern(needle, self._max_mismatches)
+			return self._approximate_patterns[needle]
+		return needle
+
+	def _buffer_findall(self, buffer, buffer_offset, needle_index, needle, begin_offset, end_offset):
+		# Needles are either bytes or pattern objects (e.g., a MaskedPattern)
+		# that know how to find themselves in a buffer. Patterns may require
+		# an alignment relative to the start of the data.
+		pattern = self._search_pattern(needle)
+		if isinstance(pattern, (bytes, bytearray)):
+			match_offsets = self._bytes_finditer(buffer, pattern, begin_offset)
+			alignment = 1
+		else:
+			match_offsets = pattern.finditer(buffer, begin_offset)
+			alignment = getattr(pattern, "alignment", 1)
+		for match_offset in match_offsets:
+			if match_offset >= end_offset:
+				break
+			if (alignment == 1) or (((buffer_offset + match_offset) % alignment) == 0):
+				yield (match_offset, needle_index)
+
+	def _search_buffer(self, buffer, buffer_offset, needles, begin_offset, end_offset):
+		"""Finds all needles that start within [begin_offset, end_offset) of
+		the buffer. Context is sliced out of the very same buffer, so there is
+		no I/O involved for any of the occurrences."""
+		view = memoryview(buffer)
+		matches = [ self._buffer_findall(buffer, buffer_offset, needle_index, needle, begin_offset, end_offset) for (needle_index, needle) in enumerate(needles) ]
+		for (match_offset, needle_index) in heapq.merge(*matches):
+			needle = needles[needle_index]
+			if hasattr(needle, "match_length"):
+				# Variable length pattern, len() is only its maximum length
+				match_end = match_offset + needle.match_length(buffer, match_offset)
+			else:
+				match_end = match_offset + len(needle)
+			pre = view[max(0, match_offset - self._context_size) : match_offset]
+			post = view[match_end : match_end + self._context_size]
+			data = view[match_offset : match_end]
+			yield self._Occurrence(filename = self._filename, offset = buffer_offset + match_offset, needle = needle, pre = pre, data = data, post = post)
+
+	def _read_chunks(self, f, length = None):
+		while (length is None) or (length > 0):
+			chunk_size = self._chunk_size if (length is None) else min(length, self._chunk_size)
+			chunk = f.read(chunk_size)
+			if len(chunk) == 0:
+				break
+			if length is not None:
+				length -= len(chunk)
+			yield chunk
+
+	def _search_stream(self, chunks, needles, stream_offset = 0, begin_offset = 0, end_offset = None):
+		"""Searches consecutive chunks of data, the first of which is located
+		at stream_offset, for needles that start within [begin_offset,
+		end_offset). The unsearched tail of the buffer is carried over to the
+		next chunk together with the pre-context so that matches and context
+		spanning chunk borders are complete."""
+		overlap = max(len(needle) for needle in needles) - 1
+		buffer = bytes()
+		buffer_offset = stream_offset
+		scan_offset = begin_offset - stream_offset
+		for chunk in chunks:
+			buffer = (buffer + chunk) if (len(buffer) > 0) else chunk
+
+			# Matches are only reported when the needle and the post-context
+			# have been read in full
+			scan_end = len(buffer) - overlap - self._context_size
+			if end_offset is not None:
+				scan_end = min(scan_end, end_offset - buffer_offset)
+			if scan_end > scan_offset:
+				yield from self._search_buffer(buffer, buffer_offset, needles, scan_offset, scan_end)
+				keep_offset = max(0, scan_end - self._context_size)
+				buffer = buffer[keep_offset:]
+				buffer_offset += keep_offset
+				scan_offset = scan_end - keep_offset
+				if (end_offset is not None) and (buffer_offset + scan_offset >= end_offset):
+					return
+
+		scan_end = len(buffer)
+		if end_offset is not None:
+			scan_end = min(scan_end, end_offset - buffer_offset)
+		yield from self._search_buffer(buffer, buffer_offset, needles, scan_offset, scan_end)
+
+	@staticmethod
+	def _mmap(f):
+		try:
+			mapping = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		except (ValueError, OSError):
+			# Empty files, pipes, character devices and the likes cannot be
+			# mapped.
+			return None
+		if hasattr(mmap, "MADV_SEQUENTIAL"):
+			mapping.madvise(mmap.MADV_SEQUENTIAL)
+		return mapping
 
 	def find_all(self, needle):
-		chunk_size = self._MIN_CHUNK_SIZE + len(needle)
+		yield from self.find_all_multi([ needle ])
+
+	def find_all_multi_in_chunks(self, chunks, needles):
+		"""Like find_all_multi(), but searches an iterable of consecutive data
+		chunks (e.g., the output of a decompressor) instead of the file. The
+		filename is only used to tag occurrences and offsets are relative to
+		the beginning of the data."""
+		needles = list(needles)
+		if len(needles) == 0:
+			return
+		yield from self._search_stream(chunks, needles)
+
+	def _search_file_range(self, f, mapping, needles, begin_offset, end_offset):
+		if mapping is None:
+			stream_offset = max(0, begin_offset - self._context_size)
+			if end_offset is None:
+				read_length = None
+			else:
+				overlap = max(len(needle) for needle in needles) - 1
+				read_length = end_offset + overlap + self._context_size - stream_offset
+			f.seek(stream_offset)
+			if self._prefetch > 0:
+				chunks = PrefetchReader(f, chunk_size = self._chunk_size, queue_depth = self._prefetch, length = read_length)
+			else:
+				chunks = self._read_chunks(f, read_length)
+			yield from self._search_stream(chunks, needles, stream_offset = stream_offset, begin_offset = begin_offset, end_offset = end_offset)
+		else:
+			if end_offset is None:
+				end_offset = len(mapping)
+			yield from self._search_buffer(mapping, 0, needles, begin_offset, min(end_offset, len(mapping)))
+
+	def _search_ranges(self, needles, begin_offset, end_offset):
+		if (self._index is None) or (self._max_mismatches > 0):
+			return [ (begin_offset, end_offset) ]
+		candidate_ranges = self._index.candidate_ranges(self._filename, needles)
+		if candidate_ranges is None:
+			return [ (begin_offset, end_offset) ]
+
+		# Restrict the candidates to the requested range
+		ranges = [ ]
+		for (range_begin, range_end) in candidate_ranges:
+			range_begin = max(range_begin, begin_offset)
+			if end_offset is not None:
+				range_end = min(range_end, end_offset)
+			if range_begin < range_end:
+				ranges.append((range_begin, range_end))
+		return ranges
+
+	def find_all_multi(self, needles, begin_offset = 0, end_offset = None):
+		"""Searches for all needles at once, so that the file only needs to be
+		read a single time regardless of the number of needles. Occurrences are
+		yielded in ascending offset order and each one references the needle
+		that matched. Context is returned as memoryviews into the searched
+		buffer; the file is memory-mapped if possible and only read in chunks
+		if it is not.
+
+		With prefetch set, the file is never memory-mapped. Instead, a
+		background thread reads up to that many chunks ahead while the current
+		one is searched, which helps on slow or high latency storage.
+
+		When begin_offset and end_offset are given, only occurrences starting
+		in [begin_offset, end_offset) are reported. Needles and context may
+		still extend beyond that range, so adjacent ranges of a file can be
+		searched independently of each other.
+
+		If an NGramIndex is used and the file is indexed, only the blocks which
+		the index considers candidates are searched.
+
+		With max_mismatches set, byte needles also match if up to that many
+		bytes differ (Hamming distance)."""
+		needles = list(needles)
+		if len(needles) == 0:
+			return
+
+		ranges = self._search_ranges(needles, begin_offset, end_offset)
+		if len(ranges) == 0:
+			return
+
 		with open(self._filename, "rb") as f:
-			file_offset = 0
-			while True:
-				f.seek(file_offset)
-				chunk = f.read(chunk_size)
-
-				# Find all matches
-				chunk_offset = 0
-				while True:
-					match_offset = chunk.find(needle, chunk_offset)
-					if match_offset == -1:
-						break
-					abs_offset = match_offset + file_offset
-					pre = self._read_before(f, abs_offset)
-					post = self._read_after(f, abs_offset + len(needle))
-					yield self._Occurrence(filename = self._filename, offset = abs_offset, pre = pre, post = post)
-					chunk_offset = match_offset + 1
-
-				if len(chunk) != chunk_size:
-					# End of file
-					break
-
-				# Do not advance full chunk size, or we won't catch patterns at
-				# the chunk border
-				file_offset += self._MIN_CHUNK_SIZE + 1
+			mapping = self._mmap(f) if self._use_mmap else None
+			try:
+				for (range_begin, range_end) in ranges:
+					yield from self._search_file_range(f, mapping, needles, range_begin, range_end)
+			finally:
+				if mapping is not None:
+					try:
+						mapping.close()
+					except BufferError:
+						# Occurrences that are still referenced keep the
+						# mapping alive; it is unmapped when they are gone.
+						pass
 
 if __name__ == "__main__":
 	fs = FileSearch("/tmp/x")
@@ -19,6 +19,9 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import os
+import errno
+
 class FileTools():
 	@classmethod
 	def carve(cls, source_file, dest_file, length):
@@ -27,3 +30,35 @@ class FileTools():
 			chunk = source_file.read(min(length, max_chunk_size))
 			length -= len(chunk)
 			dest_file.write(chunk)
+
+	@classmethod
+	def _enumerate_dir(cls, dirname, recurse, error_callback):
+		try:
+			names = os.listdir(dirname)
+		except OSError as e:
+			if error_callback is not None:
+				error_callback(dirname, e)
+			return
+		for name in sorted(names):
+			full_filename = dirname + "/" + name
+			if os.path.islink(full_filename):
+				continue
+			elif os.path.isfile(full_filename):
+				yield full_filename
+			elif recurse and os.path.isdir(full_filename):
+				yield from cls._enumerate_dir(full_filename, recurse, error_callback)
+
+	@classmethod
+	def enumerate_files(cls, filenames, recurse = False, error_callback = None):
+		"""Yields the given files and the files in the given directories and,
+		if requested, their subdirectories, in sorted order. Symbolic links
+		within directories are skipped, given ones are followed. Given names
+		that do not exist and directories that cannot be listed are passed
+		to error_callback(filename, error), if given."""
+		for filename in filenames:
+			if os.path.isfile(filename):
+				yield filename
+			elif os.path.isdir(filename):
+				yield from cls._enumerate_dir(filename, recurse, error_callback)
+			elif error_callback is not None:
+				error_callback(filename, FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filename))
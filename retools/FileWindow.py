@@ -0,0 +1,64 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import io
+
+class FileWindow(io.RawIOBase):
+	"""Read-only, seekable view of the region [offset, offset + length) of an
+	underlying file object, which appears as a file of its own."""
+
+	def __init__(self, f, offset, length):
+		io.RawIOBase.__init__(self)
+		self._f = f
+		self._offset = offset
+		self._length = length
+		self._position = 0
+
+	def readable(self):
+		return True
+
+	def seekable(self):
+		return True
+
+	def tell(self):
+		return self._position
+
+	def seek(self, position, whence = io.SEEK_SET):
+		if whence == io.SEEK_SET:
+			self._position = position
+		elif whence == io.SEEK_CUR:
+			self._position += position
+		elif whence == io.SEEK_END:
+			self._position = self._length + position
+		else:
+			raise ValueError("Invalid whence value: %s" % (whence))
+		self._position = max(0, self._position)
+		return self._position
+
+	def readinto(self, buffer):
+		length = max(0, min(len(buffer), self._length - self._position))
+		if length == 0:
+			return 0
+		self._f.seek(self._offset + self._position)
+		data = self._f.read(length)
+		buffer[ : len(data)] = data
+		self._position += len(data)
+		return len(data)
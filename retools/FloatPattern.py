@@ -0,0 +1,127 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import struct
+import fractions
+from .RangePattern import RangePattern
+
+class FloatPattern(RangePattern):
+	"""IEEE 754 floating point number whose value lies within an inclusive
+	range. Finite floats of the same sign are ordered like their bit
+	patterns interpreted as integers, so the range corresponds to at most
+	two ranges of bit patterns (one for negative and one for positive
+	values) which are then matched exactly like integer ranges."""
+	_STRUCT_FORMATS = {
+		2:		"e",
+		4:		"f",
+		8:		"d",
+	}
+
+	def __init__(self, low, high, length, byteorder = "little", alignment = 1):
+		if length not in self._STRUCT_FORMATS:
+			raise ValueError("Floats must be 16, 32 or 64 bits long, not %d bits." % (8 * length))
+		if byteorder not in [ "little", "big" ]:
+			raise ValueError("Byte order must be either 'little' or 'big', not '%s'." % (byteorder))
+		if alignment <= 0:
+			raise ValueError("Alignment must be at least one byte.")
+		if low > high:
+			raise ValueError("Lower bound %s of range is greater than upper bound %s." % (low, high))
+		self._low = fractions.Fraction(low)
+		self._high = fractions.Fraction(high)
+		self._length = length
+		self._byteorder = byteorder
+		self._signed = False
+		self._alignment = alignment
+		self._struct = struct.Struct("<" + self._STRUCT_FORMATS[length])
+		self._sign_bit = 1 << (8 * length - 1)
+
+		# Order preserving keys of the smallest and largest finite float
+		min_key = self._key_of(self._struct.unpack(self._struct.pack(float("-inf")))[0]) + 1
+		max_key = self._key_of(self._struct.unpack(self._struct.pack(float("inf")))[0]) - 1
+		self._low_key = self._bisect(min_key, max_key + 1, lambda key: self._value_of_key(key) >= self._low)
+		self._high_key = self._bisect(min_key, max_key + 1, lambda key: self._value_of_key(key) > self._high) - 1
+		if self._low_key > self._high_key:
+			raise ValueError("No %d bit float lies within %s..%s." % (8 * length, float(self._low), float(self._high)))
+		self._compile()
+
+	@staticmethod
+	def _bisect(low, high, predicate):
+		"""Returns the smallest value in [low, high) for which the monotonic
+		predicate is true, or high if there is none."""
+		while low < high:
+			middle = (low + high) // 2
+			if predicate(middle):
+				high = middle
+			else:
+				low = middle + 1
+		return low
+
+	def _bits_of(self, value):
+		return int.from_bytes(self._struct.pack(value), byteorder = "little")
+
+	def _key_of(self, value):
+		bits = self._bits_of(value)
+		if bits & self._sign_bit:
+			return (~bits) & ((self._sign_bit << 1) - 1)
+		else:
+			return bits | self._sign_bit
+
+	def _bits_of_key(self, key):
+		if key & self._sign_bit:
+			return key ^ self._sign_bit
+		else:
+			return (~key) & ((self._sign_bit << 1) - 1)
+
+	def _value_of_key(self, key):
+		return fractions.Fraction(self._struct.unpack(self._bits_of_key(key).to_bytes(self._length, byteorder = "little"))[0])
+
+	def _unsigned_ranges(self):
+		ranges = [ ]
+		if self._low_key < self._sign_bit:
+			# Bit patterns of negative numbers decrease with increasing value
+			ranges.append((self._bits_of_key(min(self._high_key, self._sign_bit - 1)), self._bits_of_key(self._low_key)))
+		if self._high_key >= self._sign_bit:
+			ranges.append((self._bits_of_key(max(self._low_key, self._sign_bit)), self._bits_of_key(self._high_key)))
+		return ranges
+
+	def encode(self, value):
+		return self._bits_of(value).to_bytes(self._length, byteorder = self._byteorder)
+
+	def decode(self, data):
+		return self._struct.unpack(int.from_bytes(data, byteorder = self._byteorder).to_bytes(self._length, byteorder = "little"))[0]
+
+	def matches(self, data):
+		return (len(data) == len(self)) and (self._low <= fractions.Fraction(self.decode(data)) <= self._high)
+
+	def hex(self):
+		return "%s..%s" % (self.encode(float(self._value_of_key(self._low_key))).hex(), self.encode(float(self._value_of_key(self._high_key))).hex())
+
+	def _key(self):
+		return (self._low, self._high, self._length, self._byteorder, self._alignment)
+
+	def __eq__(self, other):
+		return isinstance(other, FloatPattern) and (self._key() == other._key())
+
+	def __hash__(self):
+		return hash(self._key())
+
+	def __repr__(self):
+		return "FloatPattern<%s, %s..%s, align %d>" % (self.hex(), float(self._low), float(self._high), self._alignment)
@@ -0,0 +1,80 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import collections
+import concurrent.futures
+
+class JobScheduler():
+	"""Runs jobs in a pool of processes while keeping only a bounded number
+	of them pending, so that jobs can be created lazily and finished results
+	do not pile up. Large inputs are split into byte ranges that are
+	processed as separate jobs."""
+
+	def __init__(self, jobs = None):
+		self._jobs = jobs or os.cpu_count()
+		self._max_pending = 4 * self._jobs
+
+	@property
+	def jobs(self):
+		return self._jobs
+
+	@staticmethod
+	def split(length, split_size):
+		"""Yields (begin_offset, end_offset) ranges of at most split_size bytes
+		that cover the length. The end_offset of the last range is None."""
+		for begin_offset in range(0, max(length, 1), split_size):
+			end_offset = begin_offset + split_size
+			yield (begin_offset, end_offset if (end_offset < length) else None)
+
+	@staticmethod
+	def completed(result):
+		"""Returns a future that already has the result, for jobs that do not
+		need to be run."""
+		future = concurrent.futures.Future()
+		future.set_result(result)
+		return future
+
+	def executor(self):
+		return concurrent.futures.ProcessPoolExecutor(max_workers = self._jobs)
+
+	def run(self, jobs, submit, ordered = True):
+		"""Calls submit(job) for all jobs, which returns a future, and yields
+		(job, future) for all of them. In ordered mode, they are yielded in the
+		order of the jobs and the future may still be running; otherwise they
+		are yielded as soon as they are done."""
+		if ordered:
+			pending = collections.deque()
+			for job in jobs:
+				pending.append((job, submit(job)))
+				if len(pending) >= self._max_pending:
+					yield pending.popleft()
+			yield from pending
+		else:
+			pending = { }
+			for job in jobs:
+				pending[submit(job)] = job
+				if len(pending) >= self._max_pending:
+					(done, not_done) = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+					for future in done:
+						yield (pending.pop(future), future)
+			for future in concurrent.futures.as_completed(pending):
+				yield (pending[future], future)
@@ -0,0 +1,113 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import collections
+from .FileSearch import FileSearch
+from .MagicSignatures import SIGNATURES
+
+class MagicScanner():
+	"""Looks for well-known constants of cryptographic algorithms (S-boxes,
+	initialization vectors, round constants, curve parameters). Every
+	signature is expanded into all byte representations it is commonly stored
+	in and all of them are searched for in a single pass over the file."""
+	_Match = collections.namedtuple("Match", [ "filename", "offset", "name", "variant" ])
+
+	def __init__(self, signatures = None):
+		self._signatures = SIGNATURES if (signatures is None) else signatures
+		self._needles = collections.OrderedDict()
+		for signature in self._signatures:
+			for (variant, needle) in self._expand(signature):
+				self._needles.setdefault(needle, [ ]).append((signature, variant))
+
+	@staticmethod
+	def _pack_words(words, width, byteorder):
+		return b"".join(word.to_bytes(width, byteorder = byteorder) for word in words)
+
+	@classmethod
+	def _expand_words32(cls, words):
+		yield ("32-bit le", cls._pack_words(words, 4, "little"))
+		yield ("32-bit be", cls._pack_words(words, 4, "big"))
+		yield ("64-bit le", cls._pack_words(words, 8, "little"))
+		yield ("64-bit be", cls._pack_words(words, 8, "big"))
+
+	@classmethod
+	def _expand_words64(cls, words):
+		yield ("64-bit le", cls._pack_words(words, 8, "little"))
+		yield ("64-bit be", cls._pack_words(words, 8, "big"))
+
+		# Implementations on 32-bit platforms often store each 64-bit word as
+		# two 32-bit words; the variants in which the word order matches the
+		# byte order are identical to the 64-bit representations.
+		high_first = [ half for word in words for half in (word >> 32, word & 0xffffffff) ]
+		low_first = [ half for word in words for half in (word & 0xffffffff, word >> 32) ]
+		yield ("32-bit le, high word first", cls._pack_words(high_first, 4, "little"))
+		yield ("32-bit be, low word first", cls._pack_words(low_first, 4, "big"))
+
+	@classmethod
+	def _expand_bignum(cls, value):
+		length = (value.bit_length() + 7) // 8
+		yield ("be", value.to_bytes(length, byteorder = "big"))
+		yield ("le", value.to_bytes(length, byteorder = "little"))
+
+		# Multiprecision libraries store limbs least significant first, each
+		# limb in native byte order; for little endian this is identical to
+		# the plain little endian representation.
+		for limb_size in [ 4, 8 ]:
+			limb_count = (length + limb_size - 1) // limb_size
+			mask = (1 << (8 * limb_size)) - 1
+			limbs = [ (value >> (8 * limb_size * i)) & mask for i in range(limb_count) ]
+			yield ("%d-bit limbs be" % (8 * limb_size), cls._pack_words(limbs, limb_size, "big"))
+
+	@classmethod
+	def _expand(cls, signature):
+		if signature.kind == "bytes":
+			yield ("bytes", signature.value)
+		elif signature.kind == "words32":
+			yield from cls._expand_words32(signature.value)
+		elif signature.kind == "words64":
+			yield from cls._expand_words64(signature.value)
+		elif signature.kind == "bignum":
+			yield from cls._expand_bignum(signature.value)
+		else:
+			raise ValueError("Unknown signature kind '%s' for %s." % (signature.kind, signature.name))
+
+	@property
+	def signatures(self):
+		return iter(self._signatures)
+
+	@property
+	def needles(self):
+		return self._needles.keys()
+
+	def identify(self, needle):
+		"""Returns a list of all (signature, variant) tuples that the needle
+		represents."""
+		return self._needles[needle]
+
+	def matches_of(self, filename, occurrence):
+		"""Converts a search occurrence of one of the needles into matches."""
+		for (signature, variant) in self.identify(occurrence.needle):
+			yield self._Match(filename = filename, offset = occurrence.offset, name = signature.name, variant = variant)
+
+	def scan(self, filename):
+		fs = FileSearch(filename, context_size = 0)
+		for occurrence in fs.find_all_multi(self.needles):
+			yield from self.matches_of(filename, occurrence)
@@ -0,0 +1,75 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import collections
+
+Signature = collections.namedtuple("Signature", [ "name", "kind", "value" ])
+
+# Signature kinds:
+#	bytes		Byte string, found verbatim.
+#	words32		List of 32-bit words, found in both endiannesses and also
+#				zero-extended to 64-bit words.
+#	words64		List of 64-bit words, found in both endiannesses and also
+#				split into pairs of 32-bit words.
+#	bignum		Large integer, found as big or little endian byte string and
+#				as 32-bit or 64-bit big endian words, least significant first.
+#
+# Word lists are deliberately truncated to what suffices to identify the
+# constant; the full tables would not produce any additional hits.
+SIGNATURES = [
+	Signature(name = "AES S-box", kind = "bytes", value = bytes.fromhex("637c777bf26b6fc53001672bfed7ab76ca82c97dfa5947f0add4a2af9ca472c0b7fd9326363ff7cc34a5e5f171d8311504c723c31896059a071280e2eb27b275")),
+	Signature(name = "AES inverse S-box", kind = "bytes", value = bytes.fromhex("52096ad53036a538bf40a39e81f3d7fb7ce339829b2fff87348e4344c4dee9cb547b9432a6c2233dee4c950b42fac34e082ea16628d924b2765ba2496d8bd125")),
+	Signature(name = "AES T-table Te0", kind = "words32", value = [ 0xc66363a5, 0xf87c7c84, 0xee777799, 0xf67b7b8d, 0xfff2f20d, 0xd66b6bbd, 0xde6f6fb1, 0x91c5c554 ]),
+	Signature(name = "AES T-table Td0", kind = "words32", value = [ 0x51f4a750, 0x7e416553, 0x1a17a4c3, 0x3a275e96, 0x3bab6bcb, 0x1f9d45f1, 0xacfa58ab, 0x4be30393 ]),
+	Signature(name = "DES initial permutation", kind = "bytes", value = bytes([ 58, 50, 42, 34, 26, 18, 10, 2, 60, 52, 44, 36, 28, 20, 12, 4, 62, 54, 46, 38, 30, 22, 14, 6, 64, 56, 48, 40, 32, 24, 16, 8 ])),
+	Signature(name = "DES S-box S1", kind = "bytes", value = bytes([ 14, 4, 13, 1, 2, 15, 11, 8, 3, 10, 6, 12, 5, 9, 0, 7 ])),
+	Signature(name = "Blowfish P-array", kind = "words32", value = [ 0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344, 0xa4093822, 0x299f31d0, 0x082efa98, 0xec4e6c89 ]),
+	Signature(name = "ChaCha/Salsa20 constant", kind = "bytes", value = b"expand 32-byte k"),
+	Signature(name = "ChaCha/Salsa20 constant (128 bit key)", kind = "bytes", value = b"expand 16-byte k"),
+	Signature(name = "TEA/XTEA delta", kind = "words32", value = [ 0x9e3779b9 ]),
+	Signature(name = "RC5/RC6 magic constants", kind = "words32", value = [ 0xb7e15163, 0x9e3779b9 ]),
+	Signature(name = "MD5 initialization vector", kind = "words32", value = [ 0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476 ]),
+	Signature(name = "MD5 T-table", kind = "words32", value = [ 0xd76aa478, 0xe8c7b756, 0x242070db, 0xc1bdceee, 0xf57c0faf, 0x4787c62a, 0xa8304613, 0xfd469501 ]),
+	Signature(name = "SHA-1 initialization vector", kind = "words32", value = [ 0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476, 0xc3d2e1f0 ]),
+	Signature(name = "SHA-1 round constants", kind = "words32", value = [ 0x5a827999, 0x6ed9eba1, 0x8f1bbcdc, 0xca62c1d6 ]),
+	Signature(name = "SHA-224 initialization vector", kind = "words32", value = [ 0xc1059ed8, 0x367cd507, 0x3070dd17, 0xf70e5939, 0xffc00b31, 0x68581511, 0x64f98fa7, 0xbefa4fa4 ]),
+	Signature(name = "SHA-256 initialization vector", kind = "words32", value = [ 0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19 ]),
+	Signature(name = "SHA-256 round constants", kind = "words32", value = [ 0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5 ]),
+	Signature(name = "SHA-384 initialization vector", kind = "words64", value = [ 0xcbbb9d5dc1059ed8, 0x629a292a367cd507, 0x9159015a3070dd17, 0x152fecd8f70e5939 ]),
+	Signature(name = "SHA-512 initialization vector", kind = "words64", value = [ 0x6a09e667f3bcc908, 0xbb67ae8584caa73b, 0x3c6ef372fe94f82b, 0xa54ff53a5f1d36f1 ]),
+	Signature(name = "SHA-512 round constants", kind = "words64", value = [ 0x428a2f98d728ae22, 0x7137449123ef65cd, 0xb5c0fbcfec4d3b2f, 0xe9b5dba58189dbbc ]),
+	Signature(name = "SHA-3/Keccak round constants", kind = "words64", value = [ 0x0000000000000001, 0x0000000000008082, 0x800000000000808a, 0x8000000080008000 ]),
+	Signature(name = "CRC-32 table", kind = "words32", value = [ 0x77073096, 0xee0e612c, 0x990951ba, 0x076dc419 ]),
+	Signature(name = "CRC-32C table", kind = "words32", value = [ 0xf26b8303, 0xe13b70f7, 0x1350f3f4, 0xc79a971f ]),
+	Signature(name = "NIST P-256 prime", kind = "bignum", value = 0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff),
+	Signature(name = "NIST P-256 curve coefficient b", kind = "bignum", value = 0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b),
+	Signature(name = "NIST P-256 generator x", kind = "bignum", value = 0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296),
+	Signature(name = "NIST P-256 generator y", kind = "bignum", value = 0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5),
+	Signature(name = "NIST P-256 order", kind = "bignum", value = 0xffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2fc632551),
+	Signature(name = "NIST P-384 prime", kind = "bignum", value = 0xfffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffeffffffff0000000000000000ffffffff),
+	Signature(name = "NIST P-384 curve coefficient b", kind = "bignum", value = 0xb3312fa7e23ee7e4988e056be3f82d19181d9c6efe8141120314088f5013875ac656398d8a2ed19d2a85c8edd3ec2aef),
+	Signature(name = "NIST P-384 generator x", kind = "bignum", value = 0xaa87ca22be8b05378eb1c71ef320ad746e1d3b628ba79b9859f741e082542a385502f25dbf55296c3a545e3872760ab7),
+	Signature(name = "secp256k1 prime", kind = "bignum", value = 0xfffffffffffffffffffffffffffffffffffffffffffffffffffffffefffffc2f),
+	Signature(name = "secp256k1 generator x", kind = "bignum", value = 0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798),
+	Signature(name = "secp256k1 order", kind = "bignum", value = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141),
+	Signature(name = "Curve25519 prime", kind = "bignum", value = 0x7fffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffed),
+	Signature(name = "Ed25519 curve constant d", kind = "bignum", value = 0x52036cee2b6ffe738cc740797779e89800700a4d4141d8ab75eb4dca135978a3),
+]
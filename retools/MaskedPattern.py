@@ -0,0 +1,146 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import re
+
+class MaskedPattern():
+	"""Fixed-length byte pattern in which arbitrary bits can be wildcards.
+	Only bits that are set in the mask need to match the value."""
+
+	def __init__(self, value, mask):
+		if len(value) != len(mask):
+			raise ValueError("Value and mask of a masked pattern need to be of identical length (%d vs. %d bytes)." % (len(value), len(mask)))
+		if len(value) == 0:
+			raise ValueError("Masked pattern must not be empty.")
+		if all(mask_byte == 0 for mask_byte in mask):
+			raise ValueError("Masked pattern must not consist of wildcards only.")
+		self._mask = bytes(mask)
+		self._value = bytes(value_byte & mask_byte for (value_byte, mask_byte) in zip(value, self._mask))
+		self._regex = re.compile(b"".join(self._byte_regex(value_byte, mask_byte) for (value_byte, mask_byte) in zip(self._value, self._mask)), flags = re.DOTALL)
+		(self._anchor_offset, self._anchor) = max(self.fixed_parts(), key = lambda part: len(part[1]), default = (0, bytes()))
+
+	@classmethod
+	def parse(cls, text):
+		"""Parses a hex string in which any nibble may be replaced by '?',
+		e.g., '27 05 19 56 ?? ?? 1? ff'. Whitespace is ignored."""
+		text = "".join(text.split())
+		if (len(text) % 2) != 0:
+			raise ValueError("Masked hex pattern must have an even number of nibbles: %s" % (text))
+		value = bytearray()
+		mask = bytearray()
+		for i in range(0, len(text), 2):
+			(value_byte, mask_byte) = (0, 0)
+			for nibble in text[i : i + 2]:
+				value_byte <<= 4
+				mask_byte <<= 4
+				if nibble != "?":
+					value_byte |= int(nibble, 16)
+					mask_byte |= 0xf
+			value.append(value_byte)
+			mask.append(mask_byte)
+		return cls(value, mask)
+
+	@staticmethod
+	def _byte_regex(value_byte, mask_byte):
+		if mask_byte == 0xff:
+			return b"\\x%02x" % (value_byte)
+		elif mask_byte == 0:
+			return b"."
+		else:
+			matching = (candidate for candidate in range(256) if (candidate & mask_byte) == value_byte)
+			return b"[" + b"".join(b"\\x%02x" % (candidate) for candidate in matching) + b"]"
+
+	@property
+	def value(self):
+		return self._value
+
+	@property
+	def mask(self):
+		return self._mask
+
+	def fixed_parts(self):
+		"""Returns all runs of bytes without any wildcard bits as a list of
+		(offset, bytes) tuples."""
+		parts = [ ]
+		start = None
+		for (offset, mask_byte) in enumerate(self._mask + b"\x00"):
+			if (mask_byte == 0xff) and (start is None):
+				start = offset
+			elif (mask_byte != 0xff) and (start is not None):
+				parts.append((start, self._value[start : offset]))
+				start = None
+		return parts
+
+	def matches(self, data):
+		return (len(data) == len(self)) and (self._regex.match(data) is not None)
+
+	def find(self, haystack, start = 0):
+		"""Returns the lowest offset at or after start at which the pattern
+		matches, or -1. Like bytes.find(), it works on any buffer. The longest
+		fixed run of the pattern is located using the buffer's own find()
+		and only these candidates are verified against the mask."""
+		if len(self._anchor) == 0:
+			match = self._regex.search(haystack, start)
+			return -1 if (match is None) else match.start()
+
+		while True:
+			anchor_offset = haystack.find(self._anchor, start + self._anchor_offset)
+			if anchor_offset == -1:
+				return -1
+			offset = anchor_offset - self._anchor_offset
+			if self._regex.match(haystack, offset) is not None:
+				return offset
+			start = offset + 1
+
+	def finditer(self, haystack, start = 0):
+		while True:
+			offset = self.find(haystack, start)
+			if offset == -1:
+				break
+			yield offset
+			start = offset + 1
+
+	def hex(self):
+		"""Hex representation in which fully masked nibbles are shown as '?'
+		and partially masked nibbles as 'x'."""
+		text = ""
+		for (value_byte, mask_byte) in zip(self._value, self._mask):
+			for shift in [ 4, 0 ]:
+				nibble_mask = (mask_byte >> shift) & 0xf
+				if nibble_mask == 0xf:
+					text += "%x" % ((value_byte >> shift) & 0xf)
+				elif nibble_mask == 0:
+					text += "?"
+				else:
+					text += "x"
+		return text
+
+	def __len__(self):
+		return len(self._value)
+
+	def __eq__(self, other):
+		return isinstance(other, MaskedPattern) and ((self.value, self.mask) == (other.value, other.mask))
+
+	def __hash__(self):
+		return hash((self.value, self.mask))
+
+	def __repr__(self):
+		return "MaskedPattern<%s/%s>" % (self.value.hex(), self.mask.hex())
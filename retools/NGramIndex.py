@@ -0,0 +1,281 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import sys
+import zlib
+import array
+import sqlite3
+
+class NGramIndex():
+	"""Persistent inverted index that maps every 4-gram to the blocks of each
+	file in which it occurs. 4-grams are hashed into a fixed number of
+	buckets, for each of which a bitmap of the blocks that contain one of its
+	4-grams is stored. Bitmaps are stored in groups of 64 blocks and
+	segments of buckets, compressed, so that a lookup only needs to read the
+	segments of the needle's 4-grams. A needle can only occur in blocks that
+	contain all of its 4-grams, so a search only needs to verify those blocks
+	instead of the whole file.
+
+	The index is small for structured content, in which blocks contain few
+	distinct 4-grams. High entropy content contains almost one distinct
+	4-gram per byte, every block then hits about 12% of all buckets and the
+	index grows to roughly two thirds of the size of the indexed data, for
+	files of only a few blocks to about the size of the data itself. Short
+	needles then match the buckets of a large share of all blocks, so that
+	the index hardly narrows down a search of such content."""
+	_LAYOUT = "planes"
+	_GRAM_LENGTH = 4
+	_BLOCKS_PER_GROUP = 64
+	_BUCKETS_PER_SEGMENT = 4096
+	_BUCKETS_PER_BLOCK_BYTE = 8
+	_MAX_CANDIDATE_FRACTION = 0.5
+
+	def __init__(self, filename, block_size = 64 * 1024):
+		self._filename = filename
+		self._db = sqlite3.connect(filename)
+		self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+		self._db.execute("CREATE TABLE IF NOT EXISTS files (file_id INTEGER PRIMARY KEY, filename TEXT UNIQUE NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL)")
+		meta = dict(self._db.execute("SELECT key, value FROM meta").fetchall())
+		if (len(meta) > 0) and (meta.get("layout") != self._LAYOUT):
+			# Index of an earlier format; discard it, files are indexed again
+			# on the next update. VACUUM returns the pages of the discarded
+			# tables to the file system and cannot run inside a transaction.
+			self._db.execute("DROP TABLE IF EXISTS postings")
+			self._db.execute("DROP TABLE IF EXISTS bitmaps")
+			self._db.execute("DELETE FROM files")
+			self._db.execute("DELETE FROM meta")
+			self._db.commit()
+			self._db.execute("VACUUM")
+			meta = { }
+		self._db.execute("CREATE TABLE IF NOT EXISTS bitmaps (file_id INTEGER NOT NULL, segment INTEGER NOT NULL, block_group INTEGER NOT NULL, masks BLOB NOT NULL, PRIMARY KEY (file_id, segment, block_group)) WITHOUT ROWID")
+		if len(meta) == 0:
+			# The bucket count scales with the block size, which bounds the
+			# fraction of buckets that a block of random data hits
+			bucket_count = 1 << max(6, (self._BUCKETS_PER_BLOCK_BYTE * block_size - 1).bit_length())
+			self._db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [ ("layout", self._LAYOUT), ("block_size", str(block_size)), ("bucket_count", str(bucket_count)) ])
+			self._db.commit()
+			meta = { "block_size": block_size, "bucket_count": bucket_count }
+
+		# The parameters of an existing index always take precedence
+		self._block_size = int(meta["block_size"])
+		self._bucket_count = int(meta["bucket_count"])
+		self._bucket_shift = 32 - (self._bucket_count.bit_length() - 1)
+		self._buckets_per_segment = min(self._BUCKETS_PER_SEGMENT, self._bucket_count)
+
+	@property
+	def block_size(self):
+		return self._block_size
+
+	def _bucket_of(self, gram):
+		# Multiplicative hashing, so that all bytes of the 4-gram influence
+		# the bucket
+		return ((gram * 0x9e3779b1) & 0xffffffff) >> self._bucket_shift
+
+	@classmethod
+	def _grams_of(cls, data):
+		"""Returns the set of all 4-grams in data as little endian integers.
+		Viewing the data as an array of 32-bit words at each of the four
+		possible alignments yields every 4-gram exactly once without
+		iterating over the data in Python."""
+		grams = set()
+		for alignment in range(cls._GRAM_LENGTH):
+			length = (len(data) - alignment) // cls._GRAM_LENGTH * cls._GRAM_LENGTH
+			words = array.array("I")
+			words.frombytes(data[alignment : alignment + length])
+			if sys.byteorder == "big":
+				words.byteswap()
+			grams.update(words)
+		return grams
+
+	@staticmethod
+	def _file_identity(filename):
+		statres = os.stat(filename)
+		return (os.path.abspath(filename), statres.st_size, statres.st_mtime_ns)
+
+	def _lookup_file(self, filename):
+		(abs_filename, size, mtime) = self._file_identity(filename)
+		row = self._db.execute("SELECT file_id, size, mtime FROM files WHERE filename = ?", (abs_filename, )).fetchone()
+		if (row is None) or (row[1] != size) or (row[2] != mtime):
+			return None
+		return row[0]
+
+	def remove(self, filename):
+		abs_filename = os.path.abspath(filename)
+		row = self._db.execute("SELECT file_id FROM files WHERE filename = ?", (abs_filename, )).fetchone()
+		if row is not None:
+			self._db.execute("DELETE FROM bitmaps WHERE file_id = ?", (row[0], ))
+			self._db.execute("DELETE FROM files WHERE file_id = ?", (row[0], ))
+			self._db.commit()
+
+	def _store_group(self, file_id, block_group, masks, block_count):
+		"""Stores the masks of a segment as byte planes: the first plane
+		holds the lowest byte of all masks, the second one the next byte and
+		so on. Planes of blocks that the group does not have are omitted, so
+		that a group of few blocks only takes as much space as it needs, and
+		each plane compresses on its own."""
+		if sys.byteorder == "big":
+			masks.byteswap()
+		masks = masks.tobytes()
+		plane_count = (block_count + 7) // 8
+		segment_length = 8 * self._buckets_per_segment
+		empty_segment = bytes(segment_length)
+		rows = [ ]
+		for (segment, offset) in enumerate(range(0, len(masks), segment_length)):
+			segment_masks = masks[offset : offset + segment_length]
+			if segment_masks != empty_segment:
+				planes = b"".join(segment_masks[plane : : 8] for plane in range(plane_count))
+				rows.append((file_id, segment, block_group, zlib.compress(planes)))
+		self._db.executemany("INSERT INTO bitmaps (file_id, segment, block_group, masks) VALUES (?, ?, ?, ?)", rows)
+
+	def update(self, filename):
+		"""Indexes the given file unless it is already present in the index
+		with identical size and modification time. Returns True if the file
+		was (re-)indexed. Bitmaps are written group by group, so memory
+		consumption does not depend on the file size."""
+		if self._lookup_file(filename) is not None:
+			return False
+		self.remove(filename)
+
+		(abs_filename, size, mtime) = self._file_identity(filename)
+		cursor = self._db.execute("INSERT INTO files (filename, size, mtime) VALUES (?, ?, ?)", (abs_filename, size, mtime))
+		file_id = cursor.lastrowid
+		with open(filename, "rb") as f:
+			block_no = 0
+			masks = None
+			while True:
+				# The 4-grams that start in the last three bytes of a block
+				# belong to that block.
+				f.seek(block_no * self._block_size)
+				block = f.read(self._block_size + self._GRAM_LENGTH - 1)
+				if len(block) == 0:
+					break
+
+				(block_group, block_bit) = divmod(block_no, self._BLOCKS_PER_GROUP)
+				if block_bit == 0:
+					masks = array.array("Q", [ 0 ]) * self._bucket_count
+				bit = 1 << block_bit
+				for bucket in set(map(self._bucket_of, self._grams_of(block))):
+					masks[bucket] |= bit
+				block_no += 1
+				if block_bit == self._BLOCKS_PER_GROUP - 1:
+					self._store_group(file_id, block_group, masks, self._BLOCKS_PER_GROUP)
+					masks = None
+			if masks is not None:
+				self._store_group(file_id, block_group, masks, block_bit + 1)
+		self._db.commit()
+		return True
+
+	def prune(self):
+		"""Removes all files from the index that no longer exist."""
+		for (filename, ) in self._db.execute("SELECT filename FROM files").fetchall():
+			if not os.path.isfile(filename):
+				self.remove(filename)
+
+	@classmethod
+	def _needle_grams(cls, needle):
+		"""Returns all (offset, gram) tuples of the fixed parts of a needle."""
+		if isinstance(needle, (bytes, bytearray)):
+			fixed_parts = [ (0, needle) ]
+		elif hasattr(needle, "fixed_parts"):
+			fixed_parts = needle.fixed_parts()
+		else:
+			return [ ]
+		return [ (part_offset + gram_offset, int.from_bytes(part[gram_offset : gram_offset + cls._GRAM_LENGTH], byteorder = "little")) for (part_offset, part) in fixed_parts for gram_offset in range(len(part) - cls._GRAM_LENGTH + 1) ]
+
+	def _bucket_blocks(self, file_id, bucket, segment_cache):
+		"""Returns the blocks that contain a 4-gram of the bucket as an
+		integer in which bit n stands for block n."""
+		(segment, segment_bucket) = divmod(bucket, self._buckets_per_segment)
+		if segment not in segment_cache:
+			segment_cache[segment] = [ (block_group, zlib.decompress(masks)) for (block_group, masks) in self._db.execute("SELECT block_group, masks FROM bitmaps WHERE file_id = ? AND segment = ?", (file_id, segment)) ]
+		blocks = 0
+		for (block_group, masks) in segment_cache[segment]:
+			# The bucket's byte in each plane, lowest byte first
+			mask = int.from_bytes(masks[segment_bucket : : self._buckets_per_segment], byteorder = "little")
+			blocks |= mask << (self._BLOCKS_PER_GROUP * block_group)
+		return blocks
+
+	def _candidate_blocks(self, file_id, block_count, needle, segment_cache):
+		all_blocks = (1 << block_count) - 1
+		candidates = all_blocks
+		for (gram_offset, gram) in self._needle_grams(needle):
+			blocks = self._bucket_blocks(file_id, self._bucket_of(gram), segment_cache)
+			if blocks == all_blocks:
+				# Very frequent 4-gram that does not narrow anything down
+				continue
+
+			# A needle starting in block n has the gram at this offset in
+			# one of the blocks n + min_shift to n + max_shift.
+			min_shift = gram_offset // self._block_size
+			max_shift = (gram_offset + self._block_size - 1) // self._block_size
+			start_blocks = 0
+			for shift in range(min_shift, max_shift + 1):
+				start_blocks |= blocks >> shift
+			candidates &= start_blocks
+			if candidates == 0:
+				break
+		return candidates
+
+	def candidate_ranges(self, filename, needles):
+		"""Returns a sorted list of (begin_offset, end_offset) tuples in which
+		any of the needles could start. Returns None if the index cannot narrow
+		the search down, i.e., when the file is not indexed, has changed since
+		it was indexed, when one of the needles does not contain at least one
+		fixed 4-gram or when more than half of all blocks are candidates. In
+		the latter case, which is typical for high entropy content, searching
+		the candidate blocks one by one is no faster than a single pass over
+		the whole file."""
+		if any(len(self._needle_grams(needle)) == 0 for needle in needles):
+			return None
+		file_id = self._lookup_file(filename)
+		if file_id is None:
+			return None
+
+		block_count = (os.stat(filename).st_size + self._block_size - 1) // self._block_size
+		segment_cache = { }
+		blocks = 0
+		for needle in needles:
+			blocks |= self._candidate_blocks(file_id, block_count, needle, segment_cache)
+			if bin(blocks).count("1") > block_count * self._MAX_CANDIDATE_FRACTION:
+				return None
+
+		ranges = [ ]
+		block = 0
+		while blocks != 0:
+			if blocks & 1:
+				(begin_offset, end_offset) = (block * self._block_size, (block + 1) * self._block_size)
+				if (len(ranges) > 0) and (ranges[-1][1] == begin_offset):
+					ranges[-1] = (ranges[-1][0], end_offset)
+				else:
+					ranges.append((begin_offset, end_offset))
+			blocks >>= 1
+			block += 1
+		return ranges
+
+	def close(self):
+		self._db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
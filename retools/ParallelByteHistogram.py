@@ -0,0 +1,97 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import collections
+from .ByteHistogram import ByteHistogram
+from .JobScheduler import JobScheduler
+
+class ParallelByteHistogram():
+	"""Counts the n-grams of many files in a pool of processes. Files larger
+	than the split size are divided into byte ranges that are counted as
+	separate jobs. Workers return the histogram of their job, which for
+	3-grams usually only holds the n-grams actually seen, so that not the
+	full array of counts of every job needs to be transferred back."""
+	_Job = collections.namedtuple("Job", [ "filename", "begin_offset", "end_offset" ])
+	_Result = collections.namedtuple("Result", [ "filename", "histogram", "error" ])
+
+	def __init__(self, ngram = 1, jobs = None, split_size = 16 * 1024 * 1024):
+		self._ngram = ngram
+		self._scheduler = JobScheduler(jobs = jobs)
+		self._split_size = split_size
+
+	@staticmethod
+	def _run_job(filename, ngram, begin_offset, end_offset):
+		# Runs in the worker process. Any error only affects the file it
+		# occurred in.
+		try:
+			histogram = ByteHistogram(ngram = ngram)
+			histogram.add_file(filename, begin_offset = begin_offset, end_offset = end_offset)
+			return (histogram, None)
+		except Exception as e:
+			return (None, e)
+
+	def _create_jobs(self, filenames):
+		for filename in filenames:
+			try:
+				file_size = os.stat(filename).st_size
+			except (OSError, ValueError) as e:
+				# ValueError for file names that contain NUL bytes
+				yield self._Result(filename = filename, histogram = None, error = e)
+				continue
+			for (begin_offset, end_offset) in self._scheduler.split(file_size, self._split_size):
+				yield self._Job(filename = filename, begin_offset = begin_offset, end_offset = end_offset)
+
+	def _submit(self, executor, job):
+		if isinstance(job, self._Result):
+			return self._scheduler.completed((job.histogram, job.error))
+		return executor.submit(self._run_job, job.filename, self._ngram, job.begin_offset, job.end_offset)
+
+	def _get_result(self, job, future):
+		if isinstance(job, self._Result):
+			# Stat error
+			return job
+		try:
+			(histogram, error) = future.result()
+		except Exception as e:
+			# E.g., an exception that cannot be pickled or a crashed worker
+			(histogram, error) = (None, e)
+		return self._Result(filename = job.filename, histogram = histogram, error = error)
+
+	def count(self, filenames):
+		"""Counts the n-grams of all files and yields one result per job as
+		soon as it is available. A result either has the histogram of the
+		job's range of the file or the error that prevented reading it."""
+		with self._scheduler.executor() as executor:
+			for (job, future) in self._scheduler.run(self._create_jobs(filenames), lambda job: self._submit(executor, job), ordered = False):
+				yield self._get_result(job, future)
+
+	def histogram(self, filenames, errors = None):
+		"""Returns the merged histogram of all files. Errors are appended to
+		the given list as (filename, error), if any."""
+		histogram = ByteHistogram(ngram = self._ngram)
+		for result in self.count(filenames):
+			if result.error is not None:
+				if errors is not None:
+					errors.append((result.filename, result.error))
+				continue
+			histogram.merge(result.histogram)
+		return histogram
@@ -0,0 +1,186 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import collections
+import concurrent.futures
+from .FileSearch import FileSearch
+from .JobScheduler import JobScheduler
+from .NGramIndex import NGramIndex
+from .CompressedFileSearch import CompressedFileSearch
+
+class ParallelFileSearch():
+	"""Distributes searching of many files over a pool of processes. Files
+	larger than the split size are divided into byte ranges that are searched
+	as separate jobs. With decompress set, the compressed payloads of each
+	file are searched as an additional job, with decompress_options as
+	additional keyword arguments of CompressedFileSearch.
+
+	When a cache (e.g., a SearchDeduplicator) is given, files whose results
+	it knows are not searched at all. All other files are searched as a
+	single job each, so that their complete results can be stored in the
+	cache. Copies of a file that is still being searched wait for its
+	results instead; if its search fails, they are searched on their own."""
+	_Job = collections.namedtuple("Job", [ "filename", "begin_offset", "end_offset", "plain", "decompress" ])
+	_Duplicate = collections.namedtuple("Duplicate", [ "filename", "original" ])
+	_Result = collections.namedtuple("Result", [ "filename", "occurrences", "error" ])
+
+	def __init__(self, needles, context_size = 32, jobs = None, ordered = True, split_size = 16 * 1024 * 1024, index_filename = None, max_mismatches = 0, decompress = False, decompress_options = None, cache = None, chunk_size = None, prefetch = 0):
+		self._needles = list(needles)
+		self._search_options = {
+			"context_size":		context_size,
+			"index_filename":	index_filename,
+			"max_mismatches":	max_mismatches,
+			"chunk_size":		chunk_size,
+			"prefetch":			prefetch,
+			"decompress":		decompress_options or { },
+		}
+		self._scheduler = JobScheduler(jobs = jobs)
+		self._ordered = ordered
+		self._split_size = split_size
+		self._decompress = decompress
+		self._cache = cache
+		self._in_flight = { }
+
+	@staticmethod
+	def _find_all(needles, search_options, filename, begin_offset, end_offset, plain, decompress):
+		if plain:
+			index = NGramIndex(search_options["index_filename"]) if (search_options["index_filename"] is not None) else None
+			try:
+				fs = FileSearch(filename, context_size = search_options["context_size"], index = index, max_mismatches = search_options["max_mismatches"], chunk_size = search_options["chunk_size"], prefetch = search_options["prefetch"])
+				yield from fs.find_all_multi(needles, begin_offset = begin_offset, end_offset = end_offset)
+			finally:
+				if index is not None:
+					index.close()
+		if decompress:
+			cfs = CompressedFileSearch(filename, context_size = search_options["context_size"], max_mismatches = search_options["max_mismatches"], **search_options["decompress"])
+			yield from cfs.find_all_multi(needles)
+
+	@staticmethod
+	def _run_job(needles, search_options, filename, begin_offset, end_offset, plain, decompress):
+		# Runs in the worker process. Only plain types are passed in and
+		# returned, since namedtuples nested in classes are not picklable.
+		# Any error only affects the file it occurred in.
+		try:
+			return ([ (match.filename, match.offset, match.needle, bytes(match.pre), bytes(match.data), bytes(match.post)) for match in ParallelFileSearch._find_all(needles, search_options, filename, begin_offset, end_offset, plain, decompress) ], None)
+		except Exception as e:
+			return (None, e)
+
+	def _cached_result(self, filename):
+		try:
+			results = self._cache.lookup(filename)
+			original = self._cache.reserve(filename) if (results is None) else None
+		except OSError as e:
+			return self._Result(filename = filename, occurrences = None, error = e)
+		if (original is not None) and (original in self._in_flight):
+			return self._Duplicate(filename = filename, original = original)
+		if results is None:
+			return None
+		occurrences = [ FileSearch._Occurrence(filename = filename + result.suffix, offset = result.offset, needle = result.needle, pre = result.pre, data = result.data, post = result.post) for result in results ]
+		return self._Result(filename = filename, occurrences = occurrences, error = None)
+
+	def _create_jobs(self, filenames):
+		for filename in filenames:
+			if self._cache is not None:
+				result = self._cached_result(filename)
+				if result is not None:
+					yield result
+				else:
+					yield self._Job(filename = filename, begin_offset = 0, end_offset = None, plain = True, decompress = self._decompress)
+				continue
+
+			try:
+				file_size = os.stat(filename).st_size
+			except OSError as e:
+				yield self._Result(filename = filename, occurrences = None, error = e)
+				continue
+			for (begin_offset, end_offset) in self._scheduler.split(file_size, self._split_size):
+				yield self._Job(filename = filename, begin_offset = begin_offset, end_offset = end_offset, plain = True, decompress = False)
+			if self._decompress:
+				yield self._Job(filename = filename, begin_offset = 0, end_offset = None, plain = False, decompress = True)
+
+	@staticmethod
+	def _copy_result(source, destination):
+		if source.exception() is not None:
+			destination.set_exception(source.exception())
+		else:
+			destination.set_result(source.result())
+
+	def _submit(self, executor, job):
+		if isinstance(job, self._Result):
+			return self._scheduler.completed((job.occurrences, job.error))
+		elif isinstance(job, self._Duplicate):
+			# Resolves together with the search of the original file
+			future = concurrent.futures.Future()
+			self._in_flight[job.original].add_done_callback(lambda original_future: self._copy_result(original_future, future))
+			return future
+		else:
+			future = executor.submit(self._run_job, self._needles, self._search_options, job.filename, job.begin_offset, job.end_offset, job.plain, job.decompress)
+			if self._cache is not None:
+				self._in_flight[job.filename] = future
+			return future
+
+	def _get_result(self, executor, job, future):
+		if isinstance(job, self._Result):
+			# Stat error or cached result
+			return job
+		try:
+			(occurrences, error) = future.result()
+		except Exception as e:
+			# E.g., an exception that cannot be pickled or a crashed worker
+			(occurrences, error) = (None, e)
+		if isinstance(job, self._Duplicate):
+			if occurrences is None:
+				# The search of the original failed, which says nothing about
+				# this copy
+				own_job = self._Job(filename = job.filename, begin_offset = 0, end_offset = None, plain = True, decompress = self._decompress)
+				try:
+					own_future = self._submit(executor, own_job)
+				except Exception as e:
+					return self._Result(filename = job.filename, occurrences = None, error = e)
+				return self._get_result(executor, own_job, own_future)
+			occurrences = [ FileSearch._Occurrence(filename = job.filename + match_filename[len(job.original) : ], offset = offset, needle = needle, pre = pre, data = data, post = post) for (match_filename, offset, needle, pre, data, post) in occurrences ]
+			return self._Result(filename = job.filename, occurrences = occurrences, error = error)
+
+		if occurrences is not None:
+			occurrences = [ FileSearch._Occurrence(filename = match_filename, offset = offset, needle = needle, pre = pre, data = data, post = post) for (match_filename, offset, needle, pre, data, post) in occurrences ]
+		if self._cache is not None:
+			self._in_flight.pop(job.filename, None)
+			try:
+				if occurrences is not None:
+					self._cache.store(job.filename, occurrences)
+			except OSError:
+				# File vanished or changed after it was searched
+				pass
+			finally:
+				self._cache.release(job.filename)
+		return self._Result(filename = job.filename, occurrences = occurrences, error = error)
+
+	def search(self, filenames):
+		"""Searches all files and yields one result per job. In ordered mode,
+		results are yielded in exactly the order a serial search would produce
+		them; otherwise they are yielded as soon as they are available. A result
+		either has a list of occurrences or the error that prevented searching
+		the file."""
+		self._in_flight = { }
+		with self._scheduler.executor() as executor:
+			for (job, future) in self._scheduler.run(self._create_jobs(filenames), lambda job: self._submit(executor, job), ordered = self._ordered):
+				yield self._get_result(executor, job, future)
@@ -28,14 +28,6 @@ class PreciseFloat():
 	def __init__(self, text):
 		self._value = self._parse(text)
 
-	@staticmethod
-	def _digit_count(value):
-		digits = 0
-		while value > 0:
-			value //= 10
-			digits += 1
-		return digits
-
 	def _parse(self, text):
 		result = self._FLOAT_RE.fullmatch(text)
 		if result is None:
@@ -48,7 +40,7 @@ class PreciseFloat():
 
 		if result["fract"] is not None:
 			fract = int(result["fract"])
-			digits = self._digit_count(fract)
+			digits = len(result["fract"])
 			result_value += fractions.Fraction(fract, 10 ** digits)
 
 		if result["exp"] is not None:
@@ -58,6 +50,10 @@ class PreciseFloat():
 			result_value = -result_value
 		return result_value
 
+	@property
+	def value(self):
+		return self._value
+
 	def __float__(self):
 		return float(self._value)
 
@@ -78,6 +74,7 @@ if __name__ == "__main__":
 			"1e-9",
 			"1.234e-9",
 			"0e10",
+			"3.05",
 		]:
 		precise = PreciseFloat(floatstr)
 		print("%-10s %-20s %e" % (floatstr, precise, float(precise)))
@@ -0,0 +1,104 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import io
+import queue
+import threading
+
+class PrefetchReader():
+	"""Iterates over the chunks of a file while a background thread already
+	reads the following ones. Up to queue_depth chunks are buffered, so
+	that waiting for the storage and processing the data overlap instead of
+	alternating. Where available, the kernel is told that the file is read
+	sequentially so that it reads ahead aggressively as well."""
+	_END = object()
+
+	def __init__(self, f, chunk_size = 1024 * 1024, queue_depth = 2, length = None):
+		if chunk_size <= 0:
+			raise ValueError("Chunk size must be positive.")
+		if queue_depth <= 0:
+			raise ValueError("Queue depth must be at least one chunk.")
+		self._f = f
+		self._chunk_size = chunk_size
+		self._length = length
+		self._queue = queue.Queue(maxsize = queue_depth)
+		self._stopped = threading.Event()
+		self._thread = None
+
+	def _advise_sequential(self):
+		if not hasattr(os, "posix_fadvise"):
+			return
+		try:
+			os.posix_fadvise(self._f.fileno(), self._f.tell(), self._length or 0, os.POSIX_FADV_SEQUENTIAL)
+		except (io.UnsupportedOperation, AttributeError, OSError):
+			# Not backed by a file descriptor or not supported by the file
+			# system; it's only a hint anyways.
+			pass
+
+	def _put(self, item):
+		while not self._stopped.is_set():
+			try:
+				self._queue.put(item, timeout = 0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def _read_all(self):
+		remaining = self._length
+		try:
+			while (remaining is None) or (remaining > 0):
+				chunk_size = self._chunk_size if (remaining is None) else min(remaining, self._chunk_size)
+				chunk = self._f.read(chunk_size)
+				if len(chunk) == 0:
+					break
+				if remaining is not None:
+					remaining -= len(chunk)
+				if not self._put(chunk):
+					return
+			self._put(self._END)
+		except Exception as e:
+			# Re-raised in the consuming thread
+			self._put(e)
+
+	def close(self):
+		"""Stops the background thread. Called automatically when iteration
+		ends, but needs to be called if it is aborted early."""
+		self._stopped.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def __iter__(self):
+		self._advise_sequential()
+		self._thread = threading.Thread(target = self._read_all, daemon = True)
+		self._thread.start()
+		try:
+			while True:
+				item = self._queue.get()
+				if item is self._END:
+					break
+				elif isinstance(item, Exception):
+					raise item
+				yield item
+		finally:
+			self.close()
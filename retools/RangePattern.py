@@ -0,0 +1,188 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import re
+
+class RangePattern():
+	"""Fixed-width integer whose value lies within an inclusive range. The
+	range is compiled into a regular expression of byte classes (e.g., the
+	little endian uint32 range 0x08000000..0x080fffff becomes '..[\\x00-\\x0f]
+	\\x08'), so that the whole buffer is scanned by the regex engine instead
+	of enumerating every single value as a separate needle. Bytes which are
+	identical for all values of the range serve as an anchor that is located
+	using the buffer's own find()."""
+
+	def __init__(self, low, high, length, byteorder = "little", signed = False, alignment = 1):
+		if length <= 0:
+			raise ValueError("Integer length must be at least one byte.")
+		if byteorder not in [ "little", "big" ]:
+			raise ValueError("Byte order must be either 'little' or 'big', not '%s'." % (byteorder))
+		if alignment <= 0:
+			raise ValueError("Alignment must be at least one byte.")
+		if low > high:
+			raise ValueError("Lower bound %d of range is greater than upper bound %d." % (low, high))
+		bits = 8 * length
+		(minvalue, maxvalue) = (-(2 ** (bits - 1)), (2 ** (bits - 1)) - 1) if signed else (0, (2 ** bits) - 1)
+		if (low < minvalue) or (high > maxvalue):
+			raise ValueError("Range %d..%d exceeds the range of a %s int of %d bits (%d..%d)." % (low, high, "signed" if signed else "unsigned", bits, minvalue, maxvalue))
+		self._low = low
+		self._high = high
+		self._length = length
+		self._byteorder = byteorder
+		self._signed = signed
+		self._alignment = alignment
+		self._compile()
+
+	def _compile(self):
+		sequences = [ ]
+		for (unsigned_low, unsigned_high) in self._unsigned_ranges():
+			for sequence in self._byte_ranges(unsigned_low, unsigned_high, self._length):
+				if self._byteorder == "little":
+					sequence.reverse()
+				sequences.append(sequence)
+		self._regex = re.compile(b"|".join(b"".join(self._class_regex(byte_range) for byte_range in sequence) for sequence in sequences), flags = re.DOTALL)
+		(self._anchor_offset, self._anchor) = max(self._fixed_parts(sequences), key = lambda part: len(part[1]), default = (0, bytes()))
+
+	def _unsigned_ranges(self):
+		# Negative values map onto the top of the unsigned range in two's
+		# complement representation
+		modulus = 2 ** (8 * self._length)
+		if self._high < 0:
+			return [ (self._low + modulus, self._high + modulus) ]
+		elif self._low >= 0:
+			return [ (self._low, self._high) ]
+		else:
+			return [ (self._low + modulus, modulus - 1), (0, self._high) ]
+
+	@classmethod
+	def _byte_ranges(cls, low, high, length):
+		"""Decomposes the unsigned range [low, high] into a list of sequences
+		of (min, max) byte ranges in big endian order."""
+		if length == 0:
+			return [ [ ] ]
+		shift = 8 * (length - 1)
+		full = (1 << shift) - 1
+		(low_head, low_tail) = (low >> shift, low & full)
+		(high_head, high_tail) = (high >> shift, high & full)
+		if low_head == high_head:
+			return [ [ (low_head, low_head) ] + tail for tail in cls._byte_ranges(low_tail, high_tail, length - 1) ]
+
+		sequences = [ ]
+		if low_tail != 0:
+			sequences += [ [ (low_head, low_head) ] + tail for tail in cls._byte_ranges(low_tail, full, length - 1) ]
+			low_head += 1
+		if high_tail != full:
+			sequences += [ [ (high_head, high_head) ] + tail for tail in cls._byte_ranges(0, high_tail, length - 1) ]
+			high_head -= 1
+		if low_head <= high_head:
+			sequences.append([ (low_head, high_head) ] + [ (0, 0xff) ] * (length - 1))
+		return sequences
+
+	@staticmethod
+	def _class_regex(byte_range):
+		(min_byte, max_byte) = byte_range
+		if min_byte == max_byte:
+			return b"\\x%02x" % (min_byte)
+		elif (min_byte, max_byte) == (0, 0xff):
+			return b"."
+		else:
+			return b"[\\x%02x-\\x%02x]" % (min_byte, max_byte)
+
+	def _fixed_parts(self, sequences):
+		fixed = [ (len(sequences) > 0) and all(sequence[offset] == (sequences[0][offset][0], sequences[0][offset][0]) for sequence in sequences) for offset in range(self._length) ]
+		parts = [ ]
+		start = None
+		for (offset, is_fixed) in enumerate(fixed + [ False ]):
+			if is_fixed and (start is None):
+				start = offset
+			elif (not is_fixed) and (start is not None):
+				parts.append((start, bytes(sequences[0][i][0] for i in range(start, offset))))
+				start = None
+		return parts
+
+	@property
+	def low(self):
+		return self._low
+
+	@property
+	def high(self):
+		return self._high
+
+	@property
+	def alignment(self):
+		return self._alignment
+
+	def fixed_parts(self):
+		"""Returns the bytes that are identical for all values in the range as
+		a list of (offset, bytes) tuples."""
+		return [ (self._anchor_offset, self._anchor) ] if (len(self._anchor) > 0) else [ ]
+
+	def encode(self, value):
+		return value.to_bytes(length = self._length, byteorder = self._byteorder, signed = self._signed)
+
+	def decode(self, data):
+		return int.from_bytes(data, byteorder = self._byteorder, signed = self._signed)
+
+	def matches(self, data):
+		return (len(data) == len(self)) and (self._low <= self.decode(data) <= self._high)
+
+	def find(self, haystack, start = 0):
+		"""Returns the lowest offset at or after start at which an integer
+		within the range is encoded, or -1. Alignment is not considered
+		since the position of the haystack within the file is unknown."""
+		if len(self._anchor) == 0:
+			match = self._regex.search(haystack, start)
+			return -1 if (match is None) else match.start()
+
+		while True:
+			anchor_offset = haystack.find(self._anchor, start + self._anchor_offset)
+			if anchor_offset == -1:
+				return -1
+			offset = anchor_offset - self._anchor_offset
+			if self._regex.match(haystack, offset) is not None:
+				return offset
+			start = offset + 1
+
+	def finditer(self, haystack, start = 0):
+		while True:
+			offset = self.find(haystack, start)
+			if offset == -1:
+				break
+			yield offset
+			start = offset + 1
+
+	def hex(self):
+		return "%s..%s" % (self.encode(self._low).hex(), self.encode(self._high).hex())
+
+	def _key(self):
+		return (self._low, self._high, self._length, self._byteorder, self._signed, self._alignment)
+
+	def __len__(self):
+		return self._length
+
+	def __eq__(self, other):
+		return isinstance(other, RangePattern) and (self._key() == other._key())
+
+	def __hash__(self):
+		return hash(self._key())
+
+	def __repr__(self):
+		return "RangePattern<%s, %d..%d, align %d>" % (self.hex(), self._low, self._high, self._alignment)
@@ -0,0 +1,233 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import zlib
+import lzma
+import array
+import itertools
+import collections
+from .ByteHistogram import ByteHistogram
+from .StreamDecompressor import StreamDecompressor
+from .JobScheduler import JobScheduler
+
+class RawStreamFinder():
+	"""Finds compressed streams that have no magic number, i.e., raw deflate
+	or LZMA-alone streams, by trying to decompress at every (aligned) offset.
+	Offsets in blocks of low entropy and offsets that cannot be the start of
+	a stream judging from the first bytes are skipped. The remaining offsets
+	are trial decoded in a pool of processes and only those that yield at
+	least the minimum decompressed length without error are reported. The
+	pool is kept across calls to find() until the finder is closed."""
+	_Job = collections.namedtuple("Job", [ "begin_offset", "end_offset" ])
+	_LOOKAHEAD = 64 * 1024
+	_ENTROPY_BLOCK_SIZE = 4096
+
+	# Deflate block header in the first byte: BFINAL in bit 0, BTYPE in bits
+	# 1-2. Stored blocks (BTYPE 0) have zero padding up to the byte boundary
+	# and are followed by LEN and its complement NLEN. Blocks with dynamic
+	# Huffman codes (BTYPE 2) have at most 286 literal/length codes (HLIT <=
+	# 29) and at most 30 distance codes (HDIST <= 29). BTYPE 3 is invalid.
+	_DEFLATE_STORED = bytes(int(value in (0, 1)) for value in range(256))
+	_DEFLATE_FIXED = bytes(int(((value >> 1) & 3) == 1) for value in range(256))
+	_DEFLATE_DYNAMIC = bytes(int((((value >> 1) & 3) == 2) and ((value >> 3) <= 29)) for value in range(256))
+	_DEFLATE_HDIST = bytes(int((value & 0x1f) <= 29) for value in range(256))
+	_IS_FF = bytes(int(value == 0xff) for value in range(256))
+
+	# LZMA-alone header: properties byte (lc/lp/pb), 32 bit dictionary size
+	# and 64 bit uncompressed size (all ones if unknown). The range coder
+	# always starts with a zero byte.
+	_LZMA_PROPERTIES = bytes(int(value < 9 * 5 * 5) for value in range(256))
+	_LZMA_SIZE_MSB = bytes(int(value in (0x00, 0xff)) for value in range(256))
+	_IS_ZERO = bytes(int(value == 0) for value in range(256))
+
+	class _ViewReader():
+		"""File object that reads slices of a memoryview without copying."""
+		def __init__(self, view):
+			self._view = view
+			self._offset = 0
+
+		def read(self, length):
+			data = self._view[self._offset : self._offset + length]
+			self._offset += len(data)
+			return data
+
+	def __init__(self, stream_format, alignment = 1, min_length = 1024, min_entropy = 5.5, jobs = None, split_size = 64 * 1024):
+		assert(stream_format in [ "deflate", "lzma" ])
+		self._stream_format = stream_format
+		self._alignment = alignment
+		self._min_length = min_length
+		self._min_entropy = min_entropy
+		self._scheduler = JobScheduler(jobs = jobs)
+		self._split_size = split_size
+		self._executor = None
+
+	@classmethod
+	def _shifted_mask(cls, data, length, table, shift):
+		"""Returns a big integer that has the byte at position i set to one if
+		data[i + shift] is accepted by the translation table."""
+		return int.from_bytes(data[shift : shift + length].translate(table), byteorder = "little")
+
+	@classmethod
+	def _deflate_mask(cls, data, length):
+		stored = cls._shifted_mask(data, length, cls._DEFLATE_STORED, 0)
+		if stored != 0:
+			complement = bytes(x ^ y for (x, y) in zip(data[1 : 3 + length], data[3 : 5 + length]))
+			stored &= cls._shifted_mask(complement, length, cls._IS_FF, 0) & cls._shifted_mask(complement, length, cls._IS_FF, 1)
+		fixed = cls._shifted_mask(data, length, cls._DEFLATE_FIXED, 0)
+		dynamic = cls._shifted_mask(data, length, cls._DEFLATE_DYNAMIC, 0) & cls._shifted_mask(data, length, cls._DEFLATE_HDIST, 1)
+		return stored | fixed | dynamic
+
+	@classmethod
+	def _lzma_mask(cls, data, length):
+		return cls._shifted_mask(data, length, cls._LZMA_PROPERTIES, 0) & cls._shifted_mask(data, length, cls._LZMA_SIZE_MSB, 12) & cls._shifted_mask(data, length, cls._IS_ZERO, 13)
+
+	@staticmethod
+	def _plausible_lzma_header(data, offset):
+		# Encoders only use dictionary sizes of 2^n or 2^n + 2^(n - 1)
+		dictionary_size = int.from_bytes(data[offset + 1 : offset + 5], byteorder = "little")
+		if dictionary_size < 4096:
+			return False
+		low_bit = dictionary_size & -dictionary_size
+		if dictionary_size not in (low_bit, 3 * low_bit):
+			return False
+		uncompressed_size = int.from_bytes(data[offset + 5 : offset + 13], byteorder = "little")
+		return (uncompressed_size == 0xffffffffffffffff) or (uncompressed_size < (1 << 40))
+
+	@classmethod
+	def _high_entropy_mask(cls, data, length, min_entropy):
+		"""Returns a mask of all offsets in blocks of high entropy. Padding
+		bytes are not taken into account so that short streams surrounded by
+		padding are not missed. A block also counts as high entropy if the
+		following one is, for streams that start at the end of a block."""
+		blocks = [ ByteHistogram.of(data[offset : offset + cls._ENTROPY_BLOCK_SIZE].translate(None, b"\x00\xff")).entropy >= min_entropy for offset in range(0, length, cls._ENTROPY_BLOCK_SIZE) ]
+		blocks.append(False)
+		mask = bytearray(length)
+		for (block_index, high_entropy) in enumerate(blocks[:-1]):
+			if high_entropy or blocks[block_index + 1]:
+				offset = block_index * cls._ENTROPY_BLOCK_SIZE
+				mask[offset : offset + cls._ENTROPY_BLOCK_SIZE] = b"\x01" * len(mask[offset : offset + cls._ENTROPY_BLOCK_SIZE])
+		return int.from_bytes(mask, byteorder = "little")
+
+	@staticmethod
+	def _trial_decode(stream_format, data, min_length):
+		if stream_format == "deflate":
+			decompressor = zlib.decompressobj(wbits = -zlib.MAX_WBITS)
+		else:
+			decompressor = lzma.LZMADecompressor(format = lzma.FORMAT_ALONE)
+		try:
+			decompressed_length = len(decompressor.decompress(data, min_length))
+		except (zlib.error, lzma.LZMAError):
+			return False
+		if decompressed_length < min_length:
+			return False
+		if stream_format == "deflate":
+			# Random stored blocks pass but do not compress anything
+			consumed_length = len(data) - len(decompressor.unconsumed_tail) - len(decompressor.unused_data)
+			return consumed_length < decompressed_length
+		return True
+
+	@classmethod
+	def _candidates(cls, stream_format, data, length, alignment, min_entropy):
+		if stream_format == "deflate":
+			mask = cls._deflate_mask(data, length)
+		else:
+			mask = cls._lzma_mask(data, length)
+		if mask != 0:
+			mask &= cls._high_entropy_mask(data, length, min_entropy)
+		if mask == 0:
+			return
+		mask = mask.to_bytes(length, byteorder = "little")
+		if alignment != 1:
+			mask = mask[::alignment]
+		candidates = itertools.compress(range(0, length, alignment), mask)
+		if stream_format == "lzma":
+			candidates = (offset for offset in candidates if cls._plausible_lzma_header(data, offset))
+		yield from candidates
+
+	@classmethod
+	def _run_job(cls, stream_format, data, length, alignment, min_length, min_entropy):
+		# Runs in the worker process; data extends past length by the
+		# lookahead so that streams starting close to the end can be decoded
+		data = bytes(data)
+		view = memoryview(data)
+		offsets = array.array("Q")
+		for offset in cls._candidates(stream_format, data, length, alignment, min_entropy):
+			if cls._trial_decode(stream_format, view[offset : offset + cls._LOOKAHEAD], min_length):
+				offsets.append(offset)
+		return offsets
+
+	def _create_jobs(self, length):
+		# Job boundaries are a multiple of the alignment so that alignment is
+		# preserved relative to the start of the data
+		split_size = max(self._split_size - (self._split_size % self._alignment), self._alignment)
+		for begin_offset in range(0, length, split_size):
+			yield self._Job(begin_offset = begin_offset, end_offset = min(begin_offset + split_size, length))
+
+	def _get_executor(self):
+		if self._executor is None:
+			self._executor = self._scheduler.executor()
+		return self._executor
+
+	def _submit(self, data, job):
+		return self._get_executor().submit(self._run_job, self._stream_format, data[job.begin_offset : job.end_offset + self._LOOKAHEAD], job.end_offset - job.begin_offset, self._alignment, self._min_length, self._min_entropy)
+
+	def _stream_end(self, view, offset):
+		decompressor = StreamDecompressor(self._ViewReader(view[offset:]), self._stream_format)
+		try:
+			for chunk in decompressor:
+				pass
+		except StreamDecompressor.DecompressionError:
+			return None
+		return (offset + decompressor.consumed_length) if decompressor.eof else None
+
+	def _remove_garbage_prefixes(self, data, offsets):
+		"""A few garbage bytes in front of a stream may decode as blocks of
+		their own that run into the actual stream. Of all streams that end at
+		the same offset, only the one that starts last is kept."""
+		view = memoryview(data)
+		stream_ends = { }
+		for offset in offsets:
+			stream_end = self._stream_end(view, offset)
+			if stream_end is None:
+				yield offset
+			else:
+				stream_ends[stream_end] = offset
+		yield from stream_ends.values()
+
+	def _find_all(self, data):
+		for (job, future) in self._scheduler.run(self._create_jobs(len(data)), lambda job: self._submit(data, job)):
+			yield from (job.begin_offset + offset for offset in future.result())
+
+	def find(self, data):
+		"""Returns the offsets of all streams found in the data in ascending
+		order. Offsets are aligned relative to the start of data."""
+		return sorted(self._remove_garbage_prefixes(data, self._find_all(data)))
+
+	def close(self):
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
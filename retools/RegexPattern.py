@@ -0,0 +1,143 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import re
+try:
+	import re._parser as sre_parse
+except ImportError:
+	# Python < 3.11
+	import sre_parse
+
+class RegexPattern():
+	"""Regular expression over bytes whose matches are at most max_length
+	bytes long. The bound is what allows searching a file in chunks: every
+	match that starts in one chunk lies within the overlap carried over to
+	the next one, so it is found exactly once regardless of where chunk
+	borders are. Matches are evaluated only within max_length bytes of
+	their start and are reported at every offset at which the expression
+	matches, like all other patterns.
+
+	The regular expression is compiled with DOTALL, so '.' matches any
+	byte."""
+
+	def __init__(self, regex, max_length):
+		if max_length <= 0:
+			raise ValueError("Maximum match length must be at least one byte.")
+		if isinstance(regex, str):
+			regex = regex.encode("utf-8")
+		try:
+			self._regex = re.compile(regex, flags = re.DOTALL)
+		except re.error as e:
+			raise ValueError("Invalid regular expression '%s': %s" % (regex.decode("utf-8", errors = "replace"), str(e)))
+		if self._regex.match(b"") is not None:
+			raise ValueError("Regular expression must not match an empty string.")
+		self._max_length = max_length
+		self._anchor = self._literal_prefix(self._regex)
+
+	@property
+	def regex(self):
+		return self._regex.pattern
+
+	@property
+	def max_length(self):
+		return self._max_length
+
+	def _match(self, haystack, offset):
+		return self._regex.match(haystack, offset, offset + self._max_length)
+
+	def matches(self, data):
+		return (len(data) <= self._max_length) and (self._regex.fullmatch(data) is not None)
+
+	def match_length(self, haystack, offset):
+		"""Returns the length of the match at the given offset."""
+		match = self._match(haystack, offset)
+		return None if (match is None) else (match.end() - match.start())
+
+	@staticmethod
+	def _literal_prefix(regex):
+		"""Returns the bytes every match starts with, which may be empty."""
+		prefix = bytearray()
+		for (opcode, argument) in sre_parse.parse(regex.pattern, regex.flags):
+			if opcode != sre_parse.LITERAL:
+				break
+			prefix.append(argument)
+		return bytes(prefix)
+
+	def _find_anchored(self, haystack, start):
+		while True:
+			offset = haystack.find(self._anchor, start)
+			if (offset == -1) or (self._match(haystack, offset) is not None):
+				return offset
+			start = offset + 1
+
+	def _find_windowed(self, haystack, start):
+		# A match that starts within the first max_length bytes of the window
+		# also ends within it, so those start positions are decided by one
+		# search over the window. A hit in the second half may hide an
+		# earlier match that needs bytes beyond the window, therefore it is
+		# only accepted once the window has moved there. No attempt looks
+		# further than the end of the window, so the effort stays linear in
+		# the haystack size.
+		while start < len(haystack):
+			window_end = start + self._max_length
+			match = self._regex.search(haystack, start, window_end + self._max_length)
+			if (match is None) or (match.start() >= window_end):
+				start = window_end
+				continue
+			offset = match.start()
+			if self._match(haystack, offset) is not None:
+				return offset
+			# Only matches longer than allowed start here
+			start = offset + 1
+		return -1
+
+	def find(self, haystack, start = 0):
+		"""Returns the offset of the first match at or after start or -1.
+		Candidates are found by looking for the literal prefix of the
+		expression, if it has one; every candidate is only evaluated within
+		max_length bytes."""
+		if len(self._anchor) > 0:
+			return self._find_anchored(haystack, start)
+		else:
+			return self._find_windowed(haystack, start)
+
+	def finditer(self, haystack, start = 0):
+		while True:
+			offset = self.find(haystack, start)
+			if offset == -1:
+				break
+			yield offset
+			start = offset + 1
+
+	def hex(self):
+		return self._regex.pattern.hex()
+
+	def __len__(self):
+		return self._max_length
+
+	def __eq__(self, other):
+		return isinstance(other, RegexPattern) and ((self.regex, self.max_length) == (other.regex, other.max_length))
+
+	def __hash__(self):
+		return hash((self.regex, self.max_length))
+
+	def __repr__(self):
+		return "RegexPattern<%s, max %d>" % (self._regex.pattern, self._max_length)
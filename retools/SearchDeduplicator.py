@@ -0,0 +1,146 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import hashlib
+import sqlite3
+import contextlib
+import collections
+from .ContentDigest import ContentDigest
+
+class SearchDeduplicator():
+	"""Remembers the search results of file contents so that byte-identical
+	files are only searched once; the results of the first copy are replayed
+	for all others. Files are only hashed once a second file of the same size
+	turns up. When a database filename is given, results are also persisted,
+	so that they are known in subsequent searches for the same needles with
+	the same options.
+
+	Results are lists of (suffix, offset, needle, pre, data, post) tuples.
+	The suffix is what follows the original filename in the filename of an
+	occurrence (e.g., the location of a compressed stream)."""
+	_Result = collections.namedtuple("Result", [ "suffix", "offset", "needle", "pre", "data", "post" ])
+
+	def __init__(self, needles, search_key, filename = None):
+		self._needles = list(needles)
+		self._needle_index = { needle: needle_index for (needle_index, needle) in enumerate(self._needles) }
+		self._search_key = search_key
+		self._results = { }
+		self._searching = { }
+		self._unhashed_by_size = { }
+		if filename is not None:
+			self._db = sqlite3.connect(filename)
+			self._db.execute("CREATE TABLE IF NOT EXISTS searched (search_key TEXT NOT NULL, digest BLOB NOT NULL, PRIMARY KEY (search_key, digest)) WITHOUT ROWID")
+			self._db.execute("CREATE TABLE IF NOT EXISTS occurrences (search_key TEXT NOT NULL, digest BLOB NOT NULL, suffix TEXT NOT NULL, offset INTEGER NOT NULL, needle_index INTEGER NOT NULL, pre BLOB NOT NULL, data BLOB NOT NULL, post BLOB NOT NULL)")
+			self._db.execute("CREATE INDEX IF NOT EXISTS occurrences_key ON occurrences (search_key, digest)")
+		else:
+			self._db = None
+		self._content_digest = ContentDigest(db = self._db)
+
+	@staticmethod
+	def search_key(needles, **options):
+		"""Canonical representation of needles and search options. Results are
+		only reused for identical search keys."""
+		canonical = [ "%s=%s" % (key, value) for (key, value) in sorted(options.items()) ]
+		canonical += [ needle.hex() if isinstance(needle, (bytes, bytearray)) else repr(needle) for needle in needles ]
+		return hashlib.sha256("\n".join(canonical).encode("utf-8")).hexdigest()
+
+	def _content_key(self, filename, identity):
+		"""Returns the key under which the results of the file are stored: its
+		digest or, as long as no other file of the same size has been seen,
+		its identity."""
+		size = identity[2]
+		if (self._db is None) and (size not in self._unhashed_by_size):
+			self._unhashed_by_size[size] = [ (filename, identity) ]
+			return identity
+
+		# Files of this size have been seen before; hash them now
+		for (unhashed_filename, unhashed_identity) in self._unhashed_by_size.get(size, [ ]):
+			if unhashed_identity == identity:
+				return identity
+			with contextlib.suppress(OSError):
+				digest = self._content_digest.digest(unhashed_filename, unhashed_identity)
+				if unhashed_identity in self._results:
+					self._results[digest] = self._results.pop(unhashed_identity)
+				if unhashed_identity in self._searching:
+					self._searching[digest] = self._searching.pop(unhashed_identity)
+		self._unhashed_by_size[size] = [ ]
+		return self._content_digest.digest(filename, identity)
+
+	def _load(self, digest):
+		if self._db.execute("SELECT 1 FROM searched WHERE search_key = ? AND digest = ?", (self._search_key, digest)).fetchone() is None:
+			return None
+		rows = self._db.execute("SELECT suffix, offset, needle_index, pre, data, post FROM occurrences WHERE search_key = ? AND digest = ? ORDER BY rowid ASC", (self._search_key, digest))
+		return [ self._Result(suffix = suffix, offset = offset, needle = self._needles[needle_index], pre = pre, data = data, post = post) for (suffix, offset, needle_index, pre, data, post) in rows ]
+
+	def lookup(self, filename):
+		"""Returns the known results for the content of the file or None if it
+		needs to be searched."""
+		identity = ContentDigest.identity(filename)
+		if identity in self._results:
+			return self._results[identity]
+		content_key = self._content_key(filename, identity)
+		if content_key in self._results:
+			return self._results[content_key]
+		if (self._db is not None) and isinstance(content_key, bytes):
+			results = self._load(content_key)
+			if results is not None:
+				self._results[content_key] = results
+			return results
+		return None
+
+	def reserve(self, filename):
+		"""Marks the content of the file, which must have been looked up
+		before, as being searched until its results are stored or it is
+		released. Returns the filename of an identical file that is already
+		being searched instead, if any."""
+		content_key = self._content_key(filename, ContentDigest.identity(filename))
+		searching = self._searching.setdefault(content_key, filename)
+		return searching if (searching != filename) else None
+
+	def release(self, filename):
+		"""Ends the reservation of the file, e.g., after its search failed."""
+		for content_key in [ content_key for (content_key, searching) in self._searching.items() if searching == filename ]:
+			del self._searching[content_key]
+
+	def store(self, filename, occurrences):
+		"""Remembers the occurrences found in the file, which must have been
+		looked up before."""
+		identity = ContentDigest.identity(filename)
+		content_key = self._content_key(filename, identity)
+		results = [ self._Result(suffix = occurrence.filename[len(filename):], offset = occurrence.offset, needle = occurrence.needle, pre = bytes(occurrence.pre), data = bytes(occurrence.data), post = bytes(occurrence.post)) for occurrence in occurrences ]
+		self._results[content_key] = results
+		self.release(filename)
+		if (self._db is not None) and isinstance(content_key, bytes):
+			self._db.execute("DELETE FROM occurrences WHERE search_key = ? AND digest = ?", (self._search_key, content_key))
+			self._db.executemany("INSERT INTO occurrences (search_key, digest, suffix, offset, needle_index, pre, data, post) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ((self._search_key, content_key, result.suffix, result.offset, self._needle_index[result.needle], result.pre, result.data, result.post) for result in results))
+			self._db.execute("INSERT OR IGNORE INTO searched (search_key, digest) VALUES (?, ?)", (self._search_key, content_key))
+			self._db.commit()
+
+	def close(self):
+		if self._db is not None:
+			self._db.commit()
+			self._db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -0,0 +1,119 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import zlib
+import bz2
+import lzma
+
+class StreamDecompressor():
+	"""Decompresses a single compressed stream from a file object starting at
+	its current position. Input is read and output is produced in bounded
+	chunks, so memory stays bounded regardless of the stream size.
+	Decompression stops at the end of the stream, after which the exact
+	number of consumed input bytes is known."""
+
+	_DECOMPRESSORS = {
+		"gzip":		lambda: zlib.decompressobj(wbits = 16 + zlib.MAX_WBITS),
+		"zlib":		lambda: zlib.decompressobj(wbits = zlib.MAX_WBITS),
+		"deflate":	lambda: zlib.decompressobj(wbits = -zlib.MAX_WBITS),
+		"bz2":		lambda: bz2.BZ2Decompressor(),
+		"xz":		lambda: lzma.LZMADecompressor(format = lzma.FORMAT_XZ),
+		"lzma":		lambda: lzma.LZMADecompressor(format = lzma.FORMAT_ALONE),
+	}
+	DecompressionError = (zlib.error, lzma.LZMAError, OSError, EOFError)
+
+	def __init__(self, input_file, stream_format, max_input_length = None, input_chunk_size = 64 * 1024, output_chunk_size = 1024 * 1024):
+		self._input_file = input_file
+		self._decompressor = self._DECOMPRESSORS[stream_format]()
+		self._max_input_length = max_input_length
+		self._input_chunk_size = input_chunk_size
+		self._output_chunk_size = output_chunk_size
+		self._input_length = 0
+
+	@classmethod
+	def get_formats(cls):
+		return list(cls._DECOMPRESSORS)
+
+	@property
+	def eof(self):
+		"""True if the end of the compressed stream was reached."""
+		return self._decompressor.eof
+
+	@property
+	def consumed_length(self):
+		"""Number of input bytes that belong to the compressed stream. Exact
+		once eof has been reached."""
+		if self.eof:
+			return self._input_length - len(self._decompressor.unused_data)
+		else:
+			return self._input_length
+
+	def _decompress_zlib(self, data):
+		while True:
+			output = self._decompressor.decompress(data, self._output_chunk_size)
+			if len(output) > 0:
+				yield output
+			data = self._decompressor.unconsumed_tail
+			if self._decompressor.eof or (len(data) == 0):
+				break
+
+	def _decompress_bounded(self, data):
+		while True:
+			output = self._decompressor.decompress(data, self._output_chunk_size)
+			if len(output) > 0:
+				yield output
+			data = bytes()
+			if self._decompressor.eof or self._decompressor.needs_input:
+				break
+
+	def _decompress(self, data):
+		if hasattr(self._decompressor, "unconsumed_tail"):
+			yield from self._decompress_zlib(data)
+		else:
+			yield from self._decompress_bounded(data)
+
+	def __iter__(self):
+		"""Yields chunks of decompressed data. Raises one of the
+		DecompressionError exceptions on corrupt input."""
+		while not self.eof:
+			read_size = self._input_chunk_size
+			if self._max_input_length is not None:
+				read_size = min(read_size, self._max_input_length - self._input_length)
+			data = self._input_file.read(read_size) if (read_size > 0) else bytes()
+			if len(data) == 0:
+				# Truncated stream
+				break
+			self._input_length += len(data)
+			yield from self._decompress(data)
+
+		if (not self.eof) and hasattr(self._decompressor, "flush"):
+			output = self._decompressor.flush()
+			if len(output) > 0:
+				yield output
+
+	def decompress_all(self, output_file):
+		"""Writes the entire decompressed stream to output_file and returns the
+		number of decompressed bytes."""
+		length = 0
+		for chunk in self:
+			output_file.write(chunk)
+			length += len(chunk)
+		return length
@@ -0,0 +1,259 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import re
+import bisect
+import collections
+
+class StringExtractor():
+	"""Finds runs of printable characters in ASCII, UTF-8, UTF-16LE and
+	UTF-16BE encoding while reading the data only once, chunk by chunk.
+	Every chunk is first classified with bytes.translate() into a string of
+	class characters ('a' for a printable character, 'z' for a zero byte).
+	The regular expressions then only look for literal runs of those, which
+	the regex engine does at a much higher speed than evaluating character
+	classes at every offset. Strings that reach the end of a chunk are
+	carried over to the next one, so chunk borders never split a string.
+	Strings longer than 64 kiB are reported in pieces, so that the carried
+	over data stays bounded. Of overlapping UTF-16LE and UTF-16BE strings
+	(the same text shifted by one byte), only one is reported, and ASCII or
+	UTF-8 strings that lie within a UTF-16 string are not reported.
+
+	UTF-8 strings are those runs of ASCII text and bytes 0x80-0xf4 that
+	contain at least one multi-byte character. In binary data such as
+	machine code, candidate runs are very frequent, so looking for UTF-8
+	strings is considerably slower than looking for the other encodings."""
+	_String = collections.namedtuple("String", [ "offset", "length", "encoding", "text" ])
+	_ENCODINGS = [ "ascii", "utf-8", "utf-16-le", "utf-16-be" ]
+	_DEFAULT_ENCODINGS = [ "ascii", "utf-16-le", "utf-16-be" ]
+
+	_ASCII_CLASSES = bytes(0x61 if (char == 0x09) or (0x20 <= char <= 0x7e) else 0 for char in range(256))
+	_TEXT_CLASSES = bytes(0x61 if (char == 0x09) or (0x20 <= char <= 0x7e) or (0x80 <= char <= 0xf4) else 0 for char in range(256))
+	_UTF16_CLASSES = bytes(0x61 if (char == 0x09) or (0x20 <= char <= 0x7e) or (char >= 0xa0) else (0x7a if (char == 0) else 1) for char in range(256))
+	_UTF8_REGEX = re.compile(rb"(?:[\t\x20-\x7e]|[\xc2-\xdf][\x80-\xbf]|\xe0[\xa0-\xbf][\x80-\xbf]|[\xe1-\xec\xee\xef][\x80-\xbf]{2}|\xed[\x80-\x9f][\x80-\xbf]|\xf0[\x90-\xbf][\x80-\xbf]{2}|[\xf1-\xf3][\x80-\xbf]{3}|\xf4[\x80-\x8f][\x80-\xbf]{2})+")
+
+	# The longest character that can be incomplete at the end of a chunk
+	_MAX_CHAR_LENGTH = 4
+
+	# Longer strings are reported in pieces, in bytes (even for UTF-16)
+	_MAX_RUN_LENGTH = 64 * 1024
+
+	def __init__(self, min_length = 4, encodings = None, chunk_size = 1024 * 1024):
+		if min_length <= 0:
+			raise ValueError("Minimum string length must be at least one character.")
+		self._encodings = self._DEFAULT_ENCODINGS if (encodings is None) else list(encodings)
+		if len(self._encodings) == 0:
+			raise ValueError("At least one encoding must be selected.")
+		for encoding in self._encodings:
+			if encoding not in self._ENCODINGS:
+				raise ValueError("Unsupported encoding '%s', must be one of %s." % (encoding, ", ".join(self._ENCODINGS)))
+		self._min_length = min_length
+		self._chunk_size = chunk_size
+		self._text_regex = re.compile(b"a" * min_length + b"+")
+		self._utf16le_regex = re.compile(b"az" * min_length + b"(?:az)*")
+		self._utf16be_regex = re.compile(b"za" * min_length + b"(?:za)*")
+
+		self._scanners = [ ]
+		if "utf-8" in self._encodings:
+			self._scanners.append(self._scan_text)
+		elif "ascii" in self._encodings:
+			self._scanners.append(self._scan_ascii)
+		if "utf-16-le" in self._encodings:
+			self._scanners.append(self._scan_utf16le)
+		if "utf-16-be" in self._encodings:
+			self._scanners.append(self._scan_utf16be)
+
+	@staticmethod
+	def _translate(buffer, table, translations):
+		# Scanners share translations of the same buffer
+		if table not in translations:
+			translations[table] = buffer.translate(table)
+		return translations[table]
+
+	def _find_runs(self, regex, classes, begin_offset, end_offset, buffer = None):
+		"""Returns the (begin, end) spans of all runs that start at or after
+		begin_offset and end before end_offset and the beginning of the first
+		run that does not (or None). An end_offset of None means that all runs
+		are complete. Runs longer than _MAX_RUN_LENGTH are split into pieces of
+		that length, moved back to a UTF-8 character boundary if the buffer is
+		given; the last piece always keeps at least the minimum length."""
+		runs = [ ]
+		for match in regex.finditer(classes, begin_offset):
+			(begin, end) = match.span()
+			incomplete = (end_offset is not None) and (end >= end_offset)
+			known_end = end_offset if incomplete else end
+			while known_end - begin > self._MAX_RUN_LENGTH + self._MAX_CHAR_LENGTH * self._min_length:
+				split = begin + self._MAX_RUN_LENGTH
+				if buffer is not None:
+					while (split > begin + self._MAX_RUN_LENGTH - self._MAX_CHAR_LENGTH + 1) and (0x80 <= buffer[split] <= 0xbf):
+						split -= 1
+				runs.append((begin, split))
+				begin = split
+			if incomplete:
+				return (runs, begin)
+			runs.append((begin, end))
+		return (runs, None)
+
+	def _scan_ascii(self, buffer, translations, begin_offset, end_offset):
+		classes = self._translate(buffer, self._ASCII_CLASSES, translations)
+		(runs, incomplete) = self._find_runs(self._text_regex, classes, begin_offset, end_offset)
+		return ([ (begin, end, "ascii") for (begin, end) in runs ], incomplete)
+
+	def _scan_text(self, buffer, translations, begin_offset, end_offset):
+		classes = self._translate(buffer, self._TEXT_CLASSES, translations)
+		ascii_classes = self._translate(buffer, self._ASCII_CLASSES, translations)
+		(runs, incomplete) = self._find_runs(self._text_regex, classes, begin_offset, end_offset, buffer = buffer)
+		strings = [ ]
+		for (begin, end) in runs:
+			if ascii_classes.find(0, begin, end) == -1:
+				if "ascii" in self._encodings:
+					strings.append((begin, end, "ascii"))
+				continue
+
+			# Contains bytes that may or may not be multi-byte characters
+			for match in self._UTF8_REGEX.finditer(buffer, begin, end):
+				text = match.group().decode("utf-8")
+				if len(text) < self._min_length:
+					continue
+				encoding = "ascii" if text.isascii() else "utf-8"
+				if encoding in self._encodings:
+					strings.append((match.start(), match.end(), encoding))
+		return (strings, incomplete)
+
+	def _scan_utf16le(self, buffer, translations, begin_offset, end_offset):
+		classes = self._translate(buffer, self._UTF16_CLASSES, translations)
+		(runs, incomplete) = self._find_runs(self._utf16le_regex, classes, begin_offset, end_offset)
+		return ([ (begin, end, "utf-16-le") for (begin, end) in runs ], incomplete)
+
+	def _scan_utf16be(self, buffer, translations, begin_offset, end_offset):
+		classes = self._translate(buffer, self._UTF16_CLASSES, translations)
+		(runs, incomplete) = self._find_runs(self._utf16be_regex, classes, begin_offset, end_offset)
+		return ([ (begin, end, "utf-16-be") for (begin, end) in runs ], incomplete)
+
+	def _resolve_overlaps(self, buffer, buffer_offset, found):
+		"""UTF-16LE text that follows a zero byte is also valid UTF-16BE text
+		one byte earlier, and vice versa. Of two overlapping runs, only the
+		longer one is kept or, if that does not decide, the one that is
+		followed by a NUL character or, failing that, the one that starts at
+		an even offset. The characters of UTF-16 text are also ASCII text, so
+		ASCII and UTF-8 runs that lie entirely within a UTF-16 run are
+		dropped."""
+		def preference(begin, end):
+			return (end - begin, buffer[end : end + 2] == bytes(2), (buffer_offset + begin) % 2 == 0)
+
+		utf16 = [ ]
+		for (begin, scanner_index, end, encoding) in found:
+			if encoding in [ "utf-16-le", "utf-16-be" ]:
+				if (len(utf16) > 0) and (begin < utf16[-1][2]) and (encoding != utf16[-1][3]):
+					if preference(begin, end) <= preference(utf16[-1][0], utf16[-1][2]):
+						continue
+					utf16.pop()
+				utf16.append((begin, scanner_index, end, encoding))
+		if len(utf16) == 0:
+			return found
+
+		utf16_begins = [ begin for (begin, scanner_index, end, encoding) in utf16 ]
+		resolved = [ ]
+		for string in found:
+			(begin, scanner_index, end, encoding) = string
+			if encoding in [ "utf-16-le", "utf-16-be" ]:
+				continue
+			index = bisect.bisect_right(utf16_begins, begin) - 1
+			if (index >= 0) and (end <= utf16[index][2]):
+				continue
+			resolved.append(string)
+		resolved += utf16
+		resolved.sort()
+		return resolved
+
+	def _scan_buffer(self, buffer, buffer_offset, scan_offsets, final):
+		"""Scans the buffer with all scanners, each starting at its own scan
+		offset. Unless this is the final buffer, strings that might still
+		continue in the next chunk are not reported and neither is anything
+		after them, so that strings are reported in ascending order. Returns
+		the strings and the offset from which on the buffer needs to be
+		kept."""
+		if final:
+			(limit, keep_offset) = (None, len(buffer))
+		else:
+			limit = len(buffer) - self._MAX_CHAR_LENGTH + 1
+			keep_offset = max(0, len(buffer) - self._MAX_CHAR_LENGTH * self._min_length)
+		found = [ ]
+		translations = { }
+		for (scanner_index, scanner) in enumerate(self._scanners):
+			(spans, incomplete) = scanner(buffer, translations, scan_offsets[scanner_index], limit)
+			if incomplete is not None:
+				keep_offset = min(keep_offset, incomplete)
+			if len(self._scanners) > 1:
+				found += [ (begin, scanner_index, end, encoding) for (begin, end, encoding) in spans ]
+			elif len(spans) > 0:
+				found = [ (begin, scanner_index, end, encoding) for (begin, end, encoding) in spans if begin < keep_offset ]
+				scan_offsets[scanner_index] = found[-1][2] if (len(found) > 0) else scan_offsets[scanner_index]
+
+		if len(self._scanners) > 1:
+			found.sort()
+			reported = 0
+			for (begin, scanner_index, end, encoding) in found:
+				if end > keep_offset:
+					keep_offset = min(keep_offset, begin)
+					break
+				reported += 1
+			# Overlapping runs are only resolved once all of them are reported
+			for index in reversed(range(reported)):
+				if found[index][2] > keep_offset:
+					(reported, keep_offset) = (index, found[index][0])
+			del found[reported : ]
+			for (begin, scanner_index, end, encoding) in found:
+				scan_offsets[scanner_index] = end
+			found = self._resolve_overlaps(buffer, buffer_offset, found)
+
+		# Positional arguments, this is by far the most frequently executed line
+		strings = [ self._String(buffer_offset + begin, end - begin, encoding, buffer[begin : end].decode(encoding)) for (begin, scanner_index, end, encoding) in found ]
+		return (strings, max(keep_offset, min(scan_offsets)))
+
+	def extract_chunks(self, chunks):
+		"""Yields all strings of an iterable of consecutive data chunks in
+		ascending offset order."""
+		buffer = bytes()
+		buffer_offset = 0
+		scan_offsets = [ 0 ] * len(self._scanners)
+		for chunk in chunks:
+			buffer = (buffer + chunk) if (len(buffer) > 0) else chunk
+			(strings, keep_offset) = self._scan_buffer(buffer, buffer_offset, scan_offsets, final = False)
+			yield from strings
+			buffer = buffer[keep_offset:]
+			buffer_offset += keep_offset
+			scan_offsets = [ max(0, scan_offset - keep_offset) for scan_offset in scan_offsets ]
+		(strings, keep_offset) = self._scan_buffer(buffer, buffer_offset, scan_offsets, final = True)
+		yield from strings
+
+	def extract(self, f):
+		def read_chunks():
+			while True:
+				chunk = f.read(self._chunk_size)
+				if len(chunk) == 0:
+					break
+				yield chunk
+		yield from self.extract_chunks(read_chunks())
+
+	def extract_file(self, filename):
+		with open(filename, "rb") as f:
+			yield from self.extract(f)
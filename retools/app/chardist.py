@@ -19,38 +19,143 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+
 import sys
+import csv
+import json
 import collections
 from retools.FriendlyArgumentParser import FriendlyArgumentParser
+from retools.FileTools import FileTools
+from retools.ByteHistogram import ByteHistogram
+from retools.ParallelByteHistogram import ParallelByteHistogram
 
-parser = FriendlyArgumentParser()
-parser.add_argument("filename", metavar = "filename", type = str, help = "File that should be attempted to unpack")
+parser = FriendlyArgumentParser(description = "Show the distribution of byte values (or of n-grams of bytes) in files or, in profile mode, the entropy and chi-square statistic of each block of a file. High entropy regions usually contain compressed or encrypted data.")
+parser.add_argument("-n", "--ngram", metavar = "length", type = int, choices = [ 1, 2, 3 ], default = 1, help = "Count n-grams of this many consecutive bytes instead of single bytes. Counts of 2-grams take 512 kiB. 3-grams are kept sparse, but once more than about a million distinct ones were seen (e.g., in high entropy data), their counts take 128 MiB in the main process and in every worker. Can be one of %(choices)s, defaults to %(default)d.")
+parser.add_argument("-t", "--top", metavar = "count", type = int, default = 64, help = "When counting n-grams in text format, only print this many of the most common ones. Defaults to %(default)d.")
+parser.add_argument("-j", "--jobs", metavar = "count", type = int, default = 1, help = "Count using this many worker processes in parallel. Defaults to %(default)d.")
+parser.add_argument("-p", "--profile", action = "store_true", help = "Print the statistics of each block of the file instead of the distribution of the whole file.")
+parser.add_argument("-b", "--block-size", metavar = "bytes", type = int, default = 4096, help = "Size of the blocks in profile mode. Defaults to %(default)d.")
+parser.add_argument("-s", "--step", metavar = "bytes", type = int, help = "Distance between the beginnings of consecutive blocks in profile mode. A step smaller than the block size gives a sliding window; the block size must be a multiple of it. Defaults to the block size.")
+parser.add_argument("-f", "--format", choices = [ "text", "csv", "json" ], default = "text", help = "Output format. Can be one of %(choices)s, defaults to %(default)s.")
+parser.add_argument("filename", metavar = "filename", nargs = "+", type = str, help = "File(s) that should be analyzed. Directories are always recursed into. The distributions of all files are merged.")
 args = parser.parse_args(sys.argv[1:])
+if args.step is None:
+	args.step = args.block_size
+if (args.block_size <= 0) or (args.step <= 0):
+	parser.error("Block size and step must be positive.")
+if (args.block_size % args.step) != 0:
+	parser.error("Block size must be a multiple of the step.")
+if args.profile and (args.ngram != 1):
+	parser.error("Profile mode only supports single bytes.")
 
 class CharDistAnalysis():
+	_CHUNK_SIZE = 1024 * 1024
+
 	def __init__(self, args):
 		self._args = args
-		self._length = 0
-		self._histogram = collections.Counter()
 
-	def _print_results(self):
-		for i in range(256):
-			count = self._histogram.get(i, 0)
-			if count != 0:
-				print("%3d / %02x: %6d %.1f%% (rnd rel %+.0f%%)" % (i, i, count, count / self._length * 100, (count * 256 / self._length * 100) - 100))
+	def _read_chunks(self, f, chunk_size):
+		while True:
+			chunk = f.read(chunk_size)
+			if len(chunk) == 0:
+				break
+			yield chunk
+
+	def _print_histogram(self, histogram):
+		if self._args.format == "json":
+			print(json.dumps({
+				"ngram":		histogram.ngram,
+				"length":		histogram.length,
+				"counts":		list(histogram.counts) if (histogram.ngram == 1) else { histogram.ngram_bytes(index).hex(): count for (index, count) in histogram.nonzero() },
+				"entropy":		histogram.entropy,
+				"chi_square":	histogram.chi_square,
+			}))
+		elif self._args.format == "csv":
+			writer = csv.writer(sys.stdout)
+			if histogram.ngram == 1:
+				writer.writerow([ "value", "count" ])
+				for (value, count) in enumerate(histogram.counts):
+					writer.writerow([ value, count ])
+			else:
+				writer.writerow([ "ngram", "count" ])
+				for (index, count) in histogram.nonzero():
+					writer.writerow([ histogram.ngram_bytes(index).hex(), count ])
+		elif histogram.ngram == 1:
+			for (i, count) in enumerate(histogram.counts):
+				if count != 0:
+					print("%3d / %02x: %6d %.1f%% (rnd rel %+.0f%%)" % (i, i, count, count / histogram.length * 100, (count * 256 / histogram.length * 100) - 100))
+			print("Entropy %.3f bits/byte, chi-square %.1f" % (histogram.entropy, histogram.chi_square))
+		else:
+			for (index, count) in histogram.most_common(self._args.top):
+				print("%s: %6d %.3f%%" % (histogram.ngram_bytes(index).hex(), count, count / histogram.length * 100))
+			print("Entropy %.3f bits/%d-gram, chi-square %.1f" % (histogram.entropy, histogram.ngram, histogram.chi_square))
+
+	def _blocks(self, f):
+		"""Yields (offset, histogram) of all blocks. For a sliding window, the
+		histogram of each step is only counted once and added to and removed
+		from the window's histogram."""
+		steps_per_block = self._args.block_size // self._args.step
+		chunk_size = max(1, self._CHUNK_SIZE // self._args.step) * self._args.step
+		window = ByteHistogram()
+		step_counts = collections.deque()
+		offset = 0
+		for chunk in self._read_chunks(f, chunk_size):
+			for step_offset in range(0, len(chunk), self._args.step):
+				counts = ByteHistogram.count(chunk[step_offset : step_offset + self._args.step])
+				window.add_counts(counts)
+				step_counts.append(counts)
+				if len(step_counts) > steps_per_block:
+					window.remove_counts(step_counts.popleft())
+					offset += self._args.step
+				if len(step_counts) == steps_per_block:
+					yield (offset, window)
+		if 0 < len(step_counts) < steps_per_block:
+			# File is shorter than a single block
+			yield (offset, window)
+
+	def _print_profile(self, filenames):
+		if self._args.format == "csv":
+			writer = csv.writer(sys.stdout)
+			writer.writerow([ "filename", "offset", "length", "entropy", "chi_square" ])
+		elif self._args.format == "text":
+			print("%-10s %-8s %-7s %-12s %s" % ("Offset", "Length", "Entropy", "Chi-square", "Filename"))
+		for filename in filenames:
+			with open(filename, "rb") as f:
+				for (offset, histogram) in self._blocks(f):
+					if self._args.format == "json":
+						print(json.dumps({ "filename": filename, "offset": offset, "length": histogram.length, "entropy": histogram.entropy, "chi_square": histogram.chi_square }))
+					elif self._args.format == "csv":
+						writer.writerow([ filename, offset, histogram.length, "%.4f" % (histogram.entropy), "%.1f" % (histogram.chi_square) ])
+					else:
+						print("%10x %8d %7.3f %12.1f %s" % (offset, histogram.length, histogram.entropy, histogram.chi_square, filename))
+
+	def _enumerate_files(self):
+		return FileTools.enumerate_files(self._args.filename, recurse = True, error_callback = lambda filename, e: print("%s: %s" % (filename, str(e)), file = sys.stderr))
+
+	def _histogram_serial(self, filenames):
+		histogram = ByteHistogram(ngram = self._args.ngram)
+		for filename in filenames:
+			try:
+				histogram.add_file(filename)
+			except OSError as e:
+				print("%s: %s" % (filename, str(e)), file = sys.stderr)
+		return histogram
 
-	def _process_chunk(self, chunk):
-		self._histogram.update(chunk)
+	def _histogram_parallel(self, filenames):
+		errors = [ ]
+		histogram = ParallelByteHistogram(ngram = self._args.ngram, jobs = self._args.jobs).histogram(filenames, errors = errors)
+		for (filename, error) in errors:
+			print("%s: %s" % (filename, str(error)), file = sys.stderr)
+		return histogram
 
 	def run(self):
-		with open(self._args.filename, "rb") as f:
-			while True:
-				chunk = f.read(1024 * 1024)
-				if len(chunk) == 0:
-					break
-				self._process_chunk(chunk)
-				self._length += len(chunk)
-		self._print_results()
+		filenames = self._enumerate_files()
+		if self._args.profile:
+			self._print_profile(filenames)
+		elif self._args.jobs > 1:
+			self._print_histogram(self._histogram_parallel(filenames))
+		else:
+			self._print_histogram(self._histogram_serial(filenames))
 
 cda = CharDistAnalysis(args)
 cda.run()
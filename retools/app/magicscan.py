@@ -0,0 +1,86 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+import io
+from retools.FriendlyArgumentParser import FriendlyArgumentParser
+from retools.MagicScanner import MagicScanner
+from retools.ParallelFileSearch import ParallelFileSearch
+from retools.FileTools import FileTools
+
+class MagicScan():
+	def __init__(self, args):
+		self._args = args
+		self._scanner = MagicScanner()
+
+	@classmethod
+	def from_commandline(cls):
+		parser = FriendlyArgumentParser(description = "Scan files for well-known constants of cryptographic algorithms, such as S-boxes, hash initialization vectors, round constants or elliptic curve parameters.")
+		parser.add_argument("-l", "--list", action = "store_true", help = "List all signatures that are searched for and exit.")
+		parser.add_argument("-r", "--recurse", action = "store_true", help = "Recurse into subdirectories.")
+		parser.add_argument("-j", "--jobs", metavar = "count", type = int, default = 1, help = "Scan using this many worker processes in parallel. Defaults to %(default)d.")
+		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
+		parser.add_argument("filename", metavar = "filename", nargs = "*", type = str, help = "File(s) that should be scanned")
+		args = parser.parse_args(sys.argv[1:])
+		if (not args.list) and (len(args.filename) == 0):
+			parser.error("No files given to scan.")
+		return cls(args = args)
+
+	def _print_match(self, match):
+		print("%s %x %s (%s)" % (match.filename, match.offset, match.name, match.variant))
+
+	def _enumerate_files(self):
+		return FileTools.enumerate_files(self._args.filename, recurse = self._args.recurse, error_callback = lambda filename, e: print("%s: %s" % (filename, str(e)), file = sys.stderr))
+
+	def _scan_serial(self):
+		for filename in self._enumerate_files():
+			if self._args.verbose >= 1:
+				print("Scanning: %s" % (filename))
+			try:
+				for match in self._scanner.scan(filename):
+					self._print_match(match)
+			except (PermissionError, io.UnsupportedOperation) as e:
+				print("%s: %s" % (filename, str(e)), file = sys.stderr)
+
+	def _scan_parallel(self):
+		pfs = ParallelFileSearch(self._scanner.needles, context_size = 0, jobs = self._args.jobs)
+		for result in pfs.search(self._enumerate_files()):
+			if result.error is not None:
+				print("%s: %s" % (result.filename, str(result.error)), file = sys.stderr)
+				continue
+			for occurrence in result.occurrences:
+				for match in self._scanner.matches_of(occurrence.filename, occurrence):
+					self._print_match(match)
+
+	def _list_signatures(self):
+		for signature in self._scanner.signatures:
+			print("%-8s %s" % (signature.kind, signature.name))
+
+	def run(self):
+		if self._args.list:
+			self._list_signatures()
+		elif self._args.jobs > 1:
+			self._scan_parallel()
+		else:
+			self._scan_serial()
+
+cmd = MagicScan.from_commandline()
+cmd.run()
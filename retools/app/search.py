@@ -26,15 +26,57 @@ import collections
 import argparse
 import io
 from retools.FriendlyArgumentParser import FriendlyArgumentParser
-from retools.PreciseFloat import PreciseFloat
 from retools.FileSearch import FileSearch
+from retools.ParallelFileSearch import ParallelFileSearch
+from retools.NGramIndex import NGramIndex
+from retools.CompressedFileSearch import CompressedFileSearch
+from retools.SearchDeduplicator import SearchDeduplicator
 from retools.EncodableTypes import EncodableTypes, EncodingException
 from retools.HexDump import HexDump
+from retools.FileTools import FileTools
+
+class SearchIndexer():
+	def __init__(self, args):
+		self._args = args
+
+	@classmethod
+	def from_commandline(cls, argv):
+		parser = FriendlyArgumentParser(prog = "search index")
+		parser.add_argument("-i", "--index", metavar = "filename", type = str, default = "search_index.sqlite3", help = "Index file that is created or updated. Defaults to %(default)s.")
+		parser.add_argument("-b", "--block-size", metavar = "bytes", type = int, default = 64 * 1024, help = "Granularity of the index when a new index is created. Smaller blocks narrow down searches more, but make the index larger. Defaults to %(default)d.")
+		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
+		parser.add_argument("action", choices = [ "build" ], help = "Action to perform. 'build' creates the index or incrementally updates it for all files that changed in size or modification time.")
+		parser.add_argument("filename", metavar = "filename", nargs = "+", type = str, help = "File(s) or directories that should be indexed. Directories are always recursed into.")
+		args = parser.parse_args(argv)
+		return cls(args = args)
+
+	def _enumerate_files(self):
+		return FileTools.enumerate_files(self._args.filename, recurse = True, error_callback = lambda filename, e: print("%s: %s" % (filename, str(e)), file = sys.stderr))
+
+	def run(self):
+		index_filename = os.path.abspath(self._args.index)
+		with NGramIndex(self._args.index, block_size = self._args.block_size) as index:
+			index.prune()
+			for filename in self._enumerate_files():
+				if os.path.abspath(filename).startswith(index_filename):
+					# Do not index the index itself or its journal
+					continue
+				try:
+					updated = index.update(filename)
+				except (PermissionError, io.UnsupportedOperation) as e:
+					print("%s: %s" % (filename, str(e)), file = sys.stderr)
+					continue
+				if updated and (self._args.verbose >= 1):
+					print("Indexed: %s" % (filename))
+				elif (not updated) and (self._args.verbose >= 2):
+					print("Unchanged: %s" % (filename))
 
 class FileSearcher():
 	def __init__(self, args):
 		self._args = args
 		self._hexdump = HexDump()
+		self._index = None
+		self._dedup = None
 
 	@classmethod
 	def pattern_argument(cls, arg):
@@ -43,50 +85,111 @@ class FileSearcher():
 		except EncodingException as e:
 			raise argparse.ArgumentTypeError(str(e))
 
+	@classmethod
+	def default_cache_filename(cls):
+		cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+		return cache_dir + "/retools/search_results.sqlite3"
+
 	@classmethod
 	def from_commandline(cls):
 		parser = FriendlyArgumentParser()
 		parser.add_argument("-x", "--hex-dump", action = "store_true", help = "Show every occurrence as a hex dump.")
 		parser.add_argument("-c", "--context", metavar = "bytes", type = int, default = 32, help = "Display this amount of context around occurrences.")
 		parser.add_argument("-r", "--recurse", action = "store_true", help = "Recurse into subdirectories.")
+		parser.add_argument("-j", "--jobs", metavar = "count", type = int, default = 1, help = "Search using this many worker processes in parallel. Large files are split up into multiple jobs. Defaults to %(default)d.")
+		parser.add_argument("-i", "--index", metavar = "filename", type = str, help = "Use this index (created by 'search index build') to narrow down the search. Files that are not indexed or that have changed since are searched entirely. So are files in which the patterns could occur in more than half of all blocks, which is common for high entropy content (e.g., compressed or encrypted data) and short patterns; the index does not speed up searching such files.")
+		parser.add_argument("-m", "--max-mismatches", metavar = "count", type = int, default = 0, help = "Also report occurrences in which up to this many bytes differ from the pattern. Does not apply to wildcard patterns. Defaults to %(default)d.")
+		parser.add_argument("-z", "--decompress", action = "store_true", help = "Also search inside of compressed streams and archives (gzip, bzip2, xz, zlib, ZIP) that are found within the files, and inside of those nested within them. Tar archives are not recognized, but streams and archives within them are. Occurrences are reported with a virtual filename such as 'fw.bin@0x1f000:gzip' or 'fw.bin@0x1f000:gzip@0x200:zip/etc/passwd', offsets refer to the decompressed data.")
+		parser.add_argument("--decompress-depth", metavar = "levels", type = int, default = 4, help = "When searching inside of compressed streams and archives, descend at most this many levels into ones nested within each other. Defaults to %(default)d.")
+		parser.add_argument("-l", "--archive-limit", metavar = "bytes", type = int, help = "When searching inside of compressed streams, read at most this many bytes of a stream to determine its length. Streams that are cut off are decompressed until their end regardless. Can be useful when working with large archives.")
+		parser.add_argument("--chunk-size", metavar = "bytes", type = int, default = 1024 * 1024, help = "Size of the chunks in which files are read if they cannot be memory-mapped or if prefetching is enabled. Defaults to %(default)d.")
+		parser.add_argument("--prefetch", metavar = "chunks", type = int, default = 0, help = "Do not memory-map files, but read up to this many chunks ahead in a background thread while searching. Helps on slow storage such as network file systems or hard disks. Disabled by default.")
+		parser.add_argument("-d", "--deduplicate", action = "store_true", help = "Search files with identical content only once and report the same occurrences for all copies. Useful for unpacked file systems that contain many duplicate files.")
+		parser.add_argument("-C", "--cache", action = "store_true", help = "Use the persistent result cache in %s. Files that have already been searched for the same pattern with the same options are not searched again, but their cached occurrences are reported. Implies --deduplicate." % (cls.default_cache_filename()))
+		parser.add_argument("--dedup-cache", metavar = "filename", type = str, help = "Like --cache, but use this database file as the persistent result cache.")
+		parser.add_argument("--ordered", action = "store_true", help = "When searching in parallel, report occurrences in exactly the same order as a serial search would. By default, they are reported as soon as they are found.")
 		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
-		parser.add_argument("pattern", metavar = "pattern", type = cls.pattern_argument, help = "Pattern that should be looked for. Can be something like 'str:foobar', 'str-utf16-be:foobar', 'str-*:foobar', 'uint16:1234', 'uint16-be:0xabcd', 'hex:123f', 'base64:AAAA', 'ip:12.34.56.78'")
+		parser.add_argument("pattern", metavar = "pattern", type = cls.pattern_argument, help = "Pattern that should be looked for. Can be something like 'str:foobar', 'str-utf16-be:foobar', 'str-*:foobar', 'uint16:1234', 'uint16-be:0xabcd', 'uint32-?e:0x08000000..0x080fffff', 'sint16-a2:-5..5' (aligned to even offsets), 'float32-?e:3.14159~1e-4', 'float64:2.5~1%%', 'hex:123f', 'hex:27051956 ?? ?? 1? ff', 'mask:1234/fff0', 'base64:AAAA', 'ip:12.34.56.78', 're-64:PK\\x03\\x04.{0,30}\\.so' (regular expression whose matches are at most 64 bytes long, defaults to 256)")
 		parser.add_argument("filename", metavar = "filename", nargs = "+", type = str, help = "File(s) that should be searched")
 		args = parser.parse_args(sys.argv[1:])
+		if (args.index is not None) and (not os.path.isfile(args.index)):
+			parser.error("Index file %s does not exist." % (args.index))
+		if args.cache and (args.dedup_cache is None):
+			args.dedup_cache = cls.default_cache_filename()
+		if args.chunk_size <= 0:
+			parser.error("Chunk size must be positive.")
+		if args.prefetch < 0:
+			parser.error("Number of chunks to prefetch must not be negative.")
+		if args.max_mismatches < 0:
+			parser.error("Number of mismatches must not be negative.")
+		if args.decompress_depth < 1:
+			parser.error("Decompression depth must be at least one level.")
+		for pattern in args.pattern:
+			if isinstance(pattern.value, bytes) and (args.max_mismatches >= len(pattern.value)):
+				parser.error("Allowing %d mismatches on pattern %s of %d bytes would match everywhere." % (args.max_mismatches, pattern.name, len(pattern.value)))
 		return cls(args = args)
 
 	def _print_match(self, filename, pattern, match):
-		print("%s %x %s %s %s" % (filename, match.offset, match.pre.hex(), pattern.value.hex(), match.post.hex()))
+		print("%s %x %s %s %s" % (filename, match.offset, match.pre.hex(), match.data.hex(), match.post.hex()))
 		if self._args.hex_dump:
-			data = match.pre + pattern.value + match.post
+			data = bytes(match.pre) + bytes(match.data) + bytes(match.post)
 			markers = { len(match.pre): ">" }
 			self._hexdump.dump(data, markers = markers)
 
-	def _search_file(self, filename, pattern):
+	def _decompress_options(self):
+		return {
+			"max_depth":		self._args.decompress_depth,
+			"archive_limit":	self._args.archive_limit,
+			"verbose":			self._args.verbose,
+		}
+
+	def _find_all(self, filename, patterns):
+		fs = FileSearch(filename, context_size = self._args.context, index = self._index, max_mismatches = self._args.max_mismatches, chunk_size = self._args.chunk_size, prefetch = self._args.prefetch)
+		yield from fs.find_all_multi(patterns.keys())
+		if self._args.decompress:
+			cfs = CompressedFileSearch(filename, context_size = self._args.context, max_mismatches = self._args.max_mismatches, **self._decompress_options())
+			yield from cfs.find_all_multi(patterns.keys())
+
+	def _search_file(self, filename, patterns):
 		if self._args.verbose >= 3:
 			print("Searching: %s" % (filename))
-		fs = FileSearch(filename, context_size = self._args.context)
-		for match in fs.find_all(pattern.value):
-			self._print_match(filename, pattern, match)
+		if self._dedup is None:
+			for match in self._find_all(filename, patterns):
+				self._print_match(match.filename, patterns[match.needle], match)
+			return
+
+		results = self._dedup.lookup(filename)
+		if results is not None:
+			if self._args.verbose >= 2:
+				print("Content already searched: %s" % (filename))
+			for result in results:
+				self._print_match(filename + result.suffix, patterns[result.needle], result)
+			return
 
-	def _search_dir(self, dirname, pattern):
-		for filename in os.listdir(dirname):
-			full_filename = dirname + "/" + filename
+		occurrences = [ ]
+		for match in self._find_all(filename, patterns):
+			self._print_match(match.filename, patterns[match.needle], match)
+			occurrences.append(match)
+		self._dedup.store(filename, occurrences)
+
+	def _enumerate_files(self):
+		return FileTools.enumerate_files(self._args.filename, recurse = self._args.recurse, error_callback = lambda filename, e: print("%s: %s" % (filename, str(e)), file = sys.stderr))
+
+	def _search_serial(self, patterns):
+		for filename in self._enumerate_files():
 			try:
-				if os.path.islink(full_filename):
-					continue
-				elif os.path.isfile(full_filename):
-					self._search_file(full_filename, pattern)
-				elif self._args.recurse and os.path.isdir(full_filename):
-					self._search_dir(full_filename, pattern)
+				self._search_file(filename, patterns)
 			except (PermissionError, io.UnsupportedOperation) as e:
 				print("%s: %s" % (filename, str(e)), file = sys.stderr)
 
-	def _search(self, filename, pattern):
-		if os.path.isfile(filename):
-			self._search_file(filename, pattern)
-		elif os.path.isdir(filename):
-			self._search_dir(filename, pattern)
+	def _search_parallel(self, patterns):
+		pfs = ParallelFileSearch(patterns.keys(), context_size = self._args.context, jobs = self._args.jobs, ordered = self._args.ordered, index_filename = self._args.index, max_mismatches = self._args.max_mismatches, decompress = self._args.decompress, decompress_options = self._decompress_options(), cache = self._dedup, chunk_size = self._args.chunk_size, prefetch = self._args.prefetch)
+		for result in pfs.search(self._enumerate_files()):
+			if result.error is not None:
+				print("%s: %s" % (result.filename, str(result.error)), file = sys.stderr)
+				continue
+			for match in result.occurrences:
+				self._print_match(match.filename, patterns[match.needle], match)
 
 	def _unique_pattern(self):
 		seen = set()
@@ -101,11 +204,28 @@ class FileSearcher():
 			for pattern_instance in self._unique_pattern():
 				print("%-15s %s" % (pattern_instance.name, pattern_instance.value.hex()))
 
-		for pattern in self._unique_pattern():
-			if self._args.verbose >= 2:
-				print("Searching: %s" % (pattern.name))
-			for filename in self._args.filename:
-				self._search(filename, pattern)
+		# All patterns are searched for in a single pass over every file; the
+		# needle of each occurrence maps back to the pattern that matched
+		patterns = collections.OrderedDict((pattern.value, pattern) for pattern in self._unique_pattern())
+		if self._args.deduplicate or (self._args.dedup_cache is not None):
+			if self._args.dedup_cache is not None:
+				os.makedirs(os.path.dirname(os.path.abspath(self._args.dedup_cache)), exist_ok = True)
+			decompress = (self._args.decompress_depth, self._args.archive_limit) if self._args.decompress else False
+			search_key = SearchDeduplicator.search_key(patterns.keys(), context = self._args.context, max_mismatches = self._args.max_mismatches, decompress = decompress)
+			self._dedup = SearchDeduplicator(patterns.keys(), search_key, filename = self._args.dedup_cache)
+		try:
+			if self._args.jobs > 1:
+				self._search_parallel(patterns)
+			else:
+				if self._args.index is not None:
+					self._index = NGramIndex(self._args.index)
+				self._search_serial(patterns)
+		finally:
+			if self._dedup is not None:
+				self._dedup.close()
 
-cmd = FileSearcher.from_commandline()
+if sys.argv[1:2] == [ "index" ]:
+	cmd = SearchIndexer.from_commandline(sys.argv[2:])
+else:
+	cmd = FileSearcher.from_commandline()
 cmd.run()
@@ -20,67 +20,162 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import os
+import re
 import sys
-import collections
+import mmap
+import contextlib
 from retools.FriendlyArgumentParser import FriendlyArgumentParser
 from retools.EncodableTypes import EncodableTypes
+from retools.CandidateSet import CandidateSet
 
-parser = FriendlyArgumentParser()
-parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
-parser.add_argument("filename_pattern", metavar = "filename pattern", nargs = "+", type = str, help = "Filename and pattern that should be searched for. Pattern can be either a hex string or a value of type:data where type can be one of %s. E.g, 'uint32:1234' or 'sint16-be:-9'" % (", ".join(EncodableTypes.get_known_types())))
-args = parser.parse_args(sys.argv[1:])
+class SimFind():
+	_CONDITION_REGEX = re.compile(r"(?P<condition>changed|unchanged|increased|decreased)(:(?P<amount>\d+))?")
 
-if len(args.filename_pattern) % 2 != 0:
-	print("Error: Must supply a pattern with each file name, but odd number of positional arguments given.", file = sys.stderr)
-	sys.exit(1)
+	def __init__(self, args):
+		self._args = args
+		self._candidates = None
+		self._snapshots = [ ]
 
-parsed_patterns = [ ]
-for (filename, pattern) in zip(args.filename_pattern[::2], args.filename_pattern[1::2]):
-	try:
-		if ":" in pattern:
-			(ptype, pvalue) = pattern.split(":", maxsplit = 1)
-			bin_pattern = list(EncodableTypes.encode(pvalue, ptype))[0].value
+	@classmethod
+	def from_commandline(cls):
+		parser = FriendlyArgumentParser(description = "Find offsets at which values are similar across multiple files, e.g., memory snapshots taken at different times. By default, each file is given with a pattern that needs to be present at the same offset in all files. In differential mode, a condition is given that the values at the remaining offsets need to fulfill from one snapshot to the next.")
+		parser.add_argument("-c", "--compare", metavar = "condition", type = str, help = "Use differential mode, in which the values at each offset are compared between consecutive snapshots. Condition can be one of changed, unchanged, increased, decreased, increased:N or decreased:N (increased or decreased by exactly N, with wraparound).")
+		parser.add_argument("-w", "--width", metavar = "bytes", type = int, choices = [ 1, 2, 4, 8 ], default = 4, help = "Width of the values that are compared in differential mode, in bytes. Can be one of %(choices)s, defaults to %(default)d.")
+		parser.add_argument("-e", "--endian", choices = [ "little", "big" ], default = "little", help = "Byte order of the values that are compared in differential mode. Can be one of %(choices)s, defaults to %(default)s.")
+		parser.add_argument("--signed", action = "store_true", help = "Compare values as signed integers in differential mode.")
+		parser.add_argument("-a", "--alignment", metavar = "bytes", type = int, default = 1, help = "Only consider offsets that are a multiple of this alignment when starting a differential search. Defaults to %(default)d.")
+		parser.add_argument("-r", "--relative-to", choices = [ "previous", "first" ], default = "previous", help = "Snapshot that each snapshot is compared against in differential mode. Can be one of %(choices)s, defaults to %(default)s.")
+		parser.add_argument("-s", "--state", metavar = "filename", type = str, help = "Keep the remaining candidates in this file between invocations. If it exists, the search continues with its candidates and the snapshots are compared against the ones previously given. Afterwards, the remaining candidates are written back.")
+		parser.add_argument("-n", "--max-matches", metavar = "count", type = int, help = "Only print the offsets if at most this many remain. By default, all offsets are printed.")
+		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
+		parser.add_argument("filename_pattern", metavar = "filename [pattern]", nargs = "+", type = str, help = "Filename and pattern that should be searched for or, in differential mode, only the filenames of the snapshots. Pattern can be either a hex string or a value of type:data where type can be one of %s. E.g, 'uint32:1234' or 'sint16-be:-9'" % (", ".join(EncodableTypes.get_known_types())))
+		args = parser.parse_args(sys.argv[1:])
+		if args.compare is None:
+			if len(args.filename_pattern) % 2 != 0:
+				parser.error("Must supply a pattern with each file name, but odd number of positional arguments given.")
 		else:
-			bin_pattern = bytes.fromhex(pattern)
-	except ValueError as e:
-		print("Invalid pattern: %s (%s)" % (pattern, str(e)), file = sys.stderr)
-		sys.exit(1)
-	if args.verbose >= 1:
-		print("%20s: %s" % (filename, bin_pattern.hex()))
+			match = cls._CONDITION_REGEX.fullmatch(args.compare)
+			if match is None:
+				parser.error("Invalid condition: %s" % (args.compare))
+			if (match["amount"] is not None) and (match["condition"] not in [ "increased", "decreased" ]):
+				parser.error("An amount can only be given for the increased or decreased conditions.")
+			if (args.state is None) and (len(args.filename_pattern) < 2):
+				parser.error("At least two snapshots are needed in differential mode.")
+		if args.alignment <= 0:
+			parser.error("Alignment must be at least one byte.")
+		return cls(args = args)
 
-	parsed_patterns.append((filename, bin_pattern))
+	@staticmethod
+	@contextlib.contextmanager
+	def _map_file(filename):
+		with open(filename, "rb") as f:
+			try:
+				mapping = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+			except (ValueError, OSError):
+				# Empty files, pipes and the likes cannot be mapped
+				yield f.read()
+				return
+			try:
+				yield mapping
+			finally:
+				mapping.close()
 
-def findall(haystack, needle):
-	occurrences = set()
-	start_offset = 0
-	while True:
-		match_offset = haystack.find(needle, start_offset)
-		if match_offset == -1:
-			break
-		occurrences.add(match_offset)
-		start_offset = match_offset + 1
-	return occurrences
+	def _parse_patterns(self):
+		parsed_patterns = [ ]
+		for (filename, pattern) in zip(self._args.filename_pattern[::2], self._args.filename_pattern[1::2]):
+			try:
+				if ":" in pattern:
+					(ptype, pvalue) = pattern.split(":", maxsplit = 1)
+					bin_pattern = list(EncodableTypes.encode(pvalue, ptype))[0].value
+				else:
+					bin_pattern = bytes.fromhex(pattern)
+				if len(bin_pattern) == 0:
+					raise ValueError("pattern is empty")
+			except ValueError as e:
+				print("Invalid pattern: %s (%s)" % (pattern, str(e)), file = sys.stderr)
+				sys.exit(1)
+			if self._args.verbose >= 1:
+				print("%20s: %s" % (filename, bin_pattern.hex()))
+			parsed_patterns.append((filename, bin_pattern))
+		return parsed_patterns
 
-with open(parsed_patterns[0][0], "rb") as f:
-	content = f.read()
-	occurrences = findall(content, parsed_patterns[0][1])
+	def _load_state(self):
+		if (self._args.state is None) or (not os.path.exists(self._args.state)):
+			return
+		(self._candidates, metadata) = CandidateSet.load(self._args.state)
+		self._snapshots = metadata["snapshots"]
+		if self._args.verbose >= 2:
+			print("Loaded %d candidates after %d snapshot(s) from %s" % (len(self._candidates), len(self._snapshots), self._args.state))
 
-if args.verbose >= 2:
-	print("After initial processing of %s: %d matches" % (parsed_patterns[0][0], len(occurrences)))
+	def _save_state(self):
+		if self._args.state is not None:
+			self._candidates.save(self._args.state, metadata = { "snapshots": self._snapshots })
 
-for (filename, bin_pattern) in parsed_patterns[1:]:
-	matched_occurrences = set()
-	with open(filename, "rb") as f:
-		for offset in occurrences:
-			f.seek(offset)
-			actual_pattern = f.read(len(bin_pattern))
-			if actual_pattern == bin_pattern:
-				matched_occurrences.add(offset)
-	occurrences = matched_occurrences
-	if args.verbose >= 2:
-		print("After processing of %s: %d matches" % (filename, len(occurrences)))
+	def _search_patterns(self):
+		for (filename, bin_pattern) in self._parse_patterns():
+			with self._map_file(filename) as data:
+				if self._candidates is None:
+					self._candidates = CandidateSet.from_pattern(data, bin_pattern)
+				else:
+					self._candidates = self._candidates.filter_pattern(data, bin_pattern)
+			self._snapshots.append(filename)
+			if self._args.verbose >= 2:
+				print("After processing of %s: %d matches" % (filename, len(self._candidates)))
 
-print("%d occurrences of pattern(s) found." % (len(occurrences)))
-for (oid, offset) in enumerate(sorted(occurrences), 1):
-	print("Match %-4d: 0x%x (%d)" % (oid, offset, offset))
+	def _compare(self, old_data, new_data):
+		match = self._CONDITION_REGEX.fullmatch(self._args.compare)
+		(condition, amount) = (match["condition"], int(match["amount"]) if (match["amount"] is not None) else None)
+		if condition == "changed":
+			return self._candidates.filter_changed(old_data, new_data, self._args.width)
+		elif condition == "unchanged":
+			return self._candidates.filter_unchanged(old_data, new_data, self._args.width)
+		elif condition == "increased":
+			return self._candidates.filter_increased(old_data, new_data, self._args.width, byteorder = self._args.endian, signed = self._args.signed, amount = amount)
+		else:
+			return self._candidates.filter_decreased(old_data, new_data, self._args.width, byteorder = self._args.endian, signed = self._args.signed, amount = amount)
+
+	def _search_differential(self):
+		filenames = list(self._args.filename_pattern)
+		if len(self._snapshots) == 0:
+			self._snapshots.append(filenames.pop(0))
+		for filename in filenames:
+			reference = self._snapshots[0] if (self._args.relative_to == "first") else self._snapshots[-1]
+			with self._map_file(reference) as old_data, self._map_file(filename) as new_data:
+				if len(old_data) != len(new_data):
+					print("Snapshots must be of the same size, but %s has %d bytes and %s has %d bytes." % (reference, len(old_data), filename, len(new_data)), file = sys.stderr)
+					sys.exit(1)
+				if self._candidates is None:
+					self._candidates = CandidateSet.all(len(old_data), alignment = self._args.alignment)
+				self._candidates = self._compare(old_data, new_data)
+			self._snapshots.append(filename)
+			if self._args.verbose >= 2:
+				print("After comparing %s to %s: %d matches" % (filename, reference, len(self._candidates)))
+
+	def _print_matches(self):
+		if self._args.compare is None:
+			print("%d occurrences of pattern(s) found." % (len(self._candidates)))
+		else:
+			print("%d candidate(s) remaining." % (len(self._candidates)))
+		if (self._args.max_matches is not None) and (len(self._candidates) > self._args.max_matches):
+			return
+		if self._args.compare is None:
+			for (oid, offset) in enumerate(self._candidates, 1):
+				print("Match %-4d: 0x%x (%d)" % (oid, offset, offset))
+		else:
+			with self._map_file(self._snapshots[-1]) as data:
+				for (oid, offset) in enumerate(self._candidates, 1):
+					value = int.from_bytes(data[offset : offset + self._args.width], byteorder = self._args.endian, signed = self._args.signed)
+					print("Match %-4d: 0x%x (%d) = %d" % (oid, offset, offset, value))
+
+	def run(self):
+		self._load_state()
+		if self._args.compare is None:
+			self._search_patterns()
+		else:
+			self._search_differential()
+		self._save_state()
+		self._print_matches()
 
+cmd = SimFind.from_commandline()
+cmd.run()
@@ -0,0 +1,76 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import sys
+import io
+import json
+from retools.FriendlyArgumentParser import FriendlyArgumentParser
+from retools.StringExtractor import StringExtractor
+from retools.FileTools import FileTools
+
+class StrExtract():
+	def __init__(self, args):
+		self._args = args
+		self._extractor = StringExtractor(min_length = self._args.min_length, encodings = self._args.encoding)
+
+	@classmethod
+	def from_commandline(cls):
+		parser = FriendlyArgumentParser(description = "Extract printable strings in ASCII, UTF-8, UTF-16LE and UTF-16BE encoding from files, along with their offsets.")
+		parser.add_argument("-n", "--min-length", metavar = "chars", type = int, default = 4, help = "Minimum number of characters a string needs to have in order to be reported. Defaults to %(default)d.")
+		parser.add_argument("-e", "--encoding", choices = StringExtractor._ENCODINGS, action = "append", help = "Encoding of strings to search for. Can be specified multiple times. By default, searches for %s. UTF-8 needs to be explicitly requested because it is slow to search in binary data." % (", ".join(StringExtractor._DEFAULT_ENCODINGS)))
+		parser.add_argument("-f", "--format", choices = [ "text", "json" ], default = "text", help = "Output format. 'text' prints one line per string, 'json' prints one JSON object per line. Defaults to %(default)s.")
+		parser.add_argument("-r", "--recurse", action = "store_true", help = "Recurse into subdirectories.")
+		parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
+		parser.add_argument("filename", metavar = "filename", nargs = "+", type = str, help = "File(s) that strings should be extracted from")
+		args = parser.parse_args(sys.argv[1:])
+		if args.min_length < 1:
+			parser.error("Minimum string length must be at least one character.")
+		return cls(args = args)
+
+	def _print_string(self, filename, string):
+		if self._args.format == "json":
+			print(json.dumps({
+				"filename":	filename,
+				"offset":	string.offset,
+				"length":	string.length,
+				"encoding":	string.encoding,
+				"text":		string.text,
+			}))
+		else:
+			# Escape control characters so that every string is on one line
+			text = string.text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+			print("%s %x %s %s" % (filename, string.offset, string.encoding, text))
+
+	def _enumerate_files(self):
+		return FileTools.enumerate_files(self._args.filename, recurse = self._args.recurse, error_callback = lambda filename, e: print("%s: %s" % (filename, str(e)), file = sys.stderr))
+
+	def run(self):
+		for filename in self._enumerate_files():
+			if self._args.verbose >= 1:
+				print("Extracting: %s" % (filename), file = sys.stderr)
+			try:
+				for string in self._extractor.extract_file(filename):
+					self._print_string(filename, string)
+			except (PermissionError, io.UnsupportedOperation) as e:
+				print("%s: %s" % (filename, str(e)), file = sys.stderr)
+
+cmd = StrExtract.from_commandline()
+cmd.run()
@@ -20,17 +20,15 @@
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
 import sys
-import gzip
 import os
-import subprocess
 import contextlib
-import tempfile
-import struct
 import collections
+import concurrent.futures
 from retools.FriendlyArgumentParser import FriendlyArgumentParser
-from retools.WorkDir import WorkDir
 from retools.unpack import Classifier
+from retools.unpack.ClassifierScanner import ClassifierScanner
 from retools.FileTools import FileTools
+from retools.ContentDigest import ContentDigest
 from retools.Intervals import Interval, Intervals, IntervalConstraintException
 
 parser = FriendlyArgumentParser()
@@ -39,98 +37,154 @@ group = parser.add_mutually_exclusive_group()
 group.add_argument("-n", "--noextract", action = "store_true", help = "Do not extract contents if they contain inner data (e.g., if a ZIP file is found, this option will cause its contents not to be unzipped).")
 group.add_argument("-r", "--recurse", action = "store_true", help = "Recursively try to extract data.")
 parser.add_argument("--recurse-multifiles", action = "store_true", help = "Also recursively try to extract contents of a multi-file. For example, if a ZIP file is found that contains 100 files in it, recurse through all those 100 files as well.")
+parser.add_argument("--deduplicate", action = "store_true", help = "When recursing through the contents of a multi-file, only unpack the first of several files with identical content.")
 parser.add_argument("-d", "--destination", metavar = "path", type = str, default = "unpacked", help = "Gives the output path. Defaults to %(default)s.")
 parser.add_argument("-l", "--archive-limit", metavar = "bytes", type = int, help = "When trying to extract inner archives, limit the size of the archives to this value. Can be useful when working with large archives.")
+parser.add_argument("--raw-streams", action = "store_true", help = "Also search for raw deflate and LZMA-alone streams that have no magic number by trying to decompress at every offset. This is slow.")
+parser.add_argument("--raw-alignment", metavar = "bytes", type = int, default = 1, help = "Only search for raw streams at offsets that are a multiple of this power of two. Defaults to %(default)d.")
+parser.add_argument("--raw-min-length", metavar = "bytes", type = int, default = 4096, help = "Minimum decompressed length of a raw stream for it to be considered. Shorter streams are mostly noise. Defaults to %(default)d.")
+parser.add_argument("--max-depth", metavar = "levels", type = int, help = "When recursing, descend at most this many levels into extracted contents. Unlimited by default.")
+parser.add_argument("-j", "--jobs", metavar = "count", type = int, help = "Number of extractions and of raw stream search processes to run in parallel. Defaults to the number of CPUs.")
 parser.add_argument("-v", "--verbose", action = "count", default = 0, help = "Be more verbose. Can be specified multiple times.")
 parser.add_argument("filename", metavar = "filename", type = str, help = "File that should be attempted to unpack")
 args = parser.parse_args(sys.argv[1:])
+if (args.raw_alignment < 1) or ((args.raw_alignment & (args.raw_alignment - 1)) != 0):
+	parser.error("Raw stream alignment must be a power of two.")
 
 class FileUnpacker():
+	_Extraction = collections.namedtuple("Extraction", [ "filename", "classifier", "start_offset", "file_length", "destination", "recurse_destination" ])
+
 	def __init__(self, args):
 		self._args = args
-		self._active_classifiers = [ classifier_class(args = self._args) for classifier_class in Classifier.get_all() ]
-		self._overlap_bytes = 64 * 1024
-		self._chunksize_bytes = 1024 * 1024
+		self._active_classifiers = [ classifier_class(args = self._args) for classifier_class in Classifier.get_all(opt_in = self._args.raw_streams) ]
+		self._scanner = ClassifierScanner(self._active_classifiers, chunk_size = 1024 * 1024, overlap = 64 * 1024)
+		self._content_digest = ContentDigest() if self._args.deduplicate else None
+		self._unpacked_digests = { }
+		self._jobs = self._args.jobs or os.cpu_count()
 
-	def unpack_all(self, filename, destination):
+	def _is_duplicate(self, filename):
+		if self._content_digest is None:
+			return False
+		digest = self._content_digest.digest(filename)
+		if digest in self._unpacked_digests:
+			if self._args.verbose >= 1:
+				print("%s: identical to %s, not unpacking again" % (filename, self._unpacked_digests[digest]))
+			return True
+		self._unpacked_digests[digest] = filename
+		return False
+
+	def _files_to_unpack(self, filename, destination):
+		"""Yields (filename, destination) tuples of the extraction result, which
+		is either a single file or a directory of files. Directories are walked
+		in sorted order so that deduplication is deterministic."""
 		if os.path.isfile(filename):
-			return self.unpack(filename, destination)
-		else:
-			if not self._args.recurse_multifiles:
-				return
+			yield (filename, destination)
+		elif self._args.recurse_multifiles:
 			for (basedir, subdirs, files) in os.walk(filename):
-				for filename in files:
+				subdirs.sort()
+				for filename in sorted(files):
 					full_filename = basedir + "/" + filename
-					destination = full_filename + "_content"
-					self.unpack(full_filename, destination)
+					if self._is_duplicate(full_filename):
+						continue
+					yield (full_filename, full_filename + "_content")
+
+	@staticmethod
+	def _extract(extraction):
+		# Runs in a worker thread; the heavy lifting happens either in external
+		# tools or in decompressors that release the GIL
+		with open(extraction.filename, "rb") as f:
+			f.seek(extraction.start_offset)
+			return extraction.classifier.extract(f, extraction.start_offset, extraction.file_length, extraction.destination)
+
+	def unpack_all(self, filename, destination):
+		"""Unpacks the file and recurses into the extracted contents breadth
+		first. Files are scanned one after the other, while all extractions
+		they yield run concurrently. The next level is started once all
+		extractions of the current one have finished, in the order in which
+		they were found, so the output is the same regardless of the number
+		of jobs."""
+		level = [ (filename, destination) ]
+		depth = 0
+		with concurrent.futures.ThreadPoolExecutor(max_workers = self._jobs) as executor:
+			while len(level) > 0:
+				extractions = [ ]
+				for (level_filename, level_destination) in level:
+					for extraction in self.unpack(level_filename, level_destination):
+						extractions.append((extraction, executor.submit(self._extract, extraction)))
+
+				depth += 1
+				recurse = self._args.recurse and ((self._args.max_depth is None) or (depth <= self._args.max_depth))
+				level = [ ]
+				for (extraction, future) in extractions:
+					if future.result() and recurse:
+						print("Recursing %s into: %s" % (extraction.destination, extraction.recurse_destination))
+						level += self._files_to_unpack(extraction.destination, extraction.recurse_destination)
+
+	def close(self):
+		for classifier in self._active_classifiers:
+			classifier.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
 
 	def unpack(self, filename, destination):
+		"""Scans the file, carves what is found and yields all payloads that
+		are to be extracted."""
 		found_blobs = Intervals(allow_overlapping = False, allow_identical = False)
 		with open(filename, "rb") as f:
-			for classifier in self._active_classifiers:
-				f.seek(0)
-				if self._args.verbose >= 1:
+			# The file is read only once for all classifiers; candidates are
+			# then investigated classifier by classifier in order of priority
+			# so that a container claims its range before its contents do.
+			current_classifier = None
+			for (abs_offset, classifier) in self._scanner.prioritized_candidates(f):
+				if (classifier is not current_classifier) and (self._args.verbose >= 1):
 					print("Checking for content of type %s" % (classifier.name))
+				current_classifier = classifier
+
+				# For each quick match, determine if it's a real match or a
+				# false positive
+				match = self._scanner.investigate(classifier, f, abs_offset)
+
+				if match is None:
+					continue
+
+				(start_offset, file_length) = match
+				if file_length is not None:
+					found_blob = Interval.begin_length(start_offset, file_length)
+					try:
+						found_blobs.add(found_blob)
+					except IntervalConstraintException:
+						print("%s: %s found at %#x length %d bytes, but discarded because contained/overlapping with different blob." % (filename, classifier.name, start_offset, file_length))
+						continue
+
+				if self._args.verbose >= 1:
+					if file_length is not None:
+						print("%s: %s found at %#x length %d bytes" % (filename, classifier.name, start_offset, file_length))
+					else:
+						print("%s: %s found at %#x with indeterminate length" % (filename, classifier.name, start_offset))
+
+				# If it's not extactible, then we carve by default
+				if self._args.carve or (not classifier.contains_payload) and (file_length is not None):
+					carve_destination = "%s/carved_%#010x.%s" % (destination, start_offset, classifier.name)
+					print("Carving: %s [ %#x len %#x] -> %s" % (filename, start_offset, file_length, carve_destination))
+					with contextlib.suppress(FileExistsError):
+						os.makedirs(destination)
+					f.seek(start_offset)
+					with open(carve_destination, "wb") as dest_file:
+						FileTools.carve(f, dest_file, file_length)
+
+				# If it's extractable and extraction is wanted, extract.
+				if (not self._args.noextract) and classifier.contains_payload:
+					extract_destination = "%s/payload_%#010x.%s" % (destination, start_offset, classifier.name)
+					if file_length is not None:
+						print("Extracting: %s [ %#x len %#x] -> %s" % (filename, start_offset, file_length, extract_destination))
+					else:
+						print("Extracting: %s [ %#x len N/A] -> %s" % (filename, start_offset, extract_destination))
+					recurse_destination = "%s/content_%#010x.%s" % (destination, start_offset, classifier.name)
+					yield self._Extraction(filename = filename, classifier = classifier, start_offset = start_offset, file_length = file_length, destination = extract_destination, recurse_destination = recurse_destination)
 
-				while True:
-					base_offset = f.tell()
-					chunk = f.read(self._chunksize_bytes)
-					if len(chunk) == 0:
-						break
-
-					# First run through the file and find all quick matches
-					for offset in classifier.scan(chunk):
-						# For each quick match, determine if it's a real match
-						# or a false positive
-						abs_offset = base_offset + offset
-						f.seek(abs_offset)
-						match = classifier.investigate(f, abs_offset)
-
-						if match is None:
-							continue
-
-						(start_offset, file_length) = match
-						if file_length is not None:
-							found_blob = Interval.begin_length(start_offset, file_length)
-							try:
-								found_blobs.add(found_blob)
-							except IntervalConstraintException:
-								print("%s: %s found at %#x length %d bytes, but discarded because contained/overlapping with different blob." % (filename, classifier.name, start_offset, file_length))
-								continue
-
-						if self._args.verbose >= 1:
-							if file_length is not None:
-								print("%s: %s found at %#x length %d bytes" % (filename, classifier.name, start_offset, file_length))
-							else:
-								print("%s: %s found at %#x with indeterminate length" % (filename, classifier.name, start_offset))
-
-						# If it's not extactible, then we carve by default
-						if self._args.carve or (not classifier.contains_payload) and (file_length is not None):
-							carve_destination = "%s/carved_%#010x.%s" % (destination, start_offset, classifier.name)
-							print("Carving: %s [ %#x len %#x] -> %s" % (filename, start_offset, file_length, carve_destination))
-							with contextlib.suppress(FileExistsError):
-								os.makedirs(destination)
-							f.seek(start_offset)
-							with open(carve_destination, "wb") as dest_file:
-								FileTools.carve(f, dest_file, file_length)
-
-						# If it's extractable and extraction is wanted, extract.
-						if (not self._args.noextract) and classifier.contains_payload:
-							extract_destination = "%s/payload_%#010x.%s" % (destination, start_offset, classifier.name)
-							if file_length is not None:
-								print("Extracting: %s [ %#x len %#x] -> %s" % (filename, start_offset, file_length, extract_destination))
-							else:
-								print("Extracting: %s [ %#x len N/A] -> %s" % (filename, start_offset, extract_destination))
-							f.seek(start_offset)
-							extraction_success = classifier.extract(f, start_offset, file_length, extract_destination)
-							if extraction_success and self._args.recurse:
-								recurse_into = extract_destination
-								recurse_destination = "%s/content_%#010x.%s" % (destination, start_offset, classifier.name)
-								self.unpack_all(recurse_into, recurse_destination)
-								print("Recursing %s into: %s" % (recurse_into, recurse_destination))
-
-					new_offset = base_offset + self._chunksize_bytes - self._overlap_bytes
-					f.seek(new_offset)
-
-fup = FileUnpacker(args)
-fup.unpack(args.filename, args.destination)
+with FileUnpacker(args) as fup:
+	fup.unpack_all(args.filename, args.destination)
@@ -0,0 +1,129 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2019 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import io
+import os
+import sys
+import json
+import gzip
+import tarfile
+import zipfile
+import tempfile
+import subprocess
+import unittest
+
+class AppTests(unittest.TestCase):
+	def _run_app(self, name, *arguments):
+		return subprocess.run([ sys.executable, "-m", "retools.app." + name ] + list(arguments), stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+
+	@staticmethod
+	def _read_tree(dirname):
+		tree = { }
+		for (path, dirnames, filenames) in os.walk(dirname):
+			for filename in filenames:
+				full_filename = path + "/" + filename
+				with open(full_filename, "rb") as f:
+					tree[os.path.relpath(full_filename, dirname)] = f.read()
+		return tree
+
+	def test_help(self):
+		for name in [ "chardist", "hexfw2bin", "magicscan", "search", "simfind", "strextract", "unpack" ]:
+			result = self._run_app(name, "--help")
+			self.assertEqual(result.returncode, 0, msg = "%s: %s" % (name, result.stderr.decode()))
+			self.assertIn(b"usage:", result.stdout)
+
+	def test_search_usage_errors(self):
+		result = self._run_app("search", "--help")
+		self.assertIn(b"float64:2.5~1%", result.stdout)
+		for arguments in [ [ ], [ "-m", "-1", "str:foo", "/dev/null" ], [ "-i", "/nonexistent/index.sqlite3", "str:foo", "/dev/null" ] ]:
+			result = self._run_app("search", *arguments)
+			self.assertEqual(result.returncode, 1)
+			self.assertIn(b"Error:", result.stderr)
+			self.assertIn(b"usage:", result.stderr)
+			self.assertNotIn(b"Traceback", result.stderr)
+
+		result = self._run_app("search", "index", "--help")
+		self.assertEqual(result.returncode, 0)
+
+	def test_unpack_usage_errors(self):
+		for alignment in [ "0", "3", "24" ]:
+			result = self._run_app("unpack", "--raw-streams", "--raw-alignment", alignment, "/dev/null")
+			self.assertEqual(result.returncode, 1)
+			self.assertIn(b"power of two", result.stderr)
+
+	def test_enumerate_arguments(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			os.makedirs(tmpdir + "/dir/sub")
+			for (name, data) in [ ("dir/a", b"aaaa"), ("dir/sub/b", b"bb"), ("file", b"c") ]:
+				with open(tmpdir + "/" + name, "wb") as f:
+					f.write(data)
+			os.symlink(tmpdir + "/file", tmpdir + "/link")
+
+			# Directories are recursed into, given symbolic links are followed
+			# and names that do not exist are reported
+			result = self._run_app("chardist", "-f", "json", tmpdir + "/dir", tmpdir + "/link", tmpdir + "/nonexistent")
+			self.assertEqual(result.returncode, 0, msg = result.stderr.decode())
+			self.assertEqual(json.loads(result.stdout)["length"], 7)
+			self.assertIn(b"nonexistent", result.stderr)
+
+			result = self._run_app("search", "index", "-v", "-i", tmpdir + "/index.sqlite3", "build", tmpdir + "/dir", tmpdir + "/link", tmpdir + "/nonexistent")
+			self.assertEqual(result.returncode, 0, msg = result.stderr.decode())
+			self.assertEqual(result.stdout.decode().splitlines(), [ "Indexed: %s" % (tmpdir + name) for name in [ "/dir/a", "/dir/sub/b", "/link" ] ])
+			self.assertIn(b"nonexistent", result.stderr)
+
+	def test_simfind_lists_matches(self):
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(b"\xaa\xbb" * 1500)
+			f.flush()
+			result = self._run_app("simfind", f.name, "aabb")
+			self.assertEqual(result.returncode, 0)
+			self.assertIn(b"1500 occurrences", result.stdout)
+			self.assertEqual(result.stdout.count(b"Match "), 1500)
+
+			result = self._run_app("simfind", "-n", "1000", f.name, "aabb")
+			self.assertEqual(result.stdout.count(b"Match "), 0)
+
+	def test_unpack_jobs(self):
+		inner = gzip.compress(b"inner text\n" * 100, mtime = 0)
+		zip_data = io.BytesIO()
+		with zipfile.ZipFile(zip_data, "w") as f:
+			f.writestr("a.txt", "hello zip\n" * 50)
+			f.writestr("b.bin", inner)
+		tar_data = io.BytesIO()
+		with tarfile.open(fileobj = tar_data, mode = "w") as f:
+			for (name, data) in [ ("x.txt", b"x" * 5000), ("nested.gz", inner), ("archive.zip", zip_data.getvalue()) ]:
+				info = tarfile.TarInfo(name)
+				info.size = len(data)
+				f.addfile(info, io.BytesIO(data))
+
+		with tempfile.TemporaryDirectory() as tmpdir:
+			with open(tmpdir + "/bundle.bin", "wb") as f:
+				f.write(bytes(1000) + gzip.compress(tar_data.getvalue(), mtime = 0) + bytes(500) + zip_data.getvalue() + bytes(100))
+			trees = [ ]
+			for jobs in [ 1, 4 ]:
+				result = self._run_app("unpack", "-r", "--recurse-multifiles", "-j%d" % (jobs), "-d", "%s/out%d" % (tmpdir, jobs), tmpdir + "/bundle.bin")
+				self.assertEqual(result.returncode, 0, msg = result.stderr.decode())
+				trees.append(self._read_tree("%s/out%d" % (tmpdir, jobs)))
+			nested = [ filename for filename in trees[0] if filename.endswith(".zip/b.bin_content/payload_0x00000000.gzip") ]
+			self.assertEqual(len(nested), 2)
+			self.assertEqual(trees[0][nested[0]], b"inner text\n" * 100)
+			self.assertEqual(sorted(trees[0]), sorted(trees[1]))
+			self.assertEqual(trees[0], trees[1])
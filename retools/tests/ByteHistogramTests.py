@@ -0,0 +1,135 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import random
+import unittest
+import tempfile
+import collections
+from retools.ByteHistogram import ByteHistogram
+from retools.ParallelByteHistogram import ParallelByteHistogram
+
+class ByteHistogramTests(unittest.TestCase):
+	def test_count(self):
+		prng = random.Random(1)
+		for data in [ bytes(), bytes(100), b"\xff" * 33, b"abcabcx", bytes(range(256)) * 3, bytes(prng.randrange(256) for _ in range(10000)), bytes(prng.choice(b"\x00\x0f\x10\xf0\xff") for _ in range(1000)), bytes(prng.choice(b"\x00\x0f\x10\xf0\xff") for _ in range(50000)), bytes(prng.randrange(256) for _ in range(50000)) ]:
+			counter = collections.Counter(data)
+			self.assertEqual(ByteHistogram.count(data), [ counter[value] for value in range(256) ])
+
+	def test_statistics(self):
+		self.assertEqual(ByteHistogram.of(bytes()).entropy, 0)
+		self.assertEqual(ByteHistogram.of(bytes(1000)).entropy, 0)
+		self.assertAlmostEqual(ByteHistogram.of(b"ab" * 100).entropy, 1)
+		self.assertAlmostEqual(ByteHistogram.of(bytes(range(256)) * 4).entropy, 8)
+		self.assertAlmostEqual(ByteHistogram.of(bytes(range(256)) * 4).chi_square, 0)
+		self.assertAlmostEqual(ByteHistogram.of(bytes(256)).chi_square, 255 * 256)
+		self.assertGreater(ByteHistogram.of(os.urandom(65536)).entropy, 7.99)
+
+	def test_add_remove(self):
+		histogram = ByteHistogram()
+		histogram.add(b"aab")
+		histogram.add(b"bc")
+		self.assertEqual(histogram.length, 5)
+		self.assertEqual(list(histogram.counts[ord("a") : ord("d")]), [ 2, 2, 1 ])
+		histogram.remove_counts(ByteHistogram.count(b"aab"))
+		self.assertEqual(histogram.length, 2)
+		self.assertEqual(list(histogram.counts), ByteHistogram.count(b"bc"))
+
+	def test_ngrams(self):
+		prng = random.Random(2)
+		for ngram in [ 1, 2, 3 ]:
+			for length in [ 0, 1, 2, 3, 4, 5, 17, 1000 ]:
+				data = bytes(prng.choice(b"\x00\x01\xfe") for _ in range(length))
+				expected = collections.Counter(int.from_bytes(data[i : i + ngram], byteorder = "little") for i in range(len(data) - ngram + 1))
+				self.assertEqual(ByteHistogram.count_ngrams(data, ngram), expected)
+
+		histogram = ByteHistogram.of(b"abcabcab", ngram = 2)
+		self.assertEqual(histogram.length, 7)
+		self.assertEqual([ (histogram.ngram_bytes(index), count) for (index, count) in histogram.most_common() ], [ (b"ab", 3), (b"bc", 2), (b"ca", 2) ])
+		self.assertAlmostEqual(ByteHistogram.of(bytes(range(256)) * 256, ngram = 2).entropy, 8)
+
+	def test_sparse(self):
+		class SmallSparseHistogram(ByteHistogram):
+			_SPARSE_LIMIT = 100
+
+		prng = random.Random(4)
+		data = bytes(prng.randrange(256) for _ in range(1000))
+		expected = ByteHistogram.count_ngrams(data, 3)
+		sparse = ByteHistogram.of(data, ngram = 3)
+		self.assertTrue(sparse.sparse)
+		dense = SmallSparseHistogram.of(data[: 500], ngram = 3)
+		self.assertFalse(dense.sparse)
+		self.assertEqual(len(dense.counts), 256 ** 3)
+		dense.merge(ByteHistogram.of(data[498 :], ngram = 3))
+		for histogram in [ sparse, dense ]:
+			self.assertEqual(dict(histogram.nonzero()), expected)
+			self.assertEqual(histogram.length, 998)
+		self.assertAlmostEqual(sparse.entropy, dense.entropy)
+		self.assertAlmostEqual(sparse.chi_square, dense.chi_square)
+		self.assertEqual(ByteHistogram.of(bytes(range(10)) * 10, ngram = 3).most_common(1), [ (0x020100, 10) ])
+
+	def test_count_file(self):
+		prng = random.Random(3)
+		data = bytes(prng.choice(b"abc") for _ in range(1000))
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(data)
+			f.flush()
+			for ngram in [ 1, 2, 3 ]:
+				expected = ByteHistogram.count_ngrams(data, ngram)
+				histogram = ByteHistogram(ngram = ngram)
+				histogram.add_file(f.name)
+				self.assertEqual(dict(histogram.nonzero()), expected)
+				histogram = ByteHistogram(ngram = ngram)
+				for (begin_offset, end_offset) in [ (0, 1), (1, 300), (300, 301), (301, None) ]:
+					histogram.add_file(f.name, begin_offset = begin_offset, end_offset = end_offset)
+				self.assertEqual(dict(histogram.nonzero()), expected)
+
+	def test_parallel(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			contents = [ b"foobar" * 100, bytes(range(256)) * 10, b"" ]
+			for (index, data) in enumerate(contents):
+				with open("%s/%d" % (tmpdir, index), "wb") as f:
+					f.write(data)
+			filenames = [ "%s/%d" % (tmpdir, index) for index in range(len(contents)) ] + [ tmpdir + "/missing" ]
+			for ngram in [ 1, 3 ]:
+				errors = [ ]
+				histogram = ParallelByteHistogram(ngram = ngram, jobs = 2, split_size = 100).histogram(filenames, errors = errors)
+				expected = ByteHistogram(ngram = ngram)
+				for data in contents:
+					expected.add(data)
+				self.assertEqual(histogram.counts, expected.counts)
+				self.assertEqual(histogram.length, expected.length)
+				self.assertEqual([ filename for (filename, error) in errors ], [ tmpdir + "/missing" ])
+
+	def test_parallel_errors(self):
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(b"foobar" * 100)
+			f.flush()
+			errors = [ ]
+			histogram = ParallelByteHistogram(jobs = 2, split_size = 100).histogram([ f.name, "invalid\x00name" ], errors = errors)
+			self.assertEqual(histogram.length, 600)
+			self.assertEqual(len(errors), 1)
+			self.assertIsInstance(errors[0][1], ValueError)
+
+			# Failures in the worker only affect the job they occurred in
+			results = list(ParallelByteHistogram(ngram = 4, jobs = 2, split_size = 100).count([ f.name ]))
+			self.assertEqual(len(results), 6)
+			self.assertTrue(all((result.histogram is None) and isinstance(result.error, Exception) for result in results))
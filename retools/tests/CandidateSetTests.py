@@ -0,0 +1,122 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import random
+import struct
+import unittest
+import tempfile
+from retools.CandidateSet import CandidateSet
+from retools.RangePattern import RangePattern
+
+class SmallWindowCandidateSet(CandidateSet):
+	_WINDOW_SIZE = 64
+
+class CandidateSetTests(unittest.TestCase):
+	@staticmethod
+	def _occurrences(data, pattern, offsets = None):
+		if offsets is None:
+			offsets = range(len(data))
+		return [ offset for offset in offsets if data[offset : offset + len(pattern)] == pattern ]
+
+	def test_sparse(self):
+		data = bytes(1000) + b"foo" + bytes(1000) + b"foo" + bytes(10) + b"fo"
+		candidates = CandidateSet.from_pattern(data, b"foo")
+		self.assertFalse(candidates.dense)
+		self.assertEqual(list(candidates), [ 1000, 2003 ])
+		self.assertEqual(list(candidates.filter_pattern(data, b"fo")), [ 1000, 2003 ])
+		self.assertEqual(list(candidates.filter_pattern(bytes(2003) + b"o", b"o")), [ 2003 ])
+		self.assertEqual(list(candidates.filter_pattern(data[:1002], b"foo")), [ ])
+
+	def test_dense(self):
+		data = b"ab" * 500
+		candidates = SmallWindowCandidateSet.from_pattern(data, b"ab")
+		self.assertTrue(candidates.dense)
+		self.assertEqual(len(candidates), 500)
+		self.assertEqual(list(candidates), list(range(0, 1000, 2)))
+
+		# Filtering converts to a sparse set once that is smaller
+		other = bytearray(1000)
+		other[100 : 104] = b"abab"
+		candidates = candidates.filter_pattern(bytes(other), b"ab")
+		self.assertFalse(candidates.dense)
+		self.assertEqual(list(candidates), [ 100, 102 ])
+
+	def test_random(self):
+		prng = random.Random(1)
+		for size in [ 0, 1, 7, 63, 64, 65, 500 ]:
+			data1 = bytes(prng.choice(b"ab") for _ in range(size))
+			data2 = bytes(prng.choice(b"ab") for _ in range(size + prng.randint(-3, 3)))
+			for (pattern1, pattern2) in [ (b"a", b"b"), (b"ab", b"a"), (b"aba", b"bb") ]:
+				candidates = SmallWindowCandidateSet.from_pattern(data1, pattern1)
+				expected = self._occurrences(data1, pattern1)
+				self.assertEqual(list(candidates), expected)
+				self.assertEqual(len(candidates), len(expected))
+
+				candidates = candidates.filter_pattern(data2, pattern2)
+				expected = self._occurrences(data2, pattern2, expected)
+				self.assertEqual(list(candidates), expected)
+				self.assertEqual(len(candidates), len(expected))
+
+	def test_all(self):
+		for alignment in [ 1, 2, 3, 4, 5, 6, 7, 8, 12, 24, 63, 64, 100 ]:
+			for size in [ 0, 1, 7, 8, 9, 100, 1001 ]:
+				candidates = CandidateSet.all(size, alignment = alignment)
+				self.assertEqual(list(candidates), list(range(0, size, alignment)))
+				self.assertEqual(len(candidates), len(range(0, size, alignment)))
+		self.assertTrue(CandidateSet.all(1000, alignment = 3).dense)
+		self.assertFalse(CandidateSet.all(1000, alignment = 100).dense)
+		with self.assertRaises(ValueError):
+			CandidateSet.all(1000, alignment = 0)
+
+	def test_pattern_object(self):
+		data = bytes([ 0, 10, 0, 20, 0, 30, 0, 40, 0 ])
+		pattern = RangePattern(15, 35, length = 2, byteorder = "big", alignment = 2)
+		candidates = CandidateSet.from_pattern(data, pattern)
+		self.assertEqual(list(candidates), [ 2, 4 ])
+		self.assertEqual(list(candidates.filter_pattern(bytes([ 0, 0, 0, 99, 0, 25 ]), pattern)), [ 4 ])
+
+	def test_differential(self):
+		snapshots = [ bytearray(256) for _ in range(3) ]
+		for (index, snapshot) in enumerate(snapshots):
+			snapshot[16 : 20] = struct.pack("<L", (0xffffffff + index) & 0xffffffff)
+			snapshot[32 : 34] = struct.pack(">H", 1000 - (2 * index))
+			snapshot[64] = index % 2
+		snapshots = [ bytes(snapshot) for snapshot in snapshots ]
+
+		candidates = SmallWindowCandidateSet.all(len(snapshots[0]))
+		self.assertEqual(len(candidates.filter_unchanged(snapshots[0], snapshots[1], 4)), 253 - 7 - 4 - 4)
+		self.assertEqual(list(candidates.filter_increased(snapshots[0], snapshots[1], 4, amount = 1)), [ 16, 64 ])
+		self.assertEqual(list(candidates.filter_increased(snapshots[0], snapshots[1], 4, amount = 1, byteorder = "big")), [ 16, 61 ])
+		self.assertEqual(list(candidates.filter_increased(snapshots[0], snapshots[1], 1, signed = True)), [ 16, 17, 18, 19, 64 ])
+		self.assertEqual(list(candidates.filter_decreased(snapshots[0], snapshots[1], 2, byteorder = "big", amount = 2)), [ 32 ])
+
+		candidates = candidates.filter_changed(snapshots[0], snapshots[1], 4)
+		self.assertEqual(list(candidates.filter_changed(snapshots[1], snapshots[2], 1)), [ 16, 33, 64 ])
+
+	def test_save_load(self):
+		with tempfile.TemporaryDirectory() as tmpdir:
+			for candidates in [ CandidateSet.all(1000, alignment = 4), CandidateSet.from_offsets(1000000, [ 3, 99, 100, 999999 ]) ]:
+				candidates.save(tmpdir + "/candidates", metadata = { "foo": [ "bar" ] })
+				(loaded, metadata) = CandidateSet.load(tmpdir + "/candidates")
+				self.assertEqual(loaded.dense, candidates.dense)
+				self.assertEqual(len(loaded), len(candidates))
+				self.assertEqual(list(loaded), list(candidates))
+				self.assertEqual(metadata, { "foo": [ "bar" ] })
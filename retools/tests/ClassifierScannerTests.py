@@ -0,0 +1,67 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import io
+import unittest
+from retools.unpack.ClassifierScanner import ClassifierScanner
+
+class _MagicClassifier():
+	def __init__(self, magic):
+		self._magic = magic
+
+	def scan(self, chunk):
+		offset = chunk.find(self._magic)
+		while offset != -1:
+			yield offset
+			offset = chunk.find(self._magic, offset + 1)
+
+class ClassifierScannerTests(unittest.TestCase):
+	def setUp(self):
+		self._foo = _MagicClassifier(b"foo")
+		self._bar = _MagicClassifier(b"bar")
+		self._data = b"bar....foo..foo" + (b"." * 20) + b"bar.foo" + (b"." * 13) + b"foobar"
+
+	def _expect(self, magic):
+		offset = self._data.find(magic)
+		while offset != -1:
+			yield offset
+			offset = self._data.find(magic, offset + 1)
+
+	def test_candidates(self):
+		scanner = ClassifierScanner([ self._foo, self._bar ], chunk_size = 16, overlap = 4)
+		candidates = list(scanner.candidates(io.BytesIO(self._data)))
+		expect = sorted([ (offset, 0) for offset in self._expect(b"foo") ] + [ (offset, 1) for offset in self._expect(b"bar") ])
+		self.assertEqual([ (offset, [ self._foo, self._bar ].index(classifier)) for (offset, classifier) in candidates ], expect)
+
+	def test_prioritized_candidates(self):
+		scanner = ClassifierScanner([ self._bar, self._foo ], chunk_size = 16, overlap = 4)
+		candidates = list(scanner.prioritized_candidates(io.BytesIO(self._data)))
+		expect = [ (offset, self._bar) for offset in self._expect(b"bar") ] + [ (offset, self._foo) for offset in self._expect(b"foo") ]
+		self.assertEqual(candidates, expect)
+
+	def test_prioritized_candidates_seek(self):
+		f = io.BytesIO(self._data)
+		scanner = ClassifierScanner([ self._foo, self._bar ], chunk_size = 16, overlap = 4)
+		candidates = [ ]
+		for (offset, classifier) in scanner.prioritized_candidates(f):
+			f.seek(offset)
+			candidates.append(f.read(3))
+		self.assertEqual(candidates, [ b"foo" ] * 4 + [ b"bar" ] * 3)
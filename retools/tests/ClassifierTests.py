@@ -0,0 +1,104 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import io
+import gzip
+import zlib
+import bz2
+import lzma
+import tempfile
+import random
+import argparse
+import unittest
+from retools.unpack import Classifier
+
+class ClassifierTests(unittest.TestCase):
+	def setUp(self):
+		self._args = argparse.Namespace(archive_limit = None, verbose = 0)
+		self._random = random.Random(0)
+		self._tempdir = tempfile.TemporaryDirectory(prefix = "retools_test_")
+
+	def tearDown(self):
+		self._tempdir.cleanup()
+
+	def _classifier(self, name):
+		return Classifier._KNOWN_CLASSIFIERS[name](args = self._args)
+
+	def _random_bytes(self, length):
+		return bytes(self._random.getrandbits(8) for i in range(length))
+
+	def _investigate_all(self, classifier, data):
+		f = io.BytesIO(data)
+		results = [ ]
+		for offset in classifier.scan(data):
+			f.seek(offset)
+			result = classifier.investigate(f, offset)
+			if result is not None:
+				results.append(result)
+		return results
+
+	def test_opt_in(self):
+		default = Classifier.get_all()
+		everything = Classifier.get_all(opt_in = True)
+		self.assertNotIn(Classifier._KNOWN_CLASSIFIERS["deflate"], default)
+		self.assertIn(Classifier._KNOWN_CLASSIFIERS["deflate"], everything)
+		self.assertEqual([ classifier_class for classifier_class in everything if not classifier_class._OPT_IN ], default)
+
+	def test_gzip_investigate(self):
+		classifier = self._classifier("gzip")
+		small = gzip.compress(b"foobar" * 100)
+		large = gzip.compress(self._random_bytes(50000) + bytes(200000))
+		data = self._random_bytes(1000) + small + self._random_bytes(3000) + large + b"\x1f\x8b\x08\x00" + self._random_bytes(1000)
+		self.assertEqual(self._investigate_all(classifier, data), [ (1000, len(small)), (1000 + len(small) + 3000, len(large)) ])
+
+	def test_gzip_truncated(self):
+		classifier = self._classifier("gzip")
+		data = gzip.compress(self._random_bytes(20000))
+		self.assertEqual(self._investigate_all(classifier, data[:-1]), [ ])
+		self.assertEqual(self._investigate_all(classifier, data[:100]), [ ])
+		self._args.archive_limit = 10000
+		self.assertEqual(self._investigate_all(classifier, data), [ (0, None) ])
+
+	def test_zlib_investigate(self):
+		classifier = self._classifier("zlib")
+		data = self._random_bytes(1000)
+		expect = [ ]
+		for (level, wbits) in [ (0, 15), (1, 15), (2, 15), (6, 15), (9, 15) ]:
+			compressor = zlib.compressobj(level = level, wbits = wbits)
+			compressed = compressor.compress((b"foobar" * 1000) + self._random_bytes(100)) + compressor.flush()
+			expect.append((len(data), len(compressed)))
+			data += compressed + self._random_bytes(100)
+		data += b"\x78\x9c" + self._random_bytes(100)
+		self.assertEqual(self._investigate_all(classifier, data), expect)
+
+	def test_stream_extract(self):
+		payload = self._random_bytes(10000) * 30
+		for (name, compress) in [ ("gzip", gzip.compress), ("bz2", bz2.compress), ("xz", lzma.compress), ("zlib", zlib.compress) ]:
+			classifier = self._classifier(name)
+			compressed = compress(payload)
+			f = io.BytesIO(self._random_bytes(100) + compressed + self._random_bytes(100))
+			destination = self._tempdir.name + "/" + name + "/payload"
+			self.assertTrue(classifier.extract(f, 100, None, destination))
+			with open(destination, "rb") as outfile:
+				self.assertEqual(outfile.read(), payload)
+
+			self.assertFalse(classifier.extract(f, 100, len(compressed) - 1, destination))
+			self.assertFalse(classifier.extract(f, 101, None, destination))
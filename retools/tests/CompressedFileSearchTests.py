@@ -0,0 +1,117 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import io
+import os
+import bz2
+import lzma
+import zlib
+import gzip
+import zipfile
+import unittest
+import tempfile
+from retools.StreamDecompressor import StreamDecompressor
+from retools.CompressedFileSearch import CompressedFileSearch
+
+class CompressedFileSearchTests(unittest.TestCase):
+	def test_stream_decompressor(self):
+		data = os.urandom(1000) + bytes(100000)
+		for (stream_format, compressed) in [ ("gzip", gzip.compress(data)), ("zlib", zlib.compress(data)), ("bz2", bz2.compress(data)), ("xz", lzma.compress(data)) ]:
+			sd = StreamDecompressor(io.BytesIO(compressed + b"trailing data"), stream_format, input_chunk_size = 100, output_chunk_size = 1000)
+			chunks = list(sd)
+			self.assertTrue(sd.eof)
+			self.assertEqual(b"".join(chunks), data)
+			self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+			self.assertEqual(sd.consumed_length, len(compressed))
+
+	def test_truncated_stream(self):
+		data = os.urandom(10000)
+		compressed = zlib.compress(data)
+		sd = StreamDecompressor(io.BytesIO(compressed), "zlib", max_input_length = 5000)
+		self.assertTrue(data.startswith(b"".join(sd)))
+		self.assertFalse(sd.eof)
+		self.assertEqual(sd.consumed_length, 5000)
+
+	def test_search_compressed(self):
+		zip_data = io.BytesIO()
+		with zipfile.ZipFile(zip_data, "w", compression = zipfile.ZIP_DEFLATED) as zip_file:
+			zip_file.writestr("etc/passwd", b"root:x:0:0:root:/root:/bin/sh\n")
+			zip_file.writestr("etc/group", b"root:x:0:\n")
+		xz_data = lzma.compress(b"the root of all evil")
+		data = bytes(100) + zip_data.getvalue() + bytes(100) + xz_data + b"root"
+		with tempfile.NamedTemporaryFile(prefix = "retools_test_") as f:
+			f.write(data)
+			f.flush()
+			cfs = CompressedFileSearch(f.name, context_size = 2)
+			matches = [ (match.filename[len(f.name) : ], match.offset, bytes(match.pre), bytes(match.post)) for match in cfs.find_all_multi([ b"root" ]) ]
+		xz_offset = 200 + len(zip_data.getvalue())
+		self.assertEqual(matches, [
+			("@0x64:zip/etc/passwd", 0, b"", b":x"),
+			("@0x64:zip/etc/passwd", 11, b"0:", b":/"),
+			("@0x64:zip/etc/passwd", 17, b":/", b":/"),
+			("@0x64:zip/etc/group", 0, b"", b":x"),
+			("@%#x:xz" % (xz_offset), 4, b"e ", b" o"),
+		])
+
+	def test_search_large_streams(self):
+		# Larger than the trial decompression of the classifiers, so that the
+		# stream length needs to be determined separately
+		payload = os.urandom(20000) + b"foobar"
+		data = bytes(100) + gzip.compress(payload) + bytes(100) + zlib.compress(payload)
+		with tempfile.NamedTemporaryFile(prefix = "retools_test_") as f:
+			f.write(data)
+			f.flush()
+			cfs = CompressedFileSearch(f.name, context_size = 2)
+			matches = [ (match.filename[len(f.name) : ], match.offset) for match in cfs.find_all_multi([ b"foobar" ]) ]
+		zlib_offset = 200 + len(gzip.compress(payload))
+		self.assertEqual(sorted(matches), sorted([ ("@0x64:gzip", 20000), ("@%#x:zlib" % (zlib_offset), 20000) ]))
+
+	def test_search_nested(self):
+		zip_data = io.BytesIO()
+		with zipfile.ZipFile(zip_data, "w", compression = zipfile.ZIP_DEFLATED) as zip_file:
+			zip_file.writestr("etc/passwd", b"root:x:0:0:root:/root:/bin/sh\n")
+			zip_file.writestr("lib/data.xz", lzma.compress(b"inner root"))
+		# Tar archive that is not recognized itself, but its contents are
+		tar_data = bytes(512) + zip_data.getvalue() + bytes(1024)
+		data = bytes(100) + gzip.compress(tar_data)
+		with tempfile.NamedTemporaryFile(prefix = "retools_test_") as f:
+			f.write(data)
+			f.flush()
+			# The xz stream stores the short text uncompressed
+			passwd = [ ("@0x64:gzip@0x200:zip/etc/passwd", offset) for offset in [ 0, 11, 17 ] ] + [ ("@0x64:gzip@0x200:zip/lib/data.xz", lzma.compress(b"inner root").index(b"root")) ]
+			for (max_depth, expected) in [
+				(1, [ ]),
+				(2, passwd),
+				(3, passwd + [ ("@0x64:gzip@0x200:zip/lib/data.xz@0x0:xz", 6) ]),
+			]:
+				cfs = CompressedFileSearch(f.name, max_depth = max_depth)
+				matches = [ (match.filename[len(f.name) : ], match.offset) for match in cfs.find_all_multi([ b"root" ]) ]
+				self.assertEqual(matches, expected)
+
+	def test_truncated_magic(self):
+		data = gzip.compress(b"foobar") + bytes(100)
+		for trailer in [ b"BZh", b"\x1f\x8b", b"\xfd7zXZ\x00", b"PK\x05\x06", b"hsqs", b"\x27\x05\x19\x56" ]:
+			with tempfile.NamedTemporaryFile(prefix = "retools_test_") as f:
+				f.write(data + trailer)
+				f.flush()
+				cfs = CompressedFileSearch(f.name)
+				matches = [ (match.filename[len(f.name) : ], match.offset) for match in cfs.find_all_multi([ b"foobar" ]) ]
+			self.assertEqual(matches, [ ("@0x0:gzip", 0) ])
@@ -21,6 +21,10 @@
 
 import unittest
 from retools.EncodableTypes import EncodableTypes, EncodingException
+from retools.MaskedPattern import MaskedPattern
+from retools.RangePattern import RangePattern
+from retools.FloatPattern import FloatPattern
+from retools.RegexPattern import RegexPattern
 
 class EncodingTests(unittest.TestCase):
 	def _encode_values(self, str_repr, str_type):
@@ -76,3 +80,76 @@ class EncodingTests(unittest.TestCase):
 
 	def test_hex(self):
 		self.assertEqual(self._encode_values("aa bb cc", "hex"), bytes.fromhex("aa bb cc"))
+
+	def test_hex_wildcards(self):
+		pattern = self._encode_values("27 05 ?? 5? ?f", "hex")
+		self.assertEqual(pattern, MaskedPattern(bytes.fromhex("27 05 00 50 0f"), bytes.fromhex("ff ff 00 f0 0f")))
+		self.assertEqual(pattern.hex(), "2705??5??f")
+		self.assertEqual(pattern.fixed_parts(), [ (0, bytes.fromhex("27 05")) ])
+		self.assertTrue(pattern.matches(bytes.fromhex("27 05 99 5a 3f")))
+		self.assertFalse(pattern.matches(bytes.fromhex("27 05 99 6a 3f")))
+		with self.assertRaises(EncodingException):
+			self._encode_values("27 0", "hex")
+		with self.assertRaises(EncodingException):
+			self._encode_values("????", "hex")
+
+	def test_mask(self):
+		pattern = self._encode_values("1234/fff0", "mask")
+		self.assertEqual(pattern, MaskedPattern.parse("123?"))
+		self.assertEqual(self._encode_values("80/80", "mask").hex(), "x?")
+		with self.assertRaises(EncodingException):
+			self._encode_values("1234/ff", "mask")
+
+	def test_int_range(self):
+		(pattern_be, pattern_le) = self._encode_values("0x08000000..0x080fffff", "uint32-?e")
+		self.assertEqual(pattern_be, RangePattern(0x08000000, 0x080fffff, 4, byteorder = "big"))
+		self.assertEqual(pattern_le.hex(), "00000008..ffff0f08")
+		self.assertEqual(pattern_le.fixed_parts(), [ (3, b"\x08") ])
+		self.assertTrue(pattern_le.matches(bytes.fromhex("34 12 0f 08")))
+		self.assertFalse(pattern_le.matches(bytes.fromhex("34 12 10 08")))
+		self.assertFalse(pattern_be.matches(bytes.fromhex("34 12 0f 08")))
+
+		pattern = self._encode_values("-5..5", "sint16-a2")
+		self.assertEqual(pattern, RangePattern(-5, 5, 2, signed = True, alignment = 2))
+		self.assertEqual(pattern.fixed_parts(), [ ])
+		self.assertTrue(all(pattern.matches(value.to_bytes(2, byteorder = "little", signed = True)) for value in range(-5, 6)))
+		self.assertFalse(any(pattern.matches(value.to_bytes(2, byteorder = "little", signed = True)) for value in [ -32768, -6, 6, 32767 ]))
+
+		self.assertEqual(self._encode_values("0x1234", "uint16-be-a2"), RangePattern(0x1234, 0x1234, 2, byteorder = "big", alignment = 2))
+		with self.assertRaises(EncodingException):
+			self._encode_values("5..4", "uint8")
+		with self.assertRaises(EncodingException):
+			self._encode_values("0..256", "uint8")
+		with self.assertRaises(EncodingException):
+			self._encode_values("-129..0", "sint8")
+
+	def test_float(self):
+		self.assertEqual(self._encode_values("12.34", "float32-le"), bytes.fromhex("a4 70 45 41"))
+		self.assertEqual(self._encode_values("12.34", "float64-le"), bytes.fromhex("ae 47 e1 7a 14 ae 28 40"))
+		self.assertEqual(self._encode_values("-2", "float16-be"), bytes.fromhex("c0 00"))
+		self.assertEqual(self._encode_values("0.05", "float"), bytes.fromhex("cd cc 4c 3d"))
+		with self.assertRaises(EncodingException):
+			self._encode_values("1e40", "float32")
+		with self.assertRaises(EncodingException):
+			self._encode_values("1", "float24")
+
+	def test_regex(self):
+		self.assertEqual(self._encode_values("PK\\x03\\x04.{0,30}\\.so", "re-64"), RegexPattern(rb"PK\x03\x04.{0,30}\.so", 64))
+		self.assertEqual(self._encode_values("a:b", "re").max_length, 256)
+		with self.assertRaises(EncodingException):
+			self._encode_values("(", "re")
+		with self.assertRaises(EncodingException):
+			self._encode_values("a*", "re")
+
+	def test_float_tolerance(self):
+		(pattern_be, pattern_le) = self._encode_values("3.14159~1e-4", "float32-?e")
+		self.assertIsInstance(pattern_le, FloatPattern)
+		self.assertTrue(pattern_le.matches(bytes.fromhex("db 0f 49 40")))
+		self.assertTrue(pattern_be.matches(bytes.fromhex("40 49 0f db")))
+		self.assertFalse(pattern_le.matches(bytes.fromhex("40 49 0f db")))
+		self.assertFalse(pattern_le.matches(bytes.fromhex("c3 f5 48 40")))
+		pattern = self._encode_values("100~1%", "float64")
+		self.assertEqual(pattern, FloatPattern(99, 101, 8))
+		self.assertEqual(self._encode_values("-1..1", "float16").hex(), "00bc..003c")
+		with self.assertRaises(EncodingException):
+			self._encode_values("3.14159~0", "float32")
@@ -0,0 +1,261 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import struct
+import re
+import random
+import unittest
+import tempfile
+from retools.FileSearch import FileSearch
+from retools.ParallelFileSearch import ParallelFileSearch
+from retools.PrefetchReader import PrefetchReader
+from retools.MaskedPattern import MaskedPattern
+from retools.RangePattern import RangePattern
+from retools.FloatPattern import FloatPattern
+from retools.RegexPattern import RegexPattern
+
+class SmallChunkFileSearch(FileSearch):
+	_MIN_CHUNK_SIZE = 16
+
+	def __init__(self, filename, context_size = 32, **kwargs):
+		FileSearch.__init__(self, filename, context_size = context_size, use_mmap = False, **kwargs)
+
+class FileSearchTests(unittest.TestCase):
+	def setUp(self):
+		self._tempfile = tempfile.NamedTemporaryFile(prefix = "retools_test_")
+
+	def tearDown(self):
+		self._tempfile.close()
+
+	def _write(self, data):
+		self._tempfile.write(data)
+		self._tempfile.flush()
+
+	def _offsets(self, needles, search_class = FileSearch, context_size = 4, **kwargs):
+		fs = search_class(self._tempfile.name, context_size = context_size, **kwargs)
+		return [ (match.offset, match.needle) for match in fs.find_all_multi(needles) ]
+
+	def _matches(self, needles, search_class = FileSearch, context_size = 4):
+		fs = search_class(self._tempfile.name, context_size = context_size)
+		return [ (match.offset, match.needle, bytes(match.pre), bytes(match.post)) for match in fs.find_all_multi(needles) ]
+
+	def test_single_needle(self):
+		self._write(b"foo bar foo barfoo")
+		fs = FileSearch(self._tempfile.name, context_size = 4)
+		matches = list(fs.find_all(b"foo"))
+		self.assertEqual([ match.offset for match in matches ], [ 0, 8, 15 ])
+		self.assertEqual(matches[0].pre, b"")
+		self.assertEqual(matches[0].post, b" bar")
+		self.assertEqual(matches[1].pre, b"bar ")
+		self.assertEqual(matches[2].post, b"")
+
+	def test_overlapping_matches(self):
+		self._write(b"aaaa")
+		self.assertEqual(self._offsets([ b"aa" ]), [ (0, b"aa"), (1, b"aa"), (2, b"aa") ])
+
+	def test_multiple_needles(self):
+		self._write(b"xxabcdxxbcxx")
+		self.assertEqual(self._offsets([ b"abcd", b"bc", b"x" ]), [
+			(0, b"x"), (1, b"x"),
+			(2, b"abcd"),
+			(3, b"bc"),
+			(6, b"x"), (7, b"x"),
+			(8, b"bc"),
+			(10, b"x"), (11, b"x"),
+		])
+
+	def test_chunk_borders(self):
+		data = bytearray(100)
+		for offset in [ 0, 13, 17, 29, 33, 46, 96 ]:
+			data[offset : offset + 4] = b"ABCD"
+		self._write(data)
+		expected = self._offsets([ b"ABCD", b"D" ])
+		self.assertEqual(self._offsets([ b"ABCD", b"D" ], search_class = SmallChunkFileSearch), expected)
+		self.assertEqual([ offset for (offset, needle) in expected if needle == b"ABCD" ], [ 0, 13, 17, 29, 33, 46, 96 ])
+
+	def test_chunked_context(self):
+		data = bytes(range(256)) * 2
+		self._write(data)
+		needles = [ bytes([ 0x0e, 0x0f, 0x10 ]), bytes([ 0xff ]), bytes([ 0x00, 0x01 ]) ]
+		for context_size in [ 0, 3, 20, 40 ]:
+			expected = self._matches(needles, context_size = context_size)
+			self.assertEqual(len(expected), 6)
+			self.assertEqual(self._matches(needles, search_class = SmallChunkFileSearch, context_size = context_size), expected)
+		self.assertEqual(self._matches([ bytes([ 0xff ]) ], context_size = 2), [ (255, b"\xff", b"\xfd\xfe", b"\x00\x01"), (511, b"\xff", b"\xfd\xfe", b"") ])
+
+	def test_empty_file(self):
+		self.assertEqual(self._offsets([ b"foo" ]), [ ])
+		self.assertEqual(self._offsets([ b"foo" ], search_class = SmallChunkFileSearch), [ ])
+
+	def test_ranges(self):
+		data = bytes(range(256)) * 4
+		self._write(data)
+		needles = [ bytes([ 0x0f, 0x10 ]), bytes([ 0xfe, 0xff, 0x00 ]) ]
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			fs = search_class(self._tempfile.name, context_size = 8)
+			expected = [ (match.offset, bytes(match.pre), bytes(match.post)) for match in fs.find_all_multi(needles) ]
+			for range_size in [ 1, 7, 64, 300 ]:
+				ranged = [ ]
+				for begin_offset in range(0, len(data), range_size):
+					ranged += [ (match.offset, bytes(match.pre), bytes(match.post)) for match in fs.find_all_multi(needles, begin_offset = begin_offset, end_offset = begin_offset + range_size) ]
+				self.assertEqual(ranged, expected)
+
+	def test_parallel(self):
+		self._write(bytes(range(256)) * 64)
+		needles = [ bytes([ 0x0f, 0x10 ]), bytes([ 0xff, 0x00 ]) ]
+		expected = self._matches(needles, context_size = 3)
+		pfs = ParallelFileSearch(needles, context_size = 3, jobs = 2, split_size = 1000)
+		results = list(pfs.search([ self._tempfile.name ]))
+		self.assertEqual(len(results), 17)
+		self.assertEqual([ (match.offset, match.needle, match.pre, match.post) for result in results for match in result.occurrences ], expected)
+
+	def test_parallel_errors(self):
+		self._write(bytes(range(256)) * 64)
+		with tempfile.NamedTemporaryFile(prefix = "retools_test_") as index_file:
+			index_file.write(b"not an index" * 100)
+			index_file.flush()
+			pfs = ParallelFileSearch([ bytes([ 0x0f, 0x10 ]) ], jobs = 2, index_filename = index_file.name)
+			results = list(pfs.search([ self._tempfile.name, self._tempfile.name + "_nonexistent" ]))
+		self.assertEqual(len(results), 2)
+		self.assertEqual([ result.occurrences for result in results ], [ None, None ])
+		self.assertIsInstance(results[0].error, Exception)
+		self.assertIsInstance(results[1].error, FileNotFoundError)
+
+	def test_masked_pattern(self):
+		self._write(bytes.fromhex("27 05 19 56 aa bb cc dd ff 27 05 19 56 00 11 22 33 fe 27 05 19 56 12 34 56 78 ff"))
+		pattern = MaskedPattern.parse("27051956 ?? ?? ?? ?? ff")
+		self.assertEqual(self._offsets([ pattern ]), [ (0, pattern), (18, pattern) ])
+		pattern = MaskedPattern.parse("?? ?? ?? ?? 1? 3? 5? 7?")
+		matches = self._matches([ pattern ], search_class = SmallChunkFileSearch, context_size = 1)
+		self.assertEqual(matches, [ (18, pattern, b"\xfe", b"\xff") ])
+
+	def test_masked_pattern_without_anchor(self):
+		self._write(bytes.fromhex("00 a1 b2 a3 b4 a5"))
+		pattern = MaskedPattern.parse("a? b?")
+		self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ]) ], [ 1, 3 ])
+		pattern = MaskedPattern(bytes.fromhex("80"), bytes.fromhex("80"))
+		self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern, b"\xb4" ]) ], [ 1, 2, 3, 4, 4, 5 ])
+
+	def test_prefetch_reader(self):
+		data = bytes(range(256)) * 10
+		self._write(data)
+		with open(self._tempfile.name, "rb") as f:
+			self.assertEqual(list(PrefetchReader(f, chunk_size = 1000, queue_depth = 1)), [ data[0 : 1000], data[1000 : 2000], data[2000 : ] ])
+			f.seek(100)
+			self.assertEqual(list(PrefetchReader(f, chunk_size = 1000, queue_depth = 3, length = 1500)), [ data[100 : 1100], data[1100 : 1600] ])
+
+			# Aborting iteration early stops the reader thread
+			f.seek(0)
+			chunks = iter(PrefetchReader(f, chunk_size = 10, queue_depth = 1))
+			self.assertEqual(next(chunks), data[: 10])
+			chunks.close()
+
+	def test_prefetch(self):
+		data = (b"x" * 999 + b"foobar") * 20
+		self._write(data)
+		expected = [ (offset, b"foobar", data[offset - 3 : offset]) for offset in range(999, len(data), 1005) ]
+		for chunk_size in [ 7, 100, 1024 ]:
+			fs = FileSearch(self._tempfile.name, context_size = 3, chunk_size = chunk_size, prefetch = 2)
+			self.assertEqual([ (match.offset, match.needle, bytes(match.pre)) for match in fs.find_all(b"foobar") ], expected)
+			self.assertEqual([ match.offset for match in fs.find_all_multi([ b"foobar" ], begin_offset = 1000, end_offset = 3000) ], [ 2004 ])
+
+	def test_range_pattern(self):
+		self._write(bytes.fromhex("ff 00 10 08 00 00 0f 08 ff ff 0f 08 00"))
+		pattern = RangePattern(0x08000000, 0x080fffff, 4)
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			self.assertEqual(self._offsets([ pattern ], search_class = search_class), [ (4, pattern), (8, pattern) ])
+		pattern = RangePattern(-1, 0x0f, 1, signed = True)
+		self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ]) ], [ 0, 1, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12 ])
+
+	def test_aligned_range_pattern(self):
+		self._write(bytes.fromhex("10 03 00 fe ff 04 00 00"))
+		pattern = RangePattern(-5, 5, 2, signed = True, alignment = 2)
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ], search_class = search_class) ], [ 6 ])
+		fs = FileSearch(self._tempfile.name)
+		self.assertEqual([ match.offset for match in fs.find_all_multi([ pattern ], begin_offset = 3) ], [ 6 ])
+
+	def test_float_pattern(self):
+		self._write(struct.pack("<5f", 3.14159, -3.14159, 3.1416, 3.0, 1e-30) + bytes(1) + struct.pack("<f", 3.14158))
+		pattern = FloatPattern(3.1415, 3.1417, 4)
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			self.assertEqual(self._offsets([ pattern ], search_class = search_class), [ (0, pattern), (8, pattern), (21, pattern) ])
+		pattern = FloatPattern(-1e-20, 1e-20, 4, alignment = 4)
+		self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ]) ], [ 16 ])
+
+	def test_regex_pattern(self):
+		data = b"PK\x03\x04" + (b"x" * 20) + b"libc.so" + b"PK\x03\x04" + (b"y" * 40) + b".so PK\x03\x04.so"
+		self._write(data)
+		pattern = RegexPattern(rb"PK\x03\x04.{0,30}\.so", 64)
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			matches = self._matches([ pattern ], search_class = search_class, context_size = 1)
+			self.assertEqual(matches, [ (0, pattern, b"", b"P"), (79, pattern, b" ", b"") ])
+		fs = SmallChunkFileSearch(self._tempfile.name, context_size = 0)
+		self.assertEqual([ bytes(match.data) for match in fs.find_all(pattern) ], [ data[: 31], data[79 :] ])
+
+		# Matches longer than the maximum length are not reported
+		pattern = RegexPattern(rb"PK\x03\x04.{0,30}\.so", 30)
+		self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ], search_class = SmallChunkFileSearch) ], [ 79 ])
+
+		# Matches at every offset are reported, just like for all other patterns
+		pattern = RegexPattern(rb"y+\.so", 100)
+		self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ], search_class = SmallChunkFileSearch) ], list(range(35, 75)))
+
+	def test_regex_pattern_unbounded(self):
+		# Expressions with unbounded repetitions are only evaluated within the
+		# maximum length, with or without a literal prefix
+		data = (b"PKx" * 2000) + b"PK1.so" + (b"PKx" * 20)
+		for regex in [ rb"PK.*\.so", rb"(PK|QK).*\.so" ]:
+			pattern = RegexPattern(regex, 16)
+			expected = [ offset for offset in range(len(data)) if re.match(regex, data[offset : offset + 16], flags = re.DOTALL) ]
+			self.assertEqual(list(pattern.finditer(data)), expected)
+			self.assertEqual(len(expected), 4)
+
+	def test_regex_pattern_window_border(self):
+		# Without a literal prefix, a match that starts in the second half of
+		# a search window but needs bytes beyond it must not be hidden by a
+		# later, shorter match
+		data = (b"-" * 13) + b"axcb--"
+		pattern = RegexPattern(rb"c|a.*b", 4)
+		self.assertEqual(list(pattern.finditer(data)), [ 13, 15 ])
+		self._write(data)
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			self.assertEqual([ offset for (offset, needle) in self._offsets([ pattern ], search_class = search_class) ], [ 13, 15 ])
+
+		prng = random.Random(1)
+		data = bytes(prng.choice(b"abc-") for _ in range(2000))
+		for (regex, max_length) in [ (rb"c|a.*b", 5), (rb"[ab]+c", 3), (rb"(a|b)*c", 7) ]:
+			pattern = RegexPattern(regex, max_length)
+			expected = [ offset for offset in range(len(data)) if re.match(regex, data[offset : offset + max_length], flags = re.DOTALL) ]
+			self.assertEqual(list(pattern.finditer(data)), expected)
+
+	def test_max_mismatches(self):
+		self._write(b"Hello World, Hallo World, Hello Wxrld, Hxllx World, Hellx")
+		self.assertEqual(self._offsets([ b"Hello World" ]), [ (0, b"Hello World") ])
+		for search_class in [ FileSearch, SmallChunkFileSearch ]:
+			self.assertEqual(self._offsets([ b"Hello World" ], search_class = search_class, max_mismatches = 1), [ (0, b"Hello World"), (13, b"Hello World"), (26, b"Hello World") ])
+			self.assertEqual(self._offsets([ b"Hello World", b"Hello" ], search_class = search_class, max_mismatches = 2), [
+				(0, b"Hello World"), (0, b"Hello"),
+				(13, b"Hello World"), (13, b"Hello"),
+				(26, b"Hello World"), (26, b"Hello"),
+				(39, b"Hello World"), (39, b"Hello"),
+				(52, b"Hello"),
+			])
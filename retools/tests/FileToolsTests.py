@@ -0,0 +1,48 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import unittest
+import tempfile
+from retools.FileTools import FileTools
+
+class FileToolsTests(unittest.TestCase):
+	def test_enumerate_files(self):
+		with tempfile.TemporaryDirectory(prefix = "retools_test_") as tmpdir:
+			os.makedirs(tmpdir + "/sub/subsub")
+			for name in [ "a", "sub/b", "sub/subsub/c" ]:
+				with open(tmpdir + "/" + name, "wb"):
+					pass
+			os.symlink(tmpdir + "/a", tmpdir + "/sub/link")
+			os.symlink(tmpdir + "/sub", tmpdir + "/linkdir")
+			self.assertEqual(sorted(FileTools.enumerate_files([ tmpdir ])), [ tmpdir + "/a" ])
+			self.assertEqual(sorted(FileTools.enumerate_files([ tmpdir ], recurse = True)), [ tmpdir + "/a", tmpdir + "/sub/b", tmpdir + "/sub/subsub/c" ])
+			errors = [ ]
+			self.assertEqual(list(FileTools.enumerate_files([ tmpdir + "/sub/link", tmpdir + "/nonexistent" ], error_callback = lambda filename, e: errors.append((filename, type(e))))), [ tmpdir + "/sub/link" ])
+			self.assertEqual(errors, [ (tmpdir + "/nonexistent", FileNotFoundError) ])
+
+	def test_sorted(self):
+		with tempfile.TemporaryDirectory(prefix = "retools_test_") as tmpdir:
+			names = [ "x%d" % (i) for i in range(20) ]
+			for name in names:
+				with open(tmpdir + "/" + name, "wb"):
+					pass
+			self.assertEqual(list(FileTools.enumerate_files([ tmpdir ])), [ tmpdir + "/" + name for name in sorted(names) ])
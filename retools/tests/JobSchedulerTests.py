@@ -0,0 +1,51 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import time
+import unittest
+import concurrent.futures
+from retools.JobScheduler import JobScheduler
+
+class JobSchedulerTests(unittest.TestCase):
+	def test_split(self):
+		self.assertEqual(list(JobScheduler.split(0, 100)), [ (0, None) ])
+		self.assertEqual(list(JobScheduler.split(100, 100)), [ (0, None) ])
+		self.assertEqual(list(JobScheduler.split(250, 100)), [ (0, 100), (100, 200), (200, None) ])
+
+	def test_run(self):
+		scheduler = JobScheduler(jobs = 2)
+		with concurrent.futures.ThreadPoolExecutor(max_workers = 2) as executor:
+			submitted = [ ]
+			def submit(job):
+				submitted.append(job)
+				if job == 3:
+					return scheduler.completed(job * job)
+				return executor.submit(lambda: (time.sleep(0.001 * (job % 3)), job * job)[1])
+
+			results = [ ]
+			for (job, future) in scheduler.run(range(20), submit):
+				# Never more than the bound is submitted ahead
+				self.assertLessEqual(len(submitted) - len(results), 8)
+				results.append((job, future.result()))
+			self.assertEqual(results, [ (job, job * job) for job in range(20) ])
+
+			results = [ (job, future.result()) for (job, future) in scheduler.run(range(20), submit, ordered = False) ]
+			self.assertEqual(sorted(results), [ (job, job * job) for job in range(20) ])
@@ -0,0 +1,61 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import struct
+import unittest
+import tempfile
+from retools.MagicScanner import MagicScanner
+
+class MagicScannerTests(unittest.TestCase):
+	def _scan(self, data):
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(data)
+			f.flush()
+			return [ (match.offset, match.name, match.variant) for match in MagicScanner().scan(f.name) ]
+
+	def test_words(self):
+		sha256_iv = [ 0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19 ]
+		data = bytes(100) + struct.pack(">8I", *sha256_iv) + bytes(100) + struct.pack("<8Q", *sha256_iv)
+		self.assertEqual(self._scan(data), [
+			(100, "SHA-256 initialization vector", "32-bit be"),
+			(232, "SHA-256 initialization vector", "64-bit le"),
+		])
+
+	def test_words64(self):
+		sha512_iv = [ 0x6a09e667f3bcc908, 0xbb67ae8584caa73b, 0x3c6ef372fe94f82b, 0xa54ff53a5f1d36f1 ]
+		halves = [ half for word in sha512_iv for half in (word >> 32, word & 0xffffffff) ]
+		data = struct.pack("<4Q", *sha512_iv) + bytes(16) + struct.pack("<8I", *halves)
+		self.assertEqual(self._scan(data), [
+			(0, "SHA-512 initialization vector", "64-bit le"),
+			(48, "SHA-512 initialization vector", "32-bit le, high word first"),
+		])
+
+	def test_bignum(self):
+		p = (1 << 255) - 19
+		limbs = [ (p >> (32 * i)) & 0xffffffff for i in range(8) ]
+		data = p.to_bytes(32, byteorder = "big") + bytes(3) + struct.pack(">8I", *limbs)
+		self.assertEqual(self._scan(data), [
+			(0, "Curve25519 prime", "be"),
+			(35, "Curve25519 prime", "32-bit limbs be"),
+		])
+
+	def test_no_false_positives(self):
+		self.assertEqual(self._scan(bytes(4096) + bytes(range(256)) * 16), [ ])
@@ -0,0 +1,139 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import os
+import random
+import sqlite3
+import unittest
+import tempfile
+from retools.NGramIndex import NGramIndex
+from retools.FileSearch import FileSearch
+
+class NGramIndexTests(unittest.TestCase):
+	def setUp(self):
+		self._tempdir = tempfile.TemporaryDirectory(prefix = "retools_test_")
+		self._index = NGramIndex(self._tempdir.name + "/index.sqlite3", block_size = 64)
+
+	def tearDown(self):
+		self._index.close()
+		self._tempdir.cleanup()
+
+	def _create_file(self, name, data):
+		filename = self._tempdir.name + "/" + name
+		with open(filename, "wb") as f:
+			f.write(data)
+		return filename
+
+	def test_compact(self):
+		rng = random.Random(1)
+		data = bytes(rng.getrandbits(8) for i in range(256 * 1024))
+		filename = self._create_file("random.bin", data)
+		with NGramIndex(self._tempdir.name + "/random_index.sqlite3", block_size = 1024) as index:
+			index.update(filename)
+			(index_size, ) = index._db.execute("SELECT SUM(LENGTH(masks)) FROM bitmaps").fetchone()
+			self.assertLess(index_size, len(data) * 3 // 4)
+			for offset in [ 0, 1000, 100000, len(data) - 8 ]:
+				self.assertEqual(index.candidate_ranges(filename, [ data[offset : offset + 8] ]), [ (offset // 1024 * 1024, offset // 1024 * 1024 + 1024) ])
+
+	def test_high_entropy(self):
+		rng = random.Random(3)
+		data = bytes(rng.getrandbits(8) for i in range(256 * 1024))
+		filename = self._create_file("random.bin", data)
+		with NGramIndex(self._tempdir.name + "/random_index.sqlite3", block_size = 1024) as index:
+			index.update(filename)
+			self.assertIsNone(index.candidate_ranges(filename, [ data[offset : offset + 4] for offset in range(0, len(data), 8192) ]))
+			needles = [ data[offset : offset + 4] for offset in range(0, len(data), 65536) ]
+			ranges = index.candidate_ranges(filename, needles)
+			self.assertIsNotNone(ranges)
+			self.assertLess(sum(end - begin for (begin, end) in ranges), len(data) // 2)
+			expected = [ match.offset for match in FileSearch(filename).find_all_multi(needles) ]
+			self.assertEqual([ match.offset for match in FileSearch(filename, index = index).find_all_multi(needles) ], expected)
+
+	def test_small_file(self):
+		# A group of few blocks only stores the byte planes of those blocks
+		rng = random.Random(2)
+		data = bytes(rng.getrandbits(8) for i in range(4 * 1024))
+		filename = self._create_file("random.bin", data)
+		with NGramIndex(self._tempdir.name + "/random_index.sqlite3", block_size = 1024) as index:
+			index.update(filename)
+			(index_size, ) = index._db.execute("SELECT SUM(LENGTH(masks)) FROM bitmaps").fetchone()
+			self.assertLess(index_size, len(data))
+			self.assertEqual(index.candidate_ranges(filename, [ data[3000 : 3008] ]), [ (2048, 3072) ])
+
+	def test_discard_old_format(self):
+		index_filename = self._tempdir.name + "/old_index.sqlite3"
+		db = sqlite3.connect(index_filename)
+		db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+		db.execute("CREATE TABLE postings (file_id INTEGER NOT NULL, gram INTEGER NOT NULL, blocks BLOB NOT NULL)")
+		db.execute("INSERT INTO meta (key, value) VALUES ('block_size', '64')")
+		db.executemany("INSERT INTO postings (file_id, gram, blocks) VALUES (1, ?, ?)", [ (gram, bytes(100)) for gram in range(10000) ])
+		db.commit()
+		db.close()
+		old_size = os.path.getsize(index_filename)
+
+		with NGramIndex(index_filename, block_size = 1024) as index:
+			self.assertEqual(index.block_size, 1024)
+			self.assertIsNone(index._db.execute("SELECT name FROM sqlite_master WHERE name = 'postings'").fetchone())
+		self.assertLess(os.path.getsize(index_filename), old_size // 10)
+
+	def test_frequent_grams(self):
+		data = bytearray(64 * 100)
+		data[5000 : 5008] = b"ABCDEFGH"
+		filename = self._create_file("zeros.bin", data)
+		self._index.update(filename)
+		self.assertIsNone(self._index.candidate_ranges(filename, [ bytes(8) ]))
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"\x00\x00\x00\x00ABCD" ]), [ (4928, 5056) ])
+
+	def test_candidate_ranges(self):
+		data = bytearray(1000)
+		data[100 : 104] = b"ABCD"
+		data[190 : 196] = b"ABCDEF"
+		filename = self._create_file("data.bin", data)
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"ABCD" ]), None)
+		self.assertTrue(self._index.update(filename))
+		self.assertFalse(self._index.update(filename))
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"ABCD" ]), [ (64, 192) ])
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"ABCDE" ]), [ (64, 192) ])
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"CDEF" ]), [ (192, 256) ])
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"XYZW" ]), [ ])
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"ABC" ]), None)
+
+	def test_search_with_index(self):
+		rng = random.Random(1234)
+		data = bytes(rng.randrange(4) for i in range(5000))
+		filename = self._create_file("data.bin", data)
+		self._index.update(filename)
+		for needle_length in [ 4, 5, 8, 70, 150 ]:
+			for i in range(10):
+				offset = rng.randrange(len(data) - needle_length)
+				needles = [ data[offset : offset + needle_length] ]
+				expected = [ match.offset for match in FileSearch(filename).find_all_multi(needles) ]
+				indexed = [ match.offset for match in FileSearch(filename, index = self._index).find_all_multi(needles) ]
+				self.assertEqual(indexed, expected)
+
+	def test_changed_file(self):
+		filename = self._create_file("data.bin", b"foobar")
+		self._index.update(filename)
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"barfoo" ]), [ ])
+		self._create_file("data.bin", b"barfoobar" + bytes(200))
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"barfoo" ]), None)
+		self.assertTrue(self._index.update(filename))
+		self.assertEqual(self._index.candidate_ranges(filename, [ b"barfoo" ]), [ (0, 64) ])
@@ -0,0 +1,85 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import zlib
+import lzma
+import random
+import unittest
+from retools.RawStreamFinder import RawStreamFinder
+
+class RawStreamFinderTests(unittest.TestCase):
+	def setUp(self):
+		self._random = random.Random(0)
+
+	def _random_bytes(self, length):
+		return bytes(self._random.getrandbits(8) for i in range(length))
+
+	def _payload(self):
+		payload_random = random.Random(1)
+		words = [ bytes(payload_random.randint(0x61, 0x7a) for i in range(payload_random.randint(2, 10))) for j in range(200) ]
+		return b" ".join(payload_random.choice(words) for i in range(5000))
+
+	def _deflate(self, data):
+		compressor = zlib.compressobj(wbits = -zlib.MAX_WBITS)
+		return compressor.compress(data) + compressor.flush()
+
+	def test_deflate(self):
+		stream = self._deflate(self._payload())
+		data = self._random_bytes(100000) + stream + self._random_bytes(30000) + stream + self._random_bytes(1000)
+		with RawStreamFinder("deflate", jobs = 1, split_size = 16384) as finder:
+			self.assertEqual(finder.find(data), [ 100000, 130000 + len(stream) ])
+
+	def test_lzma(self):
+		stream = lzma.compress(self._payload(), format = lzma.FORMAT_ALONE)
+		data = self._random_bytes(50000) + stream + self._random_bytes(1000)
+		with RawStreamFinder("lzma", jobs = 1) as finder:
+			self.assertEqual(finder.find(data), [ 50000 ])
+
+	def test_alignment(self):
+		stream = self._deflate(self._payload())
+		data = self._random_bytes(4096) + stream + self._random_bytes(4096 + 1 - (len(stream) % 16)) + stream + self._random_bytes(1000)
+		with RawStreamFinder("deflate", alignment = 16, jobs = 1) as finder:
+			self.assertEqual(finder.find(data), [ 4096 ])
+
+	def test_min_length(self):
+		stream = self._deflate(self._payload())
+		data = self._random_bytes(1000) + stream + self._random_bytes(1000)
+		with RawStreamFinder("deflate", min_length = len(self._payload()) + 1, jobs = 1) as finder:
+			self.assertEqual(finder.find(data), [ ])
+
+	def test_low_entropy(self):
+		stream = self._deflate(self._payload())
+		data = bytes(20000) + stream + bytes(20000)
+		with RawStreamFinder("deflate", jobs = 1) as finder:
+			self.assertEqual(finder.find(data), [ 20000 ])
+		with RawStreamFinder("deflate", min_entropy = 8.0, jobs = 1) as finder:
+			self.assertEqual(finder.find(data), [ ])
+
+	def test_close(self):
+		stream = self._deflate(self._payload())
+		data = self._random_bytes(1000) + stream
+		with RawStreamFinder("deflate", jobs = 2) as finder:
+			self.assertEqual(finder.find(data), [ 1000 ])
+			self.assertEqual(finder.find(bytearray(data)), [ 1000 ])
+			executor = finder._executor
+		self.assertIsNone(finder._executor)
+		with self.assertRaises(RuntimeError):
+			executor.submit(len, b"")
@@ -0,0 +1,132 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import unittest
+import tempfile
+from retools.FileSearch import FileSearch
+from retools.ParallelFileSearch import ParallelFileSearch
+from retools.MaskedPattern import MaskedPattern
+from retools.SearchDeduplicator import SearchDeduplicator
+
+class _FailingFirstCopySearch(ParallelFileSearch):
+	@staticmethod
+	def _run_job(needles, search_options, filename, begin_offset, end_offset, plain, decompress):
+		if filename.endswith("/copy0"):
+			return (None, OSError("simulated read error"))
+		return ParallelFileSearch._run_job(needles, search_options, filename, begin_offset, end_offset, plain, decompress)
+
+class SearchDeduplicatorTests(unittest.TestCase):
+	def setUp(self):
+		self._tempdir = tempfile.TemporaryDirectory(prefix = "retools_test_")
+		self._needles = [ b"foo", MaskedPattern.parse("62 ?1 72") ]
+		self._search_key = SearchDeduplicator.search_key(self._needles, context = 2)
+
+	def tearDown(self):
+		self._tempdir.cleanup()
+
+	def _write(self, name, data):
+		filename = self._tempdir.name + "/" + name
+		with open(filename, "wb") as f:
+			f.write(data)
+		return filename
+
+	def _search(self, dedup, filename):
+		results = dedup.lookup(filename)
+		if results is not None:
+			return (True, [ (result.offset, result.needle, result.pre, result.post) for result in results ])
+		occurrences = list(FileSearch(filename, context_size = 2).find_all_multi(self._needles))
+		dedup.store(filename, occurrences)
+		return (False, [ (occurrence.offset, occurrence.needle, bytes(occurrence.pre), bytes(occurrence.post)) for occurrence in occurrences ])
+
+	def test_search_key(self):
+		self.assertEqual(self._search_key, SearchDeduplicator.search_key([ b"foo", MaskedPattern.parse("62 ?1 72") ], context = 2))
+		self.assertNotEqual(self._search_key, SearchDeduplicator.search_key(self._needles, context = 3))
+		self.assertNotEqual(self._search_key, SearchDeduplicator.search_key([ b"foo", MaskedPattern(b"b\x01r", b"\xff\x03\xff") ], context = 2))
+
+	def test_identical_content(self):
+		data = b"foo bar foo"
+		(first, second, other, same_size) = (self._write("a", data), self._write("b", data), self._write("c", b"bar"), self._write("d", b"xoo bar foo"))
+		expected = [ (0, b"foo", b"", b" b"), (4, self._needles[1], b"o ", b" f"), (8, b"foo", b"r ", b"") ]
+		with SearchDeduplicator(self._needles, self._search_key) as dedup:
+			self.assertEqual(self._search(dedup, first), (False, expected))
+			self.assertEqual(self._search(dedup, other), (False, [ (0, self._needles[1], b"", b"") ]))
+			self.assertEqual(self._search(dedup, same_size), (False, expected[1:]))
+			self.assertEqual(self._search(dedup, second), (True, expected))
+			self.assertEqual(self._search(dedup, first), (True, expected))
+
+	def test_persistence(self):
+		data = b"foo bar foo"
+		(first, second) = (self._write("a", data), self._write("b", data))
+		db_filename = self._tempdir.name + "/cache.sqlite3"
+		with SearchDeduplicator(self._needles, self._search_key, filename = db_filename) as dedup:
+			(cached, expected) = self._search(dedup, first)
+			self.assertFalse(cached)
+		with SearchDeduplicator(self._needles, self._search_key, filename = db_filename) as dedup:
+			self.assertEqual(self._search(dedup, second), (True, expected))
+		other_key = SearchDeduplicator.search_key(self._needles, context = 3)
+		with SearchDeduplicator(self._needles, other_key, filename = db_filename) as dedup:
+			self.assertIsNone(dedup.lookup(second))
+
+	def test_parallel_search(self):
+		filenames = [ self._write("a", b"foo bar foo"), self._write("b", b"xoo bar"), self._write("c", b"nothing") ]
+		db_filename = self._tempdir.name + "/cache.sqlite3"
+		for run in range(2):
+			with SearchDeduplicator(self._needles, self._search_key, filename = db_filename) as dedup:
+				pfs = ParallelFileSearch(self._needles, context_size = 2, jobs = 2, cache = dedup)
+				results = [ (result.filename, [ (match.offset, match.needle, bytes(match.pre)) for match in result.occurrences ]) for result in pfs.search(filenames) ]
+				self.assertEqual(results, [
+					(filenames[0], [ (0, b"foo", b""), (4, self._needles[1], b"o "), (8, b"foo", b"r ") ]),
+					(filenames[1], [ (4, self._needles[1], b"o ") ]),
+					(filenames[2], [ ]),
+				])
+				self.assertTrue(all(dedup.lookup(filename) is not None for filename in filenames))
+
+	def test_parallel_identical_files(self):
+		filenames = [ self._write("copy%d" % (i), b"foo bar foo") for i in range(6) ] + [ self._write("other", b"xoo bar") ]
+		stored = [ ]
+		for ordered in [ True, False ]:
+			with SearchDeduplicator(self._needles, self._search_key) as dedup:
+				store = dedup.store
+				dedup.store = lambda filename, occurrences: (stored.append(filename), store(filename, occurrences))
+				pfs = ParallelFileSearch(self._needles, context_size = 2, jobs = 2, ordered = ordered, cache = dedup)
+				results = { result.filename: [ (match.filename, match.offset, match.needle) for match in result.occurrences ] for result in pfs.search(filenames) }
+			self.assertEqual(sorted(stored), [ filenames[0], filenames[-1] ])
+			self.assertEqual(len(results), 7)
+			for filename in filenames[:-1]:
+				self.assertEqual(results[filename], [ (filename, 0, b"foo"), (filename, 4, self._needles[1]), (filename, 8, b"foo") ])
+			stored.clear()
+
+	def test_parallel_failed_original(self):
+		filenames = [ self._write("copy%d" % (i), b"foo bar foo") for i in range(4) ]
+		for ordered in [ True, False ]:
+			stored = [ ]
+			with SearchDeduplicator(self._needles, self._search_key) as dedup:
+				store = dedup.store
+				dedup.store = lambda filename, occurrences: (stored.append(filename), store(filename, occurrences))
+				pfs = _FailingFirstCopySearch(self._needles, context_size = 2, jobs = 2, ordered = ordered, cache = dedup)
+				results = { result.filename: result for result in pfs.search(filenames) }
+			self.assertNotIn(filenames[0], stored)
+			self.assertTrue(len(stored) > 0)
+			self.assertIsNone(results[filenames[0]].occurrences)
+			self.assertIsInstance(results[filenames[0]].error, OSError)
+			for filename in filenames[1:]:
+				self.assertIsNone(results[filename].error)
+				self.assertEqual([ (match.filename, match.offset, match.needle) for match in results[filename].occurrences ], [ (filename, 0, b"foo"), (filename, 4, self._needles[1]), (filename, 8, b"foo") ])
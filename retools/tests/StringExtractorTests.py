@@ -0,0 +1,133 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import unittest
+from retools.StringExtractor import StringExtractor
+
+class StringExtractorTests(unittest.TestCase):
+	def _extract(self, data, chunk_size = None, **kwargs):
+		extractor = StringExtractor(**kwargs)
+		if chunk_size is None:
+			chunks = [ data ]
+		else:
+			chunks = [ data[i : i + chunk_size] for i in range(0, len(data), chunk_size) ]
+		return [ (string.offset, string.encoding, string.text) for string in extractor.extract_chunks(chunks) ]
+
+	def test_ascii(self):
+		data = b"\x00\x01foobar\xffab\x00tab\there\x7f"
+		self.assertEqual(self._extract(data), [
+			(2, "ascii", "foobar"),
+			(12, "ascii", "tab\there"),
+		])
+		self.assertEqual(self._extract(data, min_length = 2), [
+			(2, "ascii", "foobar"),
+			(9, "ascii", "ab"),
+			(12, "ascii", "tab\there"),
+		])
+
+	def test_utf16(self):
+		data = b"\x01\x01" + "wide!".encode("utf-16-le") + b"\x01\x01" + "Größe".encode("utf-16-be")
+		self.assertEqual(self._extract(data, min_length = 5), [
+			(2, "utf-16-le", "wide!"),
+			(14, "utf-16-be", "Größe"),
+		])
+
+		# UTF-16 strings shifted by one byte are also valid, but overlap
+		self.assertEqual(self._extract(data, min_length = 4), [
+			(2, "utf-16-le", "wide!"),
+			(14, "utf-16-be", "Größe"),
+		])
+		self.assertEqual(self._extract(data, min_length = 4, encodings = [ "utf-16-be" ]), [
+			(3, "utf-16-be", "ide!"),
+			(14, "utf-16-be", "Größe"),
+		])
+
+	def test_utf16_overlaps(self):
+		# Either both or none are NUL terminated, the aligned one is kept
+		data = bytes(0x78) + b"\x00" + "hello wide".encode("utf-16-le") + b"\x00\x00\x01" + "aligned".encode("utf-16-le") + b"\x00\x00"
+		expected = [
+			(0x78, "utf-16-be", "hello wide"),
+			(0x90, "utf-16-le", "aligned"),
+		]
+		for chunk_size in [ None, 1, 3, 16 ]:
+			self.assertEqual(self._extract(data, chunk_size = chunk_size), expected)
+
+		# Only the big endian string is NUL terminated
+		data = b"\x01" + "text".encode("utf-16-be") + b"\x00\x00\x01"
+		self.assertEqual(self._extract(data), [ (1, "utf-16-be", "text") ])
+
+	def test_utf16_longer_alignment(self):
+		# Neither is NUL terminated, but the big endian string is one
+		# character longer than the little endian one at the even offset
+		data = b"\x01" + "UTF16 big endian".encode("utf-16-be") + b"\x01\x02"
+		for chunk_size in [ None, 1, 5 ]:
+			self.assertEqual(self._extract(data, chunk_size = chunk_size), [ (1, "utf-16-be", "UTF16 big endian") ])
+
+	def test_utf16_contains_ascii(self):
+		# Every character of UTF-16 text is also ASCII text of one byte
+		data = b"xx" + "UTF16 little endian".encode("utf-16-le") + b"\x01abc"
+		expected = [
+			(0, "ascii", "xxU"),
+			(2, "utf-16-le", "UTF16 little endian"),
+			(41, "ascii", "abc"),
+		]
+		for encodings in [ None, [ "ascii", "utf-8", "utf-16-le" ] ]:
+			for chunk_size in [ None, 1, 7 ]:
+				self.assertEqual(self._extract(data, chunk_size = chunk_size, min_length = 1, encodings = encodings), expected)
+
+	def test_utf8(self):
+		data = b"\xff" + "Grüße aus München".encode("utf-8") + b"\x00plain\x00\xc3\x28abcd"
+		self.assertEqual(self._extract(data, encodings = [ "ascii", "utf-8" ]), [
+			(1, "utf-8", "Grüße aus München"),
+			(22, "ascii", "plain"),
+			(29, "ascii", "(abcd"),
+		])
+		self.assertEqual(self._extract(data, encodings = [ "utf-8" ]), [
+			(1, "utf-8", "Grüße aus München"),
+		])
+
+	def test_chunk_borders(self):
+		data = bytearray()
+		for i in range(100):
+			data += b"\x01" * (i % 7)
+			data += ("ascii%d" % (i)).encode("ascii") + b"\x01"
+			data += ("wide%d" % (i)).encode("utf-16-le") + b"\x01\x01"
+			data += ("bïg%d" % (i)).encode("utf-16-be") + b"\x01\x01"
+			data += ("ütf%d" % (i)).encode("utf-8") + b"\x01"
+		data = bytes(data)
+		expected = self._extract(data, encodings = StringExtractor._ENCODINGS)
+		self.assertGreaterEqual(len(expected), 400)
+		self.assertEqual(expected, sorted(expected))
+		for chunk_size in [ 1, 2, 3, 5, 16, 1000 ]:
+			self.assertEqual(self._extract(data, chunk_size = chunk_size, encodings = StringExtractor._ENCODINGS), expected)
+
+	def test_long_runs(self):
+		data = b"\x01" + (b"A" * 150000) + b"\x01" + ("Ü" * 70000).encode("utf-8") + b"\x01"
+		expected = self._extract(data, encodings = [ "ascii", "utf-8" ])
+		self.assertEqual([ (offset, len(text)) for (offset, encoding, text) in expected ], [ (1, 65536), (65537, 65536), (131073, 18928), (150002, 32768), (215538, 32768), (281074, 4464) ])
+		for chunk_size in [ 1000, 65536 ]:
+			self.assertEqual(self._extract(data, chunk_size = chunk_size, encodings = [ "ascii", "utf-8" ]), expected)
+
+	def test_invalid_arguments(self):
+		with self.assertRaises(ValueError):
+			StringExtractor(min_length = 0)
+		with self.assertRaises(ValueError):
+			StringExtractor(encodings = [ "latin1" ])
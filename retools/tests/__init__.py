@@ -19,5 +19,19 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+from .AppTests import AppTests
 from .BitDecoderTests import BitDecoderTests
+from .ByteHistogramTests import ByteHistogramTests
+from .CandidateSetTests import CandidateSetTests
+from .ClassifierScannerTests import ClassifierScannerTests
+from .ClassifierTests import ClassifierTests
+from .CompressedFileSearchTests import CompressedFileSearchTests
 from .EncodingTests import EncodingTests
+from .FileSearchTests import FileSearchTests
+from .FileToolsTests import FileToolsTests
+from .JobSchedulerTests import JobSchedulerTests
+from .MagicScannerTests import MagicScannerTests
+from .NGramIndexTests import NGramIndexTests
+from .RawStreamFinderTests import RawStreamFinderTests
+from .SearchDeduplicatorTests import SearchDeduplicatorTests
+from .StringExtractorTests import StringExtractorTests
@@ -28,6 +28,7 @@ from retools.BitDecoder import BitDecoder
 class BZIP2Classifier(StdoutDecompressClassifier):
 	_NAME = "bz2"
 	_COMMANDLINE = [ "bzcat", "--decompress" ]
+	_STREAM_FORMAT = "bz2"
 	_BZ2Header = NamedStruct((
 		("h",	"magic"),
 		("s",	"version"),
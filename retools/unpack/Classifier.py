@@ -20,16 +20,20 @@
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
 import contextlib
+import io
 import os
 import tempfile
+import shutil
 import subprocess
 from retools.FileTools import FileTools
-from retools.WorkDir import WorkDir
+from retools.StreamDecompressor import StreamDecompressor
+from retools.RawStreamFinder import RawStreamFinder
 
 class Classifier():
 	_NAME = None
 	_KNOWN_CLASSIFIERS = { }
 	_CONTAINS_PAYLOAD = True
+	_OPT_IN = False
 	_CLASSIFIER_PRIORITY = { name: cid for (cid, name) in enumerate(reversed([
 		"uboot",
 		"squashfs",
@@ -77,8 +81,10 @@ class Classifier():
 		return classifier_class
 
 	@classmethod
-	def get_all(cls):
-		classifier_list = [ (cls._CLASSIFIER_PRIORITY.get(name, 0), name, classifier_class) for (name, classifier_class) in cls._KNOWN_CLASSIFIERS.items() ]
+	def get_all(cls, opt_in = False):
+		"""Returns all classifiers in order of priority. Classifiers that are
+		expensive or prone to false positives are only included on opt-in."""
+		classifier_list = [ (cls._CLASSIFIER_PRIORITY.get(name, 0), name, classifier_class) for (name, classifier_class) in cls._KNOWN_CLASSIFIERS.items() if opt_in or (not classifier_class._OPT_IN) ]
 		classifier_list.sort(reverse = True)
 		return [ classifier_class for (priority, name, classifier_class) in classifier_list ]
 
@@ -101,25 +107,132 @@ class Classifier():
 	def extract(self, input_file, start_offset, file_length, destination):
 		raise NotImplementedError("%s does not implement extract() method" % (self.__class__.__name__))
 
+	@classmethod
+	def can_stream_contents(cls):
+		return False
+
+	def stream_contents(self, input_file, start_offset, file_length):
+		"""Yields (member name, iterable of data chunks) tuples for the
+		contents of the payload without writing anything to disk. Formats that
+		contain a single stream yield one member with an empty name."""
+		raise NotImplementedError("%s does not implement stream_contents() method" % (self.__class__.__name__))
+
+	def close(self):
+		"""Releases resources that the classifier holds across scans."""
+		pass
+
 class StdoutDecompressClassifier(Classifier):
 	_SUCCESS_RETURNCODES = [ 0 ]
 	_COMMANDLINE = None
+	_STREAM_FORMAT = None
+	_TRIAL_LENGTH = 4096
 
-	def extract(self, input_file, start_offset, file_length, destination):
-		print("Stdout decompress", hex(start_offset))
-		print(hex(input_file.tell()))
-		self._mkdir(os.path.dirname(destination))
+	@classmethod
+	def can_stream_contents(cls):
+		return cls._STREAM_FORMAT is not None
+
+	def stream_contents(self, input_file, start_offset, file_length):
+		input_file.seek(start_offset)
+		yield ("", StreamDecompressor(input_file, self._STREAM_FORMAT, max_input_length = file_length))
+
+	def _investigate_stream(self, infile, offset):
+		"""Trial decompresses the stream at the given offset and returns
+		(offset, length) if it is valid. Almost all false positives fail
+		within the first few kB; only survivors are decompressed completely to
+		find the end of the stream."""
+		infile.seek(offset)
+		trial_data = infile.read(self._TRIAL_LENGTH)
+		decompressor = StreamDecompressor(io.BytesIO(trial_data), self._STREAM_FORMAT)
+		try:
+			for chunk in decompressor:
+				pass
+			if decompressor.eof:
+				return (offset, decompressor.consumed_length)
+			if len(trial_data) < self._TRIAL_LENGTH:
+				# Truncated at end of file
+				return None
+
+			infile.seek(offset)
+			decompressor = StreamDecompressor(infile, self._STREAM_FORMAT, max_input_length = self._args.archive_limit)
+			for chunk in decompressor:
+				pass
+		except StreamDecompressor.DecompressionError:
+			return None
+
+		if decompressor.eof:
+			return (offset, decompressor.consumed_length)
+		elif self._args.archive_limit is not None:
+			# Cut off by the archive limit, length unknown
+			return (offset, None)
+		else:
+			# Truncated at end of file
+			return None
+
+	def _extract_stream(self, input_file, start_offset, file_length, destination):
+		input_file.seek(start_offset)
+		decompressor = StreamDecompressor(input_file, self._STREAM_FORMAT, max_input_length = file_length)
+		with open(destination, "wb") as outfile:
+			try:
+				decompressed_length = decompressor.decompress_all(outfile)
+				success = decompressor.eof
+			except StreamDecompressor.DecompressionError as e:
+				decompressed_length = outfile.tell()
+				success = False
+				if self._args.verbose >= 3:
+					print("%s extraction (potential target %s) failed: %s" % (self.name, destination, str(e)))
+		if self._args.verbose >= 3:
+			print("%s extraction (potential target %s) %s, %d bytes consumed, %d bytes decompressed." % (self.name, destination, "succeeded" if success else "failed", decompressor.consumed_length, decompressed_length))
+		return success
+
+	def _extract_subprocess(self, input_file, start_offset, file_length, destination):
+		input_file.seek(start_offset)
 		with open(destination, "wb") as outfile:
 			process = subprocess.Popen(self._COMMANDLINE, stdout = outfile, stderr = subprocess.DEVNULL, stdin = subprocess.PIPE)
 			try:
-				process.stdin.write(input_file.read())
+				if file_length is None:
+					shutil.copyfileobj(input_file, process.stdin)
+				else:
+					FileTools.carve(input_file, process.stdin, file_length)
 			except BrokenPipeError:
 				pass
+			process.stdin.close()
+			process.wait()
 			success = process.returncode in self._SUCCESS_RETURNCODES
 			if self._args.verbose >= 3:
 				print("%s extraction (potential target %s) returned %s (status code %s)." % (self.name, destination, "successfully" if success else "unsuccessfully", process.returncode))
 			return success
 
+	def extract(self, input_file, start_offset, file_length, destination):
+		self._mkdir(os.path.dirname(destination))
+		if self._STREAM_FORMAT is not None:
+			return self._extract_stream(input_file, start_offset, file_length, destination)
+		else:
+			return self._extract_subprocess(input_file, start_offset, file_length, destination)
+
+class RawStreamClassifier(StdoutDecompressClassifier):
+	"""Finds compressed streams without any magic number by brute force trial
+	decoding. Alignment is relative to the start of the chunk, which is
+	identical to the file alignment for powers of two that divide the chunk
+	stride of the scanner."""
+	_OPT_IN = True
+
+	def __init__(self, args):
+		super().__init__(args)
+		self._finder = None
+
+	def scan(self, chunk):
+		if self._finder is None:
+			self._finder = RawStreamFinder(self._STREAM_FORMAT, alignment = self._args.raw_alignment, min_length = self._args.raw_min_length, jobs = self._args.jobs)
+		yield from self._finder.find(chunk)
+
+	def investigate(self, infile, offset):
+		return self._investigate_stream(infile, offset)
+
+	def close(self):
+		if self._finder is not None:
+			self._finder.close()
+			self._finder = None
+
 class TemporaryCarveClassifier(Classifier):
 	_SUFFIX = None
 
@@ -128,7 +241,7 @@ class TemporaryCarveClassifier(Classifier):
 
 	def extract(self, input_file, start_offset, file_length, destination):
 		self._mkdir(destination)
-		with WorkDir(destination), tempfile.NamedTemporaryFile(suffix = self._SUFFIX) as archive_file:
+		with tempfile.NamedTemporaryFile(suffix = self._SUFFIX) as archive_file:
 			input_file.seek(start_offset)
 			FileTools.carve(input_file, archive_file, file_length)
 			archive_file.flush()
@@ -142,7 +255,9 @@ class MultiFileExtractorClassifier(TemporaryCarveClassifier):
 
 	def extract_from_temporary_carved_file(self, temp_filename, destination):
 		cmdline = self.get_extract_cmdline(temp_filename)
-		process = subprocess.run(cmdline, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+		# Extraction runs concurrently, so the working directory of the
+		# process must not be changed
+		process = subprocess.run(cmdline, stdout = subprocess.PIPE, stderr = subprocess.PIPE, cwd = destination)
 		if self._args.verbose >= 3:
 			print("%s extraction (potential target %s) returned with status code %d." % (self.name, destination, process.returncode))
 
@@ -0,0 +1,101 @@
+#	retools - Reverse engineering toolkit
+#	Copyright (C) 2019-2020 Johannes Bauer
+#
+#	This file is part of retools.
+#
+#	retools is free software; you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation; this program is ONLY licensed under
+#	version 3 of the License, later versions are explicitly excluded.
+#
+#	retools is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with retools; if not, write to the Free Software
+#	Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+#	Johannes Bauer <JohannesBauer@gmx.de>
+
+import array
+import struct
+from retools.StreamDecompressor import StreamDecompressor
+
+class ClassifierScanner():
+	"""Finds the payloads of any of the given classifiers in a file. Every
+	chunk of the file is read once and handed to all classifiers."""
+
+	_INVESTIGATE_ERRORS = (struct.error, EOFError) + StreamDecompressor.DecompressionError
+
+	def __init__(self, classifiers, chunk_size = 1024 * 1024, overlap = 64 * 1024):
+		assert(overlap < chunk_size)
+		self._classifiers = classifiers
+		self._chunk_size = chunk_size
+		self._overlap = overlap
+
+	def candidates(self, f):
+		"""Yields (offset, classifier) tuples of possible matches in ascending
+		offset order. Classifiers that are earlier in the list come first for
+		identical offsets. The file position is not preserved in between."""
+		file_offset = 0
+		while True:
+			f.seek(file_offset)
+			chunk = f.read(self._chunk_size)
+			if len(chunk) == 0:
+				break
+
+			# Matches in the overlapping region are reported as part of the
+			# next chunk
+			end_of_file = len(chunk) != self._chunk_size
+			chunk_limit = len(chunk) if end_of_file else (self._chunk_size - self._overlap)
+
+			candidates = [ ]
+			for (classifier_index, classifier) in enumerate(self._classifiers):
+				for offset in classifier.scan(chunk):
+					if (offset < chunk_limit) and (file_offset + offset >= 0):
+						candidates.append((file_offset + offset, classifier_index))
+			candidates.sort()
+			for (offset, classifier_index) in candidates:
+				yield (offset, self._classifiers[classifier_index])
+
+			if end_of_file:
+				break
+			file_offset += chunk_limit
+
+	def prioritized_candidates(self, f):
+		"""Yields (offset, classifier) tuples of possible matches grouped by
+		classifier in the order of the classifier list, i.e., by priority, and
+		in ascending offset order within each classifier. The file is read
+		only once; all candidates are collected before the first one is
+		yielded, so the file position may be freely changed in between."""
+		offsets = [ array.array("Q") for classifier in self._classifiers ]
+		classifier_indices = { id(classifier): classifier_index for (classifier_index, classifier) in enumerate(self._classifiers) }
+		for (offset, classifier) in self.candidates(f):
+			offsets[classifier_indices[id(classifier)]].append(offset)
+		for (classifier, classifier_offsets) in zip(self._classifiers, offsets):
+			for offset in classifier_offsets:
+				yield (offset, classifier)
+
+	@classmethod
+	def investigate(cls, classifier, f, offset):
+		"""Lets the classifier investigate the candidate at the given offset.
+		Candidates that are cut off by the end of the file or whose headers
+		are otherwise invalid are false positives and yield None instead of an
+		exception."""
+		f.seek(offset)
+		try:
+			return classifier.investigate(f, offset)
+		except cls._INVESTIGATE_ERRORS:
+			return None
+
+	def scan(self, f):
+		"""Yields (classifier, start_offset, file_length) for every candidate
+		that the respective classifier confirmed. The length may be None if it
+		cannot be determined."""
+		for (offset, classifier) in self.candidates(f):
+			match = self.investigate(classifier, f, offset)
+			if match is not None:
+				(start_offset, file_length) = match
+				yield (classifier, start_offset, file_length)
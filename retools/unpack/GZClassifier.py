@@ -19,7 +19,6 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
-import subprocess
 from retools.unpack import Classifier, StdoutDecompressClassifier
 
 @Classifier.register
@@ -27,16 +26,16 @@ class GZClassifier(StdoutDecompressClassifier):
 	_NAME = "gzip"
 	_SUCCESS_RETURNCODES = [ 0, 2 ]
 	_COMMANDLINE = [ "gunzip" ]
+	_STREAM_FORMAT = "gzip"
 
 	def scan(self, chunk):
 		header = bytes.fromhex("1f 8b")
 		yield from self._bytes_findall(chunk, header)
 
 	def investigate(self, infile, offset):
-		proc = subprocess.Popen([ "gunzip", "-l" ], stdin = infile, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
-		(stdout, stderr) = proc.communicate()
-		if proc.returncode != 0:
-			# No gzip data found
+		# Member header: magic, compression method (only deflate is defined)
+		# and flags of which the upper three bits are reserved
+		header = infile.read(4)
+		if (len(header) != 4) or (header[2] != 8) or ((header[3] & 0xe0) != 0):
 			return None
-		else:
-			return (offset, None)
+		return self._investigate_stream(infile, offset)
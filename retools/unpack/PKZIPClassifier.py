@@ -19,8 +19,10 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import zipfile
 from retools.unpack import Classifier, MultiFileExtractorClassifier
 from retools.NamedStruct import NamedStruct
+from retools.FileWindow import FileWindow
 
 @Classifier.register
 class PKZIPClassifier(MultiFileExtractorClassifier):
@@ -73,3 +75,15 @@ class PKZIPClassifier(MultiFileExtractorClassifier):
 
 	def get_extract_cmdline(self, archive_name):
 		return [ "unzip", "-n", archive_name ]
+
+	@classmethod
+	def can_stream_contents(cls):
+		return True
+
+	def stream_contents(self, input_file, start_offset, file_length):
+		zip_file = zipfile.ZipFile(FileWindow(input_file, start_offset, file_length))
+		for member in zip_file.infolist():
+			if member.filename.endswith("/"):
+				continue
+			with zip_file.open(member) as member_file:
+				yield (member.filename, iter(lambda: member_file.read(1024 * 1024), bytes()))
@@ -19,11 +19,27 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import zlib
+from retools.unpack import Classifier, StdoutDecompressClassifier
+
 @Classifier.register
 class XZClassifier(StdoutDecompressClassifier):
 	_NAME = "xz"
 	_COMMANDLINE = [ "xzcat", "--single-stream" ]
+	_STREAM_FORMAT = "xz"
 
 	def scan(self, chunk):
 		header = bytes.fromhex("fd 37 7a 58 5a 00")
 		yield from self._bytes_findall(chunk, header)
+
+	def investigate(self, infile, offset):
+		# Stream header: magic, two bytes of stream flags and their CRC32
+		header = infile.read(12)
+		if len(header) != 12:
+			return None
+		flags = header[6 : 8]
+		if (flags[0] != 0) or ((flags[1] & 0xf0) != 0):
+			return None
+		if zlib.crc32(flags) != int.from_bytes(header[8 : 12], byteorder = "little"):
+			return None
+		return (offset, None)
@@ -19,14 +19,24 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
+import heapq
+from retools.unpack import Classifier, StdoutDecompressClassifier
+
 @Classifier.register
 class ZLIBClassifier(StdoutDecompressClassifier):
 	_NAME = "zlib"
 	_COMMANDLINE = [ "zlib-flate", "-uncompress" ]
+	_STREAM_FORMAT = "zlib"
+
+	# CMF is deflate (CM = 8) with a 32 kB window (CINFO = 7); smaller windows
+	# are rare in practice and every additional CMF value costs scan time. FLG
+	# has any compression level and a FCHECK that makes the big endian 16 bit
+	# header a multiple of 31. Streams with a preset dictionary (FDICT) cannot
+	# be decompressed without it and are left out.
+	_HEADERS = [ bytes((0x78, flg)) for flg in range(0x00, 0x100) if (((0x78 << 8) | flg) % 31 == 0) and ((flg & 0x20) == 0) ]
 
 	def scan(self, chunk):
-		header = bytes.fromhex("78")
-		for offset in self._bytes_findall(chunk, header):
-			following = chunk[offset + 1]
-			if following in [ 0x01, 0x9c, 0xda ]:
-				yield offset
+		yield from heapq.merge(*(self._bytes_findall(chunk, header) for header in self._HEADERS))
+
+	def investigate(self, infile, offset):
+		return self._investigate_stream(infile, offset)
@@ -19,11 +19,15 @@
 #
 #	Johannes Bauer <JohannesBauer@gmx.de>
 
-from retools.unpack.Classifier import Classifier, StdoutDecompressClassifier, TemporaryCarveClassifier, MultiFileExtractorClassifier
+from retools.unpack.Classifier import Classifier, StdoutDecompressClassifier, RawStreamClassifier, TemporaryCarveClassifier, MultiFileExtractorClassifier
 import retools.unpack.PKZIPClassifier
 import retools.unpack.UBootClassifier
 import retools.unpack.SquashFSClassifier
 import retools.unpack.CramFSClassifier
 import retools.unpack.GZClassifier
 import retools.unpack.BZIP2Classifier
+import retools.unpack.XZClassifier
+import retools.unpack.ZLIBClassifier
 import retools.unpack.DexClassifier
+import retools.unpack.DeflateClassifier
+import retools.unpack.LZMAClassifier